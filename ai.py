@@ -0,0 +1,195 @@
+import math
+import time
+import random
+import engine
+from cards import RANKS, TWO, TEN, popcount, cardsIn, toMask
+
+# Rank order a player wants to keep for later: specials outrank the aces
+STRENGTH = [rank + len(RANKS) if rank in (TWO, TEN) else rank for rank in range(len(RANKS))]
+
+def moveRank(move):
+    return cardsIn(move[1])[0] >> 2
+
+def randomPolicy(state, rng):
+    moves = engine.legalMoves(state)
+    plays = [move for move in moves if move[0] != engine.PICKUP]
+    return rng.choice(plays or moves)
+
+def greedyPolicy(state, rng):
+    moves = engine.legalMoves(state)
+    if state.topCardSelectionPhase:
+        return max(moves, key=lambda move: sum(STRENGTH[card >> 2] for card in cardsIn(move[1])))
+    player = state.currentPlayer()
+    plays = [move for move in moves if move[0] == engine.PLAY and not move[1] & player.blind]
+    if plays:
+        # Shed the weakest rank, all copies at once
+        rank = min((moveRank(move) for move in plays), key=lambda rank: STRENGTH[rank])
+        return max((move for move in plays if moveRank(move) == rank), key=lambda move: move[1])
+    blind = [move for move in moves if move[0] == engine.PLAY]
+    if blind:
+        return rng.choice(blind)
+    return moves[0]
+
+# Every face down play of a seat shares one key: the searching player cannot
+# tell its blind cards apart, so neither can the tree
+BLIND = (engine.PLAY, -1)
+
+def moveKey(state, move):
+    if move[0] == engine.PLAY and move[1] & state.currentPlayer().blind:
+        return BLIND
+    return move
+
+def determinize(state, seat, rng):
+    # Deal every card `seat` cannot see (the deck, face down cards and the
+    # other hands) back out at random, keeping the size of every zone
+    world = state.copy()
+    hidden = list(world.deck)
+    for i, player in enumerate(world.players):
+        hidden.extend(cardsIn(player.bottomCards | (player.blind if i == seat else player.hand)))
+    rng.shuffle(hidden)
+    position = 0
+
+    def deal(count):
+        nonlocal position
+        position += count
+        return toMask(hidden[position - count:position])
+
+    for i, player in enumerate(world.players):
+        blind = deal(popcount(player.blind))
+        if i == seat:
+            player.hand = player.hand & ~player.blind | blind
+        else:
+            player.hand = deal(popcount(player.hand & ~player.blind)) | blind
+        player.blind = blind
+        player.bottomCards = deal(popcount(player.bottomCards))
+    world.deck = hidden[position:]
+    return world
+
+class SearchNode:
+    __slots__ = ('key', 'seat', 'children', 'visits', 'wins', 'avails')
+
+    def __init__(self, key=None, seat=None):
+        self.key = key
+        self.seat = seat  # Seat that made the move leading here
+        self.children = {}
+        self.visits = 0
+        self.wins = 0.0
+        self.avails = 1
+
+    def score(self, exploration):
+        return self.wins / self.visits + exploration * math.sqrt(math.log(self.avails) / self.visits)
+
+class MonteCarloPolicy:
+    # Information set Monte Carlo tree search: every iteration samples the
+    # hidden cards again, walks the shared tree with UCB over the moves that
+    # exist in that sample and finishes with a short epsilon-greedy rollout
+    def __init__(self, budget, exploration=0.7, epsilon=0.2, rolloutDepth=20):
+        self.budget = budget
+        self.exploration = exploration
+        self.epsilon = epsilon
+        self.rolloutDepth = rolloutDepth
+
+    def __call__(self, state, rng):
+        if state.topCardSelectionPhase:
+            return greedyPolicy(state, rng)
+        moves = self.keyedMoves(state)
+        if len(moves) > 1:
+            root = self.search(state, rng)
+            visited = [child for key, child in root.children.items() if key in moves]
+            if visited:
+                return self.concrete(state, moves, max(visited, key=lambda child: child.visits).key, rng)
+        return greedyPolicy(state, rng)
+
+    def keyedMoves(self, state):
+        return {moveKey(state, move): move for move in engine.legalMoves(state)}
+
+    def concrete(self, state, moves, key, rng):
+        if key == BLIND:
+            return (engine.PLAY, 1 << rng.choice(cardsIn(state.currentPlayer().blind)))
+        return moves[key]
+
+    def search(self, state, rng):
+        seat = state.currentPlayerIndex
+        root = SearchNode()
+        deadline = time.perf_counter() + self.budget
+        while time.perf_counter() < deadline:
+            world = determinize(state, seat, rng)
+            node = root
+            path = [root]
+            while world.winner is None:
+                moves = self.keyedMoves(world)
+                untried = []
+                for key in moves:
+                    child = node.children.get(key)
+                    if child is None:
+                        untried.append(key)
+                    else:
+                        child.avails += 1
+                if untried:
+                    key = rng.choice(untried)
+                    node.children[key] = node = SearchNode(key, world.currentPlayerIndex)
+                    world = engine.apply(world, self.concrete(world, moves, key, rng))
+                    path.append(node)
+                    break
+                node = max((node.children[key] for key in moves), key=lambda child: child.score(self.exploration))
+                world = engine.apply(world, self.concrete(world, moves, node.key, rng))
+                path.append(node)
+            rewards = self.rollout(world, rng)
+            for node in path:
+                node.visits += 1
+                if node.seat is not None:
+                    node.wins += rewards[node.seat]
+        return root
+
+    def rollout(self, world, rng):
+        for _ in range(self.rolloutDepth):
+            if world.winner is not None:
+                break
+            if rng.random() < self.epsilon:
+                move = randomPolicy(world, rng)
+            else:
+                move = greedyPolicy(world, rng)
+            world = engine.apply(world, move)
+        rewards = [0.0] * len(world.players)
+        if world.winner is not None:
+            rewards[world.winner] = 1.0
+            return rewards
+        # Cut off: split the win by how few cards each seat has left
+        weights = [1.0 / (1 + player.cardCount()) for player in world.players]
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+# CPU difficulty levels offered on the home screen; the search budgets leave
+# headroom so a CPU turn comes back well under 200 ms
+DIFFICULTIES = {
+    'easy': randomPolicy,
+    'medium': greedyPolicy,
+    'hard': MonteCarloPolicy(0.08),
+    'impossible': MonteCarloPolicy(0.15),
+}
+SEARCH_DIFFICULTIES = ('hard', 'impossible')
+
+POLICIES = {
+    'random': randomPolicy,
+    'greedy': greedyPolicy,
+    'mcts': DIFFICULTIES['hard'],
+}
+
+def getPolicy(name):
+    try:
+        return POLICIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown policy '{name}', expected one of: {', '.join(POLICIES)}")
+
+def getDifficulty(name):
+    try:
+        return DIFFICULTIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown difficulty '{name}', expected one of: {', '.join(DIFFICULTIES)}")
+
+def chooseMove(state, difficulty, seed):
+    # Entry point for the CPU worker, everything it takes and returns pickles
+    return getDifficulty(difficulty)(state, random.Random(seed))
+
+def warmUp():
+    return True
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import sockets
+import logs
+from wire import HEADER, FrameTooLarge, checkLength
+
+RAW_READ_SIZE = 1024
+
+log = logs.getLogger('net')
+
+class Connection:
+    def __init__(self, server, connectionId, reader, writer):
+        self.server = server
+        self.id = connectionId
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info('peername')
+        self.closed = False
+
+    # send and close may be called from any thread, the write itself always
+    # happens on the loop thread
+    def send(self, data):
+        self.server.callSoon(self.write, data)
+
+    def close(self):
+        self.server.callSoon(self.shutdown)
+
+    def write(self, data):
+        if not self.closed:
+            self.writer.write(data)
+
+    def shutdown(self):
+        if not self.closed:
+            self.closed = True
+            self.writer.close()
+
+class AsyncServer:
+    # One event loop thread runs accept, reads and writes for every connection.
+    # The protocol object gets connectionMade(connection), which may return
+    # False to turn the connection away, messageReceived(connection, data) and
+    # connectionLost(connection), all on the loop thread. Framed servers deliver
+    # one length-prefixed payload per message, raw servers whatever one read returned.
+    # Accepted sockets are tuned by sockets.tune, nodelay=None keeps its default.
+    def __init__(self, host, port, protocol, framed=True, nodelay=None):
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.framed = framed
+        self.nodelay = nodelay
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.connections = {}
+        self.nextId = 1
+
+    def start(self):
+        # Returns once the socket is listening; bind errors are raised here
+        ready = threading.Event()
+        failure = []
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self.serve, self.host, self.port, reuse_address=True))
+            except OSError as e:
+                failure.append(e)
+                ready.set()
+                self.loop.close()
+                return
+            ready.set()
+            try:
+                self.loop.run_forever()
+            finally:
+                tasks = asyncio.all_tasks(self.loop)
+                for task in tasks:
+                    task.cancel()
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                self.loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+
+    def callSoon(self, callback, *args):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def broadcast(self, data, exclude=None):
+        self.callSoon(self.writeAll, data, exclude)
+
+    def writeAll(self, data, exclude):
+        for connection in list(self.connections.values()):
+            if connection is not exclude:
+                connection.write(data)
+
+    async def serve(self, reader, writer):
+        sockets.tune(writer.get_extra_info('socket'), self.nodelay)
+        connection = Connection(self, self.nextId, reader, writer)
+        self.nextId += 1
+        self.connections[connection.id] = connection
+        try:
+            if self.protocol.connectionMade(connection) is False:
+                return
+            while not connection.closed:
+                data = await self.read(reader)
+                if not data:
+                    break
+                self.protocol.messageReceived(connection, data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, OSError):
+            pass
+        except FrameTooLarge as e:
+            log.warning("Dropping %s: %s", connection.address, e)
+        except asyncio.CancelledError:
+            pass  # The loop is shutting down
+        finally:
+            self.connections.pop(connection.id, None)
+            if not connection.closed:
+                self.protocol.connectionLost(connection)
+            connection.shutdown()
+
+    async def read(self, reader):
+        if not self.framed:
+            return await reader.read(RAW_READ_SIZE)
+        header = await reader.readexactly(HEADER.size)
+        return await reader.readexactly(checkLength(HEADER.unpack(header)[0]))
+
+    def stop(self):
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.shutdown)
+            self.thread.join(timeout=1)
+
+    def shutdown(self):
+        if self.server:
+            self.server.close()
+        for connection in list(self.connections.values()):
+            connection.shutdown()
+        self.loop.stop()
@@ -0,0 +1,69 @@
+import os
+import threading
+from PyQt6.QtGui import QPixmap, QImage, QTransform
+from PyQt6.QtCore import Qt
+from cards import RANKS, SUITS
+
+CARD_DIR = os.path.join('_internal', 'palaceData', 'cards')
+BACK = 'back'
+
+# Every PNG is decoded once, and every (card, face down, rotation, size)
+# variant is scaled once; labels share the cached pixmaps
+sources = {}
+pixmaps = {}
+# Variants preload() already decoded and scaled, waiting to become pixmaps.
+# QImage may be built off the GUI thread, QPixmap may not.
+images = {}
+
+def imageName(card, faceDown):
+    if faceDown:
+        return BACK
+    return f"{card[0].lower()}_of_{card[1].lower()}"
+
+def imagePath(name):
+    return os.path.join(CARD_DIR, f"{name}.png")
+
+def source(name):
+    pixmap = sources.get(name)
+    if pixmap is None:
+        pixmap = sources[name] = QPixmap(imagePath(name))
+    return pixmap
+
+def transform(image, rotation, width, height):
+    # A QImage or a QPixmap; width and height are the upright size, a quarter
+    # turn swaps them
+    if rotation:
+        image = image.transformed(QTransform().rotate(rotation), Qt.TransformationMode.SmoothTransformation)
+    if rotation % 180:
+        width, height = height, width
+    return image.scaled(width, height, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+def pixmap(card, faceDown, rotation, width, height):
+    name = imageName(card, faceDown)
+    key = (name, rotation, width, height)
+    cached = pixmaps.get(key)
+    if cached is None:
+        image = images.pop(key, None)
+        if image is None:
+            cached = transform(source(name), rotation, width, height)
+        else:
+            cached = QPixmap.fromImage(image)
+        pixmaps[key] = cached
+    return cached
+
+def preload(variants):
+    # Decodes every card and scales it to each (rotation, width, height) on a
+    # background thread, so the first deal finds them ready. A variant drawn
+    # before it is done is decoded on the spot, as without preload().
+    names = [BACK] + [f"{rank.lower()}_of_{suit}" for rank in RANKS for suit in SUITS]
+    thread = threading.Thread(target=decode, args=(names, variants), daemon=True)
+    thread.start()
+    return thread
+
+def decode(names, variants):
+    for name in names:
+        image = QImage(imagePath(name))
+        for rotation, width, height in variants:
+            key = (name, rotation, width, height)
+            if key not in pixmaps:
+                images[key] = transform(image, rotation, width, height)
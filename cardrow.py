@@ -0,0 +1,85 @@
+from PyQt6.QtWidgets import QLabel
+from PyQt6.QtCore import Qt
+import cardimages
+
+CARD_STYLE = "border: 0px solid black; background-color: transparent;"
+SPACER_AT = 10  # Hands this long get a blank slot at the end
+
+class CardRow:
+    # One pooled label per card slot of a layout. update() compares the new
+    # cards with what each slot already shows and only touches the slots that
+    # differ; labels past the end of the row are hidden and kept for reuse.
+    def __init__(self, layout, cardSize, buttonSize, hidden=False, rotate=False, enabled=True, placeholder=False, spacer=False):
+        self.layout = layout
+        self.cardSize = cardSize
+        self.buttonSize = tuple(reversed(buttonSize)) if rotate else buttonSize
+        self.hidden = hidden
+        self.rotation = 90 if rotate else 0
+        self.enabled = enabled
+        self.placeholder = placeholder
+        self.spacer = spacer
+        self.slots = []
+        self.shown = []
+        self.count = 0
+        self.onClick = None
+        # The blank fills an empty row or trails a long hand
+        self.blank = QLabel()
+        self.blank.setFixedSize(*buttonSize)
+        self.blank.hide()
+        layout.addWidget(self.blank)
+
+    def labels(self):
+        return self.slots[:self.count]
+
+    def slot(self, index):
+        if index == len(self.slots):
+            label = QLabel()
+            label.setFixedSize(*self.buttonSize)
+            label.setStyleSheet(CARD_STYLE)
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.mousePressEvent = lambda event, index=index: self.click(index)
+            self.layout.insertWidget(index, label)
+            self.slots.append(label)
+            self.shown.append(None)
+        return self.slots[index]
+
+    def update(self, cards, onClick=None):
+        self.onClick = onClick
+        for index, card in enumerate(cards):
+            label = self.slot(index)
+            faceDown = self.hidden or bool(card[3])
+            key = (card[0], card[1], faceDown) if card[0] else None
+            if self.shown[index] != key:
+                if key is None:
+                    label.clear()  # The blank card a winner's hand ends with
+                else:
+                    label.setPixmap(cardimages.pixmap(card, faceDown, self.rotation, *self.cardSize))
+                self.shown[index] = key
+            if label.styleSheet() != CARD_STYLE:
+                label.setStyleSheet(CARD_STYLE)
+            if label.isEnabled() != self.enabled:
+                label.setEnabled(self.enabled)
+            if label.isHidden():
+                label.show()
+        for label in self.slots[len(cards):self.count]:
+            label.hide()
+        self.count = len(cards)
+        showBlank = (self.placeholder and not cards) or (self.spacer and len(cards) >= SPACER_AT)
+        if self.blank.isHidden() == showBlank:
+            self.blank.setVisible(showBlank)
+
+    def clear(self):
+        self.update([])
+
+    def reveal(self, label, card):
+        index = self.slots.index(label)
+        label.setPixmap(cardimages.pixmap(card, False, self.rotation, *self.cardSize))
+        self.shown[index] = (card[0], card[1], False)
+
+    def setEnabled(self, enabled):
+        for label in self.labels():
+            label.setEnabled(enabled)
+
+    def click(self, index):
+        if self.onClick and index < self.count and self.shown[index] is not None:
+            self.onClick(index, self.slots[index])
@@ -0,0 +1,98 @@
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+VALUES = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+SUITS = ['clubs', 'spades', 'hearts', 'diamonds']
+RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+
+# A card is rankIndex * 4 + suitIndex (0-51); a set of cards is a 52-bit mask
+# with the four suits of each rank packed into one nibble.
+DECK_SIZE = 52
+FULL_DECK = (1 << DECK_SIZE) - 1
+RANK_BITS = 0xF
+TWO = RANK_INDEX['2']
+SEVEN = RANK_INDEX['7']
+TEN = RANK_INDEX['10']
+NO_RANK = -1
+
+# Flag byte, same meaning as the two booleans at the end of a card tuple
+FACE_UP = 1
+FACE_DOWN = 2
+
+NIBBLE_COUNTS = [bin(i).count('1') for i in range(16)]
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(mask):
+        return bin(mask).count('1')
+
+def makeCard(rank, suit):
+    return RANK_INDEX[rank] << 2 | SUIT_INDEX[suit]
+
+def rankOf(card):
+    return card >> 2
+
+def suitOf(card):
+    return card & 3
+
+def rankMask(rank):
+    return RANK_BITS << (rank << 2)
+
+def rankCount(mask, rank):
+    return NIBBLE_COUNTS[mask >> (rank << 2) & RANK_BITS]
+
+def cardsIn(mask):
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+    return cards
+
+def ranksIn(mask):
+    ranks = 0
+    for rank in range(len(RANKS)):
+        if mask >> (rank << 2) & RANK_BITS:
+            ranks |= 1 << rank
+    return ranks
+
+def toMask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << card
+    return mask
+
+# Packed single byte form: card index in the low six bits, flags in the top two
+def packCard(card, flags=0):
+    return card | flags << 6
+
+def unpackCard(byte):
+    return byte & 0x3F, byte >> 6
+
+# Converters to and from the (rank, suit, faceUp, faceDown) tuples used by the
+# views and the JSON wire format
+# Stands in for a card a seat may not see, e.g. another player's or a face
+# down one; it is always drawn face down
+HIDDEN_CARD = ('?', '?', False, True)
+
+def toTuple(card, flags=0):
+    return (RANKS[card >> 2], SUITS[card & 3], bool(flags & FACE_UP), bool(flags & FACE_DOWN))
+
+def fromTuple(card):
+    flags = (FACE_UP if card[2] else 0) | (FACE_DOWN if card[3] else 0)
+    return makeCard(card[0], card[1]), flags
+
+def toTuples(cards, flags=0):
+    return [toTuple(card, flags) for card in cards]
+
+def fromTuples(cards):
+    return [makeCard(card[0], card[1]) for card in cards]
+
+def maskToTuples(mask, flags=0):
+    return [toTuple(card, flags) for card in cardsIn(mask)]
+
+def tuplesToMask(cards):
+    mask = 0
+    for card in cards:
+        mask |= 1 << makeCard(card[0], card[1])
+    return mask
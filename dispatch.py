@@ -0,0 +1,85 @@
+import time
+import logs
+
+log = logs.getLogger('dispatch')
+
+# Every message type on the game connections. A message's opcode is its index
+# here, so handlers, counters and timings are all plain list lookups.
+ACTIONS = [
+    'hello',
+    'lobbyJoin',
+    'lobbyLog',
+    'lobbyFull',
+    'start',
+    'leave',
+    'join',
+    'resume',
+    'resumed',
+    'deal',
+    'confirmTopCards',
+    'startGame',
+    'move',
+    'intent',
+    'playCard',
+    'snapshot',
+    'resyncRequest',
+    'playAgainRequest',
+    'resetGame',
+    'gameOver',
+    'disconnect',
+    'ping',
+    'pong',
+]
+OPCODES = {action: opcode for opcode, action in enumerate(ACTIONS)}
+UNKNOWN = len(ACTIONS)  # Counted like any other opcode, never handled
+
+def opcode(action):
+    return OPCODES.get(action, UNKNOWN)
+
+def actionName(opcode):
+    return ACTIONS[opcode] if opcode < UNKNOWN else 'unknown'
+
+class Dispatcher:
+    # Handler table for one end of a connection. dispatch(data, *args) calls
+    # handler(*args, data) for the message's opcode and adds the call to that
+    # opcode's count and time; messages without a handler are only counted.
+    def __init__(self, name):
+        self.name = name
+        self.handlers = [None] * (UNKNOWN + 1)
+        self.counts = [0] * (UNKNOWN + 1)
+        self.seconds = [0.0] * (UNKNOWN + 1)
+
+    def register(self, action, handler):
+        if action not in OPCODES:
+            raise ValueError(f"Unknown action: {action}")
+        self.handlers[OPCODES[action]] = handler
+
+    def registerAll(self, handlers):
+        for action, handler in handlers.items():
+            self.register(action, handler)
+
+    def handles(self, action):
+        return self.handlers[opcode(action)] is not None
+
+    def dispatch(self, data, *args):
+        code = OPCODES.get(data.get('action'), UNKNOWN)
+        self.counts[code] += 1
+        handler = self.handlers[code]
+        if handler is None:
+            log.debug("%s: no handler for '%s'", self.name, data.get('action'))
+            return False
+        start = time.perf_counter()
+        try:
+            handler(*args, data)
+        finally:
+            self.seconds[code] += time.perf_counter() - start
+        return True
+
+    def stats(self):
+        # (action, count, total seconds) for every opcode seen so far
+        return [(actionName(code), count, self.seconds[code]) for code, count in enumerate(self.counts) if count]
+
+    def report(self):
+        for action, count, seconds in self.stats():
+            log.info("%s: %-16s %6d messages %9.3f ms total %8.1f us each",
+                     self.name, action, count, seconds * 1000, seconds / count * 1e6)
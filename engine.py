@@ -0,0 +1,327 @@
+import random
+from itertools import combinations
+from cards import RANKS, DECK_SIZE, TWO, SEVEN, TEN, NO_RANK, FACE_UP, FACE_DOWN, \
+    RANK_BITS, popcount, rankMask, cardsIn, toMask, maskToTuples, tuplesToMask, toTuples, fromTuples
+
+HAND_SIZE = 3
+TOP_CARD_COUNT = 3
+
+# Move kinds, a move is (kind, mask of the cards involved)
+CHOOSE_TOP = 'chooseTop'
+PLAY = 'play'
+PICKUP = 'pickUp'
+
+# What the last transition did, so callers can animate it
+PLAYED = 'played'
+AGAIN = 'again'
+BOMBED = 'bombed'
+PICKED_UP = 'pickedUp'
+WON = 'won'
+
+class PlayerState:
+    def __init__(self, name, hand=0, topCards=0, bottomCards=0, blind=0):
+        self.name = name
+        self.hand = hand
+        self.topCards = topCards
+        self.bottomCards = bottomCards
+        self.blind = blind  # Face down cards that were moved into the hand
+
+    @classmethod
+    def fromTuples(cls, name, hand, topCards, bottomCards):
+        blind = tuplesToMask(card for card in hand if card[3])
+        return cls(name, tuplesToMask(hand), tuplesToMask(topCards), tuplesToMask(bottomCards), blind)
+
+    def copy(self):
+        return PlayerState(self.name, self.hand, self.topCards, self.bottomCards, self.blind)
+
+    def cardCount(self):
+        return popcount(self.hand) + popcount(self.topCards) + popcount(self.bottomCards)
+
+    def handTuples(self):
+        return maskToTuples(self.hand & ~self.blind) + maskToTuples(self.blind, FACE_DOWN)
+
+    def topTuples(self):
+        return maskToTuples(self.topCards, FACE_UP)
+
+    def bottomTuples(self):
+        return maskToTuples(self.bottomCards, FACE_DOWN)
+
+class GameState:
+    def __init__(self, players, deck=None, pile=None, sevenSwitch=False, currentPlayerIndex=0, topCardSelectionPhase=True):
+        self.players = players
+        self.deck = deck or []
+        self.pile = pile or []
+        self.sevenSwitch = sevenSwitch
+        self.currentPlayerIndex = currentPlayerIndex
+        self.topCardSelectionPhase = topCardSelectionPhase
+        self.pileRun = pileRun(self.pile)
+        self.winner = None
+        self.lastEvent = None
+        self.lastMove = None
+        self.burnt = []
+
+    @classmethod
+    def fromTuples(cls, players, deck, pile, sevenSwitch, currentPlayerIndex, topCardSelectionPhase):
+        players = [PlayerState.fromTuples(player.name, player.hand, player.topCards, player.bottomCards) for player in players]
+        return cls(players, fromTuples(deck), fromTuples(pile), sevenSwitch, currentPlayerIndex, topCardSelectionPhase)
+
+    def copy(self):
+        state = GameState.__new__(GameState)
+        state.players = [player.copy() for player in self.players]
+        state.deck = list(self.deck)
+        state.pile = list(self.pile)
+        state.sevenSwitch = self.sevenSwitch
+        state.currentPlayerIndex = self.currentPlayerIndex
+        state.topCardSelectionPhase = self.topCardSelectionPhase
+        state.pileRun = self.pileRun
+        state.winner = self.winner
+        state.lastEvent = None
+        state.lastMove = None
+        state.burnt = []
+        return state
+
+    def currentPlayer(self):
+        return self.players[self.currentPlayerIndex]
+
+    def deckTuples(self):
+        return toTuples(self.deck)
+
+    def pileTuples(self):
+        return toTuples(self.pile)
+
+    def burntTuples(self):
+        return toTuples(self.burnt)
+
+def pileRun(pile):
+    run = 0
+    for card in reversed(pile):
+        if card >> 2 != pile[-1] >> 2:
+            break
+        run += 1
+    return run
+
+def createDeck():
+    return list(range(DECK_SIZE))
+
+def newGame(numPlayers, rng=random, names=None):
+    deck = createDeck()
+    rng.shuffle(deck)
+    players = []
+    for i in range(numPlayers):
+        name = names[i] if names else f"Player {i + 1}"
+        players.append(PlayerState(name, toMask(deck[3:9]), 0, toMask(deck[:3])))
+        deck = deck[9:]
+    return GameState(players, deck)
+
+def topRank(pile):
+    return pile[-1] >> 2 if pile else NO_RANK
+
+def beats(rank, top, sevenSwitch):
+    if sevenSwitch:
+        return rank <= SEVEN or rank == TEN
+    return rank == TWO or rank == TEN or rank >= top
+
+# Playable ranks (13-bit) and playable cards (52-bit) for every pile top and
+# sevenSwitch state, indexed [top + 1][sevenSwitch] so row 0 is the empty pile
+PLAYABLE_RANKS = [[sum(1 << rank for rank in range(len(RANKS)) if beats(rank, top, sevenSwitch))
+                   for sevenSwitch in (False, True)] for top in range(NO_RANK, len(RANKS))]
+PLAYABLE_CARDS = [[sum(rankMask(rank) for rank in range(len(RANKS)) if ranks >> rank & 1) for ranks in row]
+                  for row in PLAYABLE_RANKS]
+
+def playableRanks(top, sevenSwitch):
+    return PLAYABLE_RANKS[top + 1][sevenSwitch]
+
+def playableCards(top, sevenSwitch):
+    return PLAYABLE_CARDS[top + 1][sevenSwitch]
+
+def isPlayableRank(rank, top, sevenSwitch):
+    return PLAYABLE_RANKS[top + 1][sevenSwitch] >> rank & 1 == 1
+
+def isPlayable(card, pile, sevenSwitch):
+    return isPlayableRank(card >> 2, topRank(pile), sevenSwitch)
+
+def legalCards(state):
+    # Cards the current player may play: any face down card in the hand, or
+    # a face up one that beats the pile
+    player = state.currentPlayer()
+    return player.blind | player.hand & ~player.blind & playableCards(topRank(state.pile), state.sevenSwitch)
+
+def isLegal(state, move, seat=None):
+    # The checks apply() makes, on masks alone and without copying the state,
+    # so a host can turn away a bad move from a seat before touching its own
+    # copy. `seat` is who sent it, the current player by default.
+    kind, mask = move
+    if state.winner is not None:
+        return False
+    if seat is None:
+        seat = state.currentPlayerIndex
+    player = state.players[seat]
+    if kind == CHOOSE_TOP:
+        return state.topCardSelectionPhase and not player.topCards and popcount(mask) == TOP_CARD_COUNT and not mask & ~player.hand
+    if state.topCardSelectionPhase or seat != state.currentPlayerIndex:
+        return False
+    if kind == PICKUP:
+        return mask == 0 and bool(state.pile)
+    if kind != PLAY or mask <= 0 or mask & ~legalCards(state):
+        return False
+    if mask & player.blind:
+        return mask & (mask - 1) == 0  # One face down card at a time
+    low = mask & -mask
+    return not mask & ~rankMask((low.bit_length() - 1) >> 2)
+
+def isTerminal(state):
+    return state.winner is not None
+
+def legalMoves(state):
+    if state.winner is not None:
+        return []
+    player = state.currentPlayer()
+    if state.topCardSelectionPhase:
+        return [(CHOOSE_TOP, toMask(cards)) for cards in combinations(cardsIn(player.hand), TOP_CARD_COUNT)]
+    moves = []
+    if state.pile:
+        moves.append((PICKUP, 0))
+    blind = player.blind
+    while blind:
+        low = blind & -blind
+        moves.append((PLAY, low))
+        blind ^= low
+    playable = player.hand & ~player.blind & playableCards(topRank(state.pile), state.sevenSwitch)
+    for rank in range(len(RANKS)):
+        shift = rank << 2
+        suits = playable >> shift & RANK_BITS
+        cards = 0
+        while suits:
+            low = suits & -suits
+            cards |= low
+            suits ^= low
+            moves.append((PLAY, cards << shift))
+    return moves
+
+def apply(state, move):
+    kind, mask = move
+    if state.winner is not None:
+        raise ValueError("Game is already over")
+    if kind == CHOOSE_TOP:
+        if not state.topCardSelectionPhase:
+            raise ValueError("Top cards have already been chosen")
+        newState = chooseTopCards(state, state.currentPlayerIndex, mask)
+    elif state.topCardSelectionPhase:
+        raise ValueError("Top cards must be chosen first")
+    elif kind == PLAY:
+        newState = state.copy()
+        playCards(newState, mask)
+    elif kind == PICKUP:
+        if not state.pile:
+            raise ValueError("Pile is empty")
+        newState = state.copy()
+        pickUpPile(newState)
+    else:
+        raise ValueError(f"Unknown move: {kind}")
+    newState.lastMove = move
+    return newState
+
+def chooseTopCards(state, seat, mask):
+    if popcount(mask) != TOP_CARD_COUNT:
+        raise ValueError(f"Exactly {TOP_CARD_COUNT} top cards must be chosen")
+    newState = state.copy()
+    player = newState.players[seat]
+    if player.topCards:
+        raise ValueError(f"{player.name} has already chosen top cards")
+    if mask & ~player.hand:
+        raise ValueError("Top cards must come from the hand")
+    player.hand &= ~mask
+    player.topCards = mask
+    passTopCardChoice(newState, seat)
+    return newState
+
+def passTopCardChoice(state, seat):
+    # After `seat` chose: on to the next seat still choosing, or to the first
+    # player once every seat has. Only reads topCards, so seat views use it too.
+    waiting = [i for i, p in enumerate(state.players) if not p.topCards]
+    if waiting:
+        state.currentPlayerIndex = next((i for i in waiting if i > seat), waiting[0])
+    else:
+        state.topCardSelectionPhase = False
+        state.currentPlayerIndex = 0
+
+def playCards(state, mask):
+    if not mask:
+        raise ValueError("No cards selected")
+    player = state.currentPlayer()
+    if mask & ~player.hand:
+        raise ValueError("Cards are not in hand")
+    cards = cardsIn(mask)
+    rank = cards[0] >> 2
+    top = topRank(state.pile)
+    playable = isPlayableRank(rank, top, state.sevenSwitch)
+    blind = mask & player.blind
+    if blind:
+        if len(cards) > 1:
+            raise ValueError("Face down cards are played one at a time")
+    elif mask & ~rankMask(rank):
+        raise ValueError("Cards played together must share a rank")
+    elif not playable:
+        raise ValueError(f"{RANKS[rank]} cannot be played on {RANKS[top]}")
+
+    player.hand &= ~mask
+    player.blind &= ~mask
+    state.pileRun = state.pileRun + len(cards) if top == rank else len(cards)
+    state.pile.extend(cards)
+
+    if blind and not playable:
+        player.bottomCards |= player.blind
+        player.hand = player.hand & ~player.blind | toMask(state.pile)
+        player.blind = 0
+        state.pile = []
+        state.pileRun = 0
+        state.sevenSwitch = False
+        state.lastEvent = PICKED_UP
+        advanceTurn(state)
+        return
+
+    while popcount(player.hand) < HAND_SIZE and state.deck:
+        player.hand |= 1 << state.deck.pop(0)
+
+    if state.pileRun >= 4 or rank == TEN:
+        state.sevenSwitch = False
+        state.burnt = state.pile
+        state.pile = []
+        state.pileRun = 0
+        state.lastEvent = BOMBED
+    elif rank == TWO:
+        state.sevenSwitch = False
+        state.lastEvent = AGAIN
+    else:
+        state.sevenSwitch = rank == SEVEN
+        state.lastEvent = PLAYED
+    checkGameState(state)
+    if state.winner is not None:
+        state.lastEvent = WON
+    elif state.lastEvent == PLAYED:
+        advanceTurn(state)
+
+def pickUpPile(state):
+    player = state.currentPlayer()
+    player.hand |= toMask(state.pile)
+    state.pile = []
+    state.pileRun = 0
+    state.sevenSwitch = False
+    state.lastEvent = PICKED_UP
+    advanceTurn(state)
+
+def checkGameState(state):
+    player = state.currentPlayer()
+    if player.hand or state.deck:
+        return
+    if player.topCards:
+        player.hand = player.topCards
+        player.topCards = 0
+    elif player.bottomCards:
+        player.hand = player.blind = player.bottomCards
+        player.bottomCards = 0
+    else:
+        state.winner = state.currentPlayerIndex
+
+def advanceTurn(state):
+    state.currentPlayerIndex = (state.currentPlayerIndex + 1) % len(state.players)
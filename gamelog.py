@@ -0,0 +1,170 @@
+import os
+import sys
+import time
+import random
+import threading
+import engine
+
+# Append-only record of played games, one line per event. A game is its seed
+# and its moves: the deal is engine.newGame(players, Random(seed)), so nothing
+# else needs storing. Lines from different games may interleave, a server
+# writes every table to one file, so each carries its game's id. Ids count up
+# from 1 after every header, i.e. once per process that opened the file.
+#   palace-log <version>
+#   g <game> <seed> <players>
+#   c <game> <seat> <mask>    top cards chosen
+#   p <game> <seat> <mask>    cards played
+#   u <game> <seat>           pile picked up
+#   w <game> <seat>           game won
+# Masks are hex.
+VERSION = 1
+HEADER = 'palace-log'
+# PALACE_MOVE_LOG='' turns the GUI's log off
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.palace', 'moves.log')
+
+KINDS = {engine.CHOOSE_TOP: 'c', engine.PLAY: 'p', engine.PICKUP: 'u'}
+MOVES = {code: kind for kind, code in KINDS.items()}
+
+def newSeed():
+    return random.SystemRandom().getrandbits(64)
+
+def deal(numPlayers, seed, names=None):
+    return engine.newGame(numPlayers, random.Random(seed), names)
+
+def openLog(path=None):
+    # The GUI's log, None when it is turned off or cannot be opened
+    if path is None:
+        path = os.environ.get('PALACE_MOVE_LOG', DEFAULT_PATH)
+    if not path:
+        return None
+    try:
+        return GameLog(path)
+    except OSError:
+        return None
+
+class GameLog:
+    # Every line is written through as soon as it happens, so a crash loses
+    # at most the line being written
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'a', buffering=1)
+        self.lock = threading.Lock()
+        self.nextGame = 1
+        self.write(f"{HEADER} {VERSION}")
+
+    def write(self, line):
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def newGame(self, seed, numPlayers):
+        with self.lock:
+            game = self.nextGame
+            self.nextGame += 1
+        self.write(f"g {game} {seed} {numPlayers}")
+        return game
+
+    def record(self, game, seat, move, state):
+        # `state` is the state after the move, a win is written with it
+        kind, mask = move
+        if kind == engine.PICKUP:
+            self.write(f"u {game} {seat}")
+        else:
+            self.write(f"{KINDS[kind]} {game} {seat} {mask:x}")
+        if state.winner is not None:
+            self.write(f"w {game} {state.winner}")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class LoggedGame:
+    def __init__(self, name, seed, numPlayers):
+        self.name = name
+        self.seed = seed
+        self.numPlayers = numPlayers
+        self.moves = []  # (seat, move)
+        self.winner = None
+
+def readGames(path):
+    # Yields each game once its win is read, so only games in progress are
+    # held; ones the log ends on come last, with no winner
+    games = {}
+    session = 0
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            fields = line.split()
+            if not fields:
+                continue
+            try:
+                if fields[0] == HEADER:
+                    if int(fields[1]) != VERSION:
+                        raise ValueError(f"Unsupported log version {fields[1]}")
+                    yield from games.values()
+                    games = {}
+                    session += 1
+                    continue
+                code, game = fields[0], int(fields[1])
+                if code == 'g':
+                    games[game] = LoggedGame(f"{os.path.basename(path)}:{session}:{game}", int(fields[2]), int(fields[3]))
+                elif code == 'w':
+                    finished = games.pop(game)
+                    finished.winner = int(fields[2])
+                    yield finished
+                elif code == 'u':
+                    games[game].moves.append((int(fields[2]), (engine.PICKUP, 0)))
+                else:
+                    games[game].moves.append((int(fields[2]), (MOVES[code], int(fields[3], 16))))
+            except (KeyError, IndexError, ValueError) as e:
+                raise ValueError(f"{path}:{number}: bad log line {line.strip()!r} ({e})") from None
+    yield from games.values()
+
+def replay(game):
+    # Re-runs the game through the current rules. Returns None when it plays
+    # out as logged, otherwise what went differently.
+    state = deal(game.numPlayers, game.seed)
+    for index, (seat, move) in enumerate(game.moves, 1):
+        try:
+            if move[0] == engine.CHOOSE_TOP:
+                state = engine.chooseTopCards(state, seat, move[1])
+            elif seat != state.currentPlayerIndex:
+                return f"move {index}: seat {seat + 1} moved on seat {state.currentPlayerIndex + 1}'s turn"
+            else:
+                state = engine.apply(state, move)
+        except ValueError as e:
+            return f"move {index}: {e}"
+    if state.winner != game.winner:
+        logged = 'no winner' if game.winner is None else f"seat {game.winner + 1} won"
+        replayed = 'no winner' if state.winner is None else f"seat {state.winner + 1} wins"
+        return f"{logged} in the log, {replayed} on replay"
+    return None
+
+def replayFiles(paths, out=sys.stdout):
+    games = moves = 0
+    diverged = []
+    start = time.perf_counter()
+    for path in paths:
+        for game in readGames(path):
+            games += 1
+            moves += len(game.moves)
+            problem = replay(game)
+            if problem:
+                diverged.append((game, problem))
+    elapsed = time.perf_counter() - start
+    for game, problem in diverged:
+        print(f"{game.name} (seed {game.seed}, {game.numPlayers} players): {problem}", file=out)
+    rate = games / elapsed if elapsed else 0
+    print(f"{games} games, {moves} moves replayed in {elapsed:.2f} s ({rate:.0f} games/s), "
+          f"{len(diverged)} diverged", file=out)
+    return diverged
+
+def addArguments(parser):
+    parser.add_argument('logs', nargs='+', metavar='LOG', help=f"move logs to replay (the GUI writes {DEFAULT_PATH})")
+
+def run(args):
+    for path in args.logs:
+        if not os.path.exists(path):
+            raise ValueError(f"No such log: {path}")
+    if replayFiles(args.logs):
+        sys.exit(1)
@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+from collections import deque
+
+PING_INTERVAL = 2.0
+# Seconds without hearing anything before the peer is given up on,
+# PALACE_PEER_TIMEOUT overrides it
+PEER_TIMEOUT = float(os.environ.get('PALACE_PEER_TIMEOUT', 10))
+WINDOW = 256  # Round trips the percentiles are taken over
+SMOOTHING = 0.125  # Weight of a new round trip in the moving average, as in TCP's SRTT
+MAX_PENDING = 64
+
+class LatencyStats:
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.average = None
+
+    def record(self, rtt):
+        self.samples.append(rtt)
+        if self.average is None:
+            self.average = rtt
+        else:
+            self.average += SMOOTHING * (rtt - self.average)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def p99(self):
+        return self.percentile(0.99)
+
+class Heartbeat:
+    # Pings the peer from its own thread and times the pongs. Every message
+    # from the peer counts as a sign of life: call heard() for each one. After
+    # `timeout` seconds of silence onDead() is called, and again after every
+    # further timeout until heard() or stop().
+    def __init__(self, send, onDead, onSample=None, interval=PING_INTERVAL, timeout=PEER_TIMEOUT):
+        self.send = send
+        self.onDead = onDead
+        self.onSample = onSample
+        self.interval = interval
+        self.timeout = timeout
+        self.stats = LatencyStats()
+        self.pending = {}  # Ping id -> perf_counter when it was sent
+        self.nextId = 0
+        self.lastHeard = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        # A stopped heartbeat can be started again, e.g. for the next connection
+        self.lastHeard = time.monotonic()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, args=(self.stopped,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def heard(self):
+        self.lastHeard = time.monotonic()
+
+    def run(self, stopped):
+        # Wakes often enough to notice a dead peer well inside the timeout
+        tick = min(self.interval, self.timeout / 4)
+        nextPing = time.monotonic()
+        while not stopped.wait(tick):
+            now = time.monotonic()
+            if now - self.lastHeard > self.timeout:
+                self.lastHeard = now
+                self.onDead()
+            elif now >= nextPing:
+                nextPing = now + self.interval
+                self.sendPing()
+
+    def sendPing(self):
+        self.nextId = (self.nextId + 1) & 0xFFFFFFFF
+        if len(self.pending) >= MAX_PENDING:
+            del self.pending[next(iter(self.pending))]  # Lost with a dropped connection
+        self.pending[self.nextId] = time.perf_counter()
+        self.send({'action': 'ping', 'id': self.nextId})
+
+    # Message handlers
+    def ping(self, data):
+        self.send({'action': 'pong', 'id': data['id']})
+
+    def pong(self, data):
+        sent = self.pending.pop(data['id'], None)
+        if sent is None:
+            return
+        self.stats.record(time.perf_counter() - sent)
+        if self.onSample:
+            self.onSample(self.stats.average, self.stats.p99())
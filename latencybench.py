@@ -0,0 +1,124 @@
+import sys
+import time
+import random
+import engine
+import ai
+import sync
+import wire
+import sockets
+import tableserver
+import seatview
+from cards import FACE_UP, cardsIn, maskToTuples, tuplesToMask
+
+class BenchClient:
+    # A seat driven by the greedy policy, talking to a local table server
+    # over the real wire protocol
+    def __init__(self, port, nodelay, table):
+        self.sock = sockets.connect('127.0.0.1', port, nodelay)
+        self.reader = wire.FrameReader(self.sock)
+        self.codec = wire.JSON
+        self.send(wire.helloRequest())
+        self.codec = wire.codecFromReply(self.receive())
+        self.send({'action': 'join', 'name': table, 'table': table, 'players': 2})
+        self.sync = sync.StateSync()
+        self.view = None  # Only what this seat may see, see seatview
+        self.seat = None
+
+    def send(self, *messages):
+        self.sock.sendall(b''.join(wire.frame(self.codec.encode(data)) for data in messages))
+
+    def receive(self, action=None):
+        data = self.codec.decode(self.reader.readFrame())
+        if action is not None and data['action'] != action:
+            raise ValueError(f"Expected '{action}', got '{data['action']}'")
+        return data
+
+    def close(self):
+        self.sock.close()
+
+def chooseMove(view, rng):
+    # The greedy policy on the cards the seat can see. With none of them
+    # playable it turns over a face down card if it has one, which goes
+    # without a card for the server to pick.
+    player = view.currentPlayer()
+    state = engine.GameState([engine.PlayerState(player.name, player.hand, player.topCards)], pile=list(view.pile),
+                             sevenSwitch=view.sevenSwitch, topCardSelectionPhase=view.topCardSelectionPhase)
+    moves = engine.legalMoves(state)
+    if view.topCardSelectionPhase or any(move[0] == engine.PLAY for move in moves):
+        return ai.greedyPolicy(state, rng)
+    if player.hidden:
+        return engine.PLAY, 0
+    return engine.PICKUP, 0
+
+def playGame(port, nodelay, table, rng):
+    # Returns the seconds from each move being sent to the other seat
+    # receiving it, and the same for the winning move plus its game over
+    seats = [BenchClient(port, nodelay, table) for _ in range(2)]
+    for client in seats:
+        deal = client.receive('deal')
+        client.seat = deal['seat']
+        client.view = client.sync.applySnapshot(deal['nicknames'], deal)
+    seats.sort(key=lambda client: client.seat)
+    while seats[0].view.topCardSelectionPhase:
+        seat = seats[0].view.currentPlayerIndex
+        move = chooseMove(seats[seat].view, rng)
+        seats[seat].send({'action': 'confirmTopCards', 'playerIndex': seat, 'topCards': maskToTuples(move[1], FACE_UP)})
+        other = seats[1 - seat]
+        data = other.receive('confirmTopCards')
+        for client in seats:
+            client.view = seatview.chooseTopCards(client.view, seat, tuplesToMask(data['topCards']))
+    for client in seats:
+        client.receive('startGame')
+    turns = []
+    while True:
+        mover = seats[seats[0].view.currentPlayerIndex]
+        other = seats[1 - mover.seat]
+        move = chooseMove(mover.view, rng)
+        start = time.perf_counter()
+        mover.send({'action': 'intent', 'kind': move[0], 'cards': cardsIn(move[1])})
+        data = other.receive('move')
+        arrived = time.perf_counter() - start
+        other.view = other.sync.applyMove(other.view, data)
+        mover.view = mover.sync.applyMove(mover.view, mover.receive('move'))
+        if other.view.winner is not None:
+            other.receive('gameOver')
+            finish = time.perf_counter() - start
+            break
+        turns.append(arrived)
+    for client in seats:
+        client.close()
+    return turns, finish
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def benchmark(games=20, seed=0, out=sys.stdout):
+    print(f"{'nodelay':<9}{'turns':>7}{'mean ms':>9}{'p50 ms':>8}{'p99 ms':>8}{'max ms':>8}{'game over ms':>14}", file=out)
+    results = {}
+    for nodelay in (True, False):
+        server = tableserver.TableServer('127.0.0.1', 0, nodelay=nodelay)
+        server.start()
+        port = server.server.server.sockets[0].getsockname()[1]
+        rng = random.Random(seed)
+        turns = []
+        finishes = []
+        try:
+            for game in range(games):
+                gameTurns, finish = playGame(port, nodelay, f"bench-{game}", rng)
+                turns += gameTurns
+                finishes.append(finish)
+        finally:
+            server.server.stop()
+        results[nodelay] = (turns, finishes)
+        print(f"{'on' if nodelay else 'off':<9}{len(turns):>7}{sum(turns) / len(turns) * 1000:>9.3f}"
+              f"{percentile(turns, 0.5) * 1000:>8.3f}{percentile(turns, 0.99) * 1000:>8.3f}{max(turns) * 1000:>8.3f}"
+              f"{sum(finishes) / len(finishes) * 1000:>14.3f}", file=out)
+    return results
+
+def addArguments(parser):
+    parser.add_argument('--games', type=int, default=20, help="games to play under each setting")
+    parser.add_argument('--seed', type=int, default=0)
+
+def run(args):
+    benchmark(args.games, args.seed)
@@ -0,0 +1,56 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+# Callers only put records on a queue; a listener thread does the console I/O,
+# so logging on the game and network paths never waits on stdout. Payload
+# dumps are DEBUG records and cost nothing unless PALACE_LOG=debug.
+ROOT = 'palace'
+DEFAULT_LEVEL = 'info'
+FORMAT = '%(asctime)s %(levelname)-7s %(name)s: %(message)s'
+
+listener = None
+
+def getLogger(name):
+    return logging.getLogger(f"{ROOT}.{name}")
+
+def parseLevel(name):
+    level = logging.getLevelName(str(name).upper())
+    if not isinstance(level, int):
+        raise ValueError(f"Unknown log level: {name}")
+    return level
+
+def configure(level=None, stream=None):
+    global listener
+    root = logging.getLogger(ROOT)
+    root.setLevel(parseLevel(level or os.environ.get('PALACE_LOG', DEFAULT_LEVEL)))
+    if listener is None:
+        records = queue.SimpleQueue()
+        handler = logging.StreamHandler(stream or sys.stderr)
+        handler.setFormatter(logging.Formatter(FORMAT, '%H:%M:%S'))
+        listener = logging.handlers.QueueListener(records, handler)
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.propagate = False
+        listener.start()
+        atexit.register(stop)
+    return root
+
+def stop():
+    # Flushes whatever is still queued
+    global listener
+    if listener is not None:
+        listener.stop()
+        listener = None
+        logging.getLogger(ROOT).handlers.clear()
+
+class lazy:
+    # A log argument that is only built if the record is actually emitted
+    def __init__(self, function, *args):
+        self.function = function
+        self.args = args
+
+    def __str__(self):
+        return str(self.function(*self.args))
@@ -1,73 +1,64 @@
+import time
+STARTED = time.perf_counter()  # Before the Qt imports, see --profile-startup
 import sys
+import argparse
+import errno
 import random
-import json
 import socket
 import threading
-import struct
-import time
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, \
     QLabel, QDialog, QGridLayout, QRadioButton, QButtonGroup, QSpacerItem, QSizePolicy, \
-    QTextEdit, QLineEdit
-from PyQt6.QtGui import QPixmap, QIcon, QTransform
-from PyQt6.QtCore import Qt, QCoreApplication, QTimer, pyqtSignal, QObject
-import qdarktheme
-
-# Dark Mode Styling
-Dark = qdarktheme.load_stylesheet(
-    theme="dark",
-    custom_colors={
-        "[dark]": {
-            "primary": "#0078D4",
-            "background": "#202124",
-            "border": "#8A8A8A",
-            "background>popup": "#252626",
-        }
-    },
-) + """
-    QMessageBox QLabel {
-        color: #E4E7EB;
-    }
-    QDialog {
-        background-color: #252626;
-    }
-    QComboBox:disabled {
-        background-color: #1A1A1C; 
-        border: 1px solid #3B3B3B;
-        color: #3B3B3B;  
-    }
-    QPushButton {
-    background-color: #0078D4; 
-    color: #FFFFFF;           
-    border: 1px solid #8A8A8A; 
-    }
-    QPushButton:hover {
-        background-color: #669df2; 
-        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                    stop:0 #80CFFF, stop:1 #004080);
-    }
-    QPushButton:pressed {
-        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                    stop:0 #004080, stop:1 #001B3D);
-    }
-    QPushButton:disabled {
-        background-color: #202124; 
-        border: 1px solid #3B3B3B;
-        color: #FFFFFF;   
-    }
-"""
-
-RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-VALUES = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+    QTextEdit, QLineEdit, QInputDialog
+from PyQt6.QtGui import QIcon
+from PyQt6.QtCore import Qt, QCoreApplication, pyqtSignal, QObject
+import engine
+import ai
+import sync
+import seatview
+import wire
+import asyncnet
+import logs
+import dispatch
+import heartbeat
+import sockets
+import tableserver
+import gamelog
+import cardimages
+import startup
+from cardrow import CardRow
+from scheduler import Scheduler
+from cards import RANK_INDEX, NO_RANK, FACE_UP, cardsIn, tuplesToMask, maskToTuples
+
 CARD_WIDTH = 56
 CARD_HEIGHT = 84
+CARD_VARIANTS = [(0, CARD_WIDTH, CARD_HEIGHT), (90, CARD_WIDTH, CARD_HEIGHT)]  # Every (rotation, size) drawn, see cardimages.preload
 BUTTON_WIDTH = 66
 BUTTON_HEIGHT = 87
 
+# Parts of the table a repaint can redraw; seats are marked by their index
+PILE = 'pile'
+DECK = 'deck'
+TURN = 'turn'
+TABLE_REGIONS = {PILE, DECK, TURN}
+
+# Purely visual pauses, in milliseconds
+REVEAL_DELAY = 1000  # A blind card that cannot be played stays up this long
+GAME_OVER_DELAY = 1200
+RECONNECT_DELAYS = [0, 0.25, 0.5, 1, 2, 4, 8, 8]  # Seconds, all within the server's resume timeout
+
+log = logs.getLogger('game')
+netLog = logs.getLogger('net')
+gameLog = None  # Opened by main(), see gamelog
+
+def describeCards(cards):
+    return ', '.join(f'{card[0]} of {card[1]}' for card in cards)
+
+def cardPixmap(card, faceDown=False, rotate=False):
+    return cardimages.pixmap(card, faceDown, 90 if rotate else 0, CARD_WIDTH, CARD_HEIGHT)
+
 class SignalCommunicator(QObject):
-    updateOpponentBottomCardsSignal = pyqtSignal(int, list)
-    updateOpponentTopCardsSignal = pyqtSignal(int, list)
-    updateOpponentHandSignal = pyqtSignal(int, list)
-    updateDeckSignal = pyqtSignal(dict)
     startGameSignal = pyqtSignal()
     proceedWithGameSetupSignal = pyqtSignal()
     updateUISignal = pyqtSignal()
@@ -80,6 +71,8 @@ class SignalCommunicator(QObject):
     playerDisconnectedSignal = pyqtSignal(str)
     connectionStatusSignal = pyqtSignal(str)
     disconnectSignal = pyqtSignal() 
+    dealSignal = pyqtSignal(dict)
+    latencySignal = pyqtSignal(float, float)
 
 def centerDialog(dialog, parent, name):
     offset = 0
@@ -103,11 +96,8 @@ class HostLobby(QDialog):
         self.mainWindow = mainWindow
         self.setWindowTitle("Host Lobby")
         self.setGeometry(0, 0, 300, 200)
-        self.serverSocket = None
-        self.clientSockets = []
-        self.clientAddresses = {}
-        self.clientNicknames = {}
-        self.serverThread = None
+        self.server = None
+        self.clientNickname = None
         self.running = False
         self.playerCount = 1  # Starting with host player
         self.communicator = mainWindow.communicator  # Get the communicator from mainWindow
@@ -143,118 +133,70 @@ class HostLobby(QDialog):
         centerDialog(self, self.mainWindow, "Host Lobby")
 
     def startServer(self):
+        # The game server listens from the start; the guest's lobby
+        # connection becomes the game connection
         try:
-            self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.serverSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.serverSocket.bind(('127.0.0.1', 12345))  # Bind to the loopback address for local testing
-            self.serverSocket.listen(5)
+            self.server = Server('127.0.0.1', 12345, self.communicator, lobby=self)  # Bind to the loopback address for local testing
             self.communicator.logTextSignal.emit("Server started, waiting for connections...")
             self.communicator.logTextSignal.emit("Host Connected")
             self.running = True
-            self.serverThread = threading.Thread(target=self.acceptConnections, daemon=True)
-            self.serverThread.start()
         except OSError as e:
-            if e.errno == 10048:
+            self.server = None
+            if e.errno in (10048, errno.EADDRINUSE):
                 self.communicator.logTextSignal.emit("Server is already running")
             else:
                 self.communicator.logTextSignal.emit(f"Failed to start server: {e}")
 
-    def acceptConnections(self):
-        while self.running:
-            try:
-                clientSocket, clientAddress = self.serverSocket.accept()
-                if len(self.clientSockets) >= 1:
-                    clientSocket.send(b'lobby full')
-                    self.logText.append(f"Connection attempt from {clientAddress}")
-                    clientSocket.close()
-                else:
-                    self.clientSockets.append(clientSocket)
-                    self.clientAddresses[clientSocket] = clientAddress
-                    threading.Thread(target=self.handleClient, args=(clientSocket,), daemon=True).start()
-                    threading.Thread(target=self.listenForDisconnection, args=(clientSocket,), daemon=True).start()
-            except Exception as e:
-                if self.running:  # Only log if the server is supposed to be running
-                    self.logText.append(f"Error accepting connections: {e}")
-
-    def handleClient(self, clientSocket):
-        try:
-            data = clientSocket.recv(1024).decode('utf-8')
-            if data == "Player":
-                data = f"Player {self.playerCount + 1}"
-            nickname = data
-            self.clientNicknames[clientSocket] = nickname
-            self.playerCount += 1
-            logMessage = f"{nickname} connected from {self.clientAddresses[clientSocket]}"
-            self.communicator.playerConnectedSignal.emit(logMessage)
-            self.sendLogToClients(logMessage)  # Send log message to all clients
-            self.communicator.playerCountLabelSignal.emit(f"Players: {self.playerCount}/2")
-            if self.playerCount > 1:
-                self.communicator.startButtonEnabledSignal.emit(True)
-        except Exception as e:
-            self.communicator.logTextSignal.emit(f"Error handling client: {e}")
+    # Called from the server's reader thread, they reach the widgets only
+    # through the communicator signals
+    def addClient(self, nickname):
+        if nickname == "Player":
+            nickname = f"Player {self.playerCount + 1}"
+        self.clientNickname = nickname
+        self.playerCount += 1
+        logMessage = f"{nickname} connected from {self.server.clientAddress}"
+        self.communicator.playerConnectedSignal.emit(logMessage)
+        self.sendLogToClients(logMessage)
+        self.communicator.playerCountLabelSignal.emit(f"Players: {self.playerCount}/2")
+        if self.playerCount > 1:
+            self.communicator.startButtonEnabledSignal.emit(True)
 
     def sendLogToClients(self, message):
-        for clientSocket in self.clientSockets:
-            try:
-                clientSocket.sendall(f"log: {message}".encode('utf-8'))
-            except Exception as e:
-                self.communicator.logTextSignal.emit(f"Failed to send log to client: {e}")
+        self.server.sendToClient({'action': 'lobbyLog', 'message': message})
 
-    def listenForDisconnection(self, clientSocket):
-        try:
-            while self.running:
-                data = clientSocket.recv(1024).decode('utf-8')
-                if data == 'leave':
-                    self.removeClient(clientSocket)
-                    break
-        except Exception as e:
-            self.removeClient(clientSocket)
-
-    def removeClient(self, clientSocket):
-        nickname = self.clientNicknames.pop(clientSocket, "Unknown")
-        if clientSocket in self.clientSockets:
-            self.clientSockets.remove(clientSocket)
-            self.clientAddresses.pop(clientSocket, None)
-            self.playerCount -= 1
-            message = f"{nickname} has left the server."
-            self.communicator.playerDisconnectedSignal.emit(message)
-            self.sendLogToClients(message)  # Send the disconnection message to all clients
-            self.communicator.playerCountLabelSignal.emit(f"Players: {self.playerCount}/2")
-            clientSocket.close()
-            if self.playerCount <= 1:
-                self.communicator.startButtonEnabledSignal.emit(False)
+    def removeClient(self):
+        if self.clientNickname is None:
+            return
+        message = f"{self.clientNickname} has left the server."
+        self.clientNickname = None
+        self.playerCount -= 1
+        self.communicator.playerDisconnectedSignal.emit(message)
+        self.communicator.playerCountLabelSignal.emit(f"Players: {self.playerCount}/2")
+        if self.playerCount <= 1:
+            self.communicator.startButtonEnabledSignal.emit(False)
 
     def startGame(self):
         self.logText.append("Starting game...")
-        self.notifyClientsToStart()
+        server = self.server
+        self.server = None  # The game owns the connection from here on
         self.accept()  # Close the lobby window
-        self.mainWindow.startHost()
+        self.mainWindow.startHost(server)
+        server.startGame()
 
-    def notifyClientsToStart(self):
-        for clientSocket in self.clientSockets:
-            try:
-                clientSocket.sendall(b'start')
-            except Exception as e:
-                self.logText.append(f"Failed to notify client: {e}")
+    def stopServer(self):
+        self.running = False
+        if self.server:
+            self.server.close()
+            self.server = None
 
     def backToOnlineDialog(self):
-        self.running = False
-        if self.serverSocket:
-            self.serverSocket.close()
-        for clientSocket in self.clientSockets:
-            clientSocket.close()
+        self.stopServer()
         self.accept()
         self.mainWindow.playOnline()
 
     def cleanup(self):
-        self.running = False
-        if self.serverSocket:
-            self.serverSocket.close()
-        for clientSocket in self.clientSockets:
-            clientSocket.close()
-        self.clientSockets = []
-        self.clientAddresses = {}
-        self.clientNicknames = {}
+        self.stopServer()
+        self.clientNickname = None
         self.playerCount = 1
 
     def closeEvent(self, event):
@@ -262,9 +204,9 @@ class HostLobby(QDialog):
         event.accept()
 
 class JoinLobby(QDialog):
-    connectionEstablished = pyqtSignal()
     startSignalReceived = pyqtSignal()
     lobbyFullSignal = pyqtSignal()
+    lobbyClosedSignal = pyqtSignal()
 
     def __init__(self, parent=None, mainWindow=None):
         super().__init__(parent)
@@ -272,14 +214,14 @@ class JoinLobby(QDialog):
         self.setWindowTitle("Join Lobby")
         self.setGeometry(0, 0, 300, 200)  # Default position, will be centered later
         self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, True)
-        self.clientSocket = None
+        self.client = None
         self.communicator = mainWindow.communicator  # Get the communicator from mainWindow
         self.initUI()
 
         # Connect signals to slots
-        self.connectionEstablished.connect(self.onConnectionEstablished)
         self.startSignalReceived.connect(self.onStartSignalReceived)
         self.lobbyFullSignal.connect(self.onLobbyFull)
+        self.lobbyClosedSignal.connect(self.onLobbyClosed)
 
         centerDialog(self, self, "GameView")
 
@@ -323,55 +265,33 @@ class JoinLobby(QDialog):
     def joinLobby(self):
         hostAddress = self.addressInput.text()
         nickname = self.nicknameInput.text() or "Player"
-        self.clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            self.clientSocket.connect((hostAddress, 12345))
-            self.clientSocket.sendall(nickname.encode('utf-8'))
-            self.connectionEstablished.emit()
-            threading.Thread(target=self.listenForStartSignal, daemon=True).start()
-            self.backButton.setVisible(False)
-            self.leaveButton.setVisible(True)
-            self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, False)
-            self.show()
-        except OSError as e:
-            if e.errno == 10049:
-                self.communicator.connectionStatusSignal.emit("Server does not exist.")
-            elif e.errno == 10061:
-                self.communicator.connectionStatusSignal.emit("Server is not running.")
-            else:
-                self.communicator.connectionStatusSignal.emit(f"Failed to connect: {e}")
-
-    def listenForStartSignal(self):
-        try:
-            while True:
-                self.joinButton.setDisabled(True)
-                data = self.clientSocket.recv(1024).decode('utf-8')
-                if data == 'start':
-                    self.startSignalReceived.emit()
-                    break
-                elif data == 'lobby full':
-                    self.lobbyFullSignal.emit()
-                    break
-                elif data.startswith('log:'):
-                    logMessage = data[4:].strip()
-                    self.communicator.logTextSignal.emit(logMessage)
-        except ConnectionResetError:
-            self.communicator.connectionStatusSignal.emit("Connection was closed by the server.")
-            self.leaveButton.setVisible(False)
-            self.backButton.setVisible(True)
-            self.joinButton.setDisabled(False)
-        except Exception as e:
-            self.communicator.connectionStatusSignal.emit(f"Error in listenForStartSignal: {e}")
-
-    def onConnectionEstablished(self):
-        self.communicator.connectionStatusSignal.emit(f"Connected to lobby")
+        self.client = LobbyClient(hostAddress, 12345, self.communicator, self, nickname)
+        if self.client.clientSocket is None:
+            self.client = None
+            return
+        self.communicator.connectionStatusSignal.emit("Connected to lobby")
+        self.joinButton.setDisabled(True)
+        self.backButton.setVisible(False)
+        self.leaveButton.setVisible(True)
+        self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, False)
+        self.show()
 
     def onStartSignalReceived(self):
+        client = self.client
+        self.client = None  # The game owns the connection from here on
         self.accept()
-        self.mainWindow.startClient()
+        self.mainWindow.startClient(client)
 
     def onLobbyFull(self):
         self.communicator.connectionStatusSignal.emit("Lobby is full. Unable to join.\n")
+        self.resetJoin()
+
+    def onLobbyClosed(self):
+        self.communicator.connectionStatusSignal.emit("Connection was closed by the server.")
+        self.resetJoin()
+
+    def resetJoin(self):
+        self.client = None
         self.leaveButton.setVisible(False)
         self.backButton.setVisible(True)
         self.joinButton.setDisabled(False)
@@ -379,10 +299,7 @@ class JoinLobby(QDialog):
         self.show()
 
     def leaveServer(self):
-        if self.clientSocket:
-            self.clientSocket.sendall(b'leave')
-            self.clientSocket.close()
-        self.clientSocket = None
+        self.cleanup()
         self.leaveButton.setVisible(False)
         self.communicator.connectionStatusSignal.emit("Disconnected from server.")
         self.addressInput.setEnabled(True)
@@ -393,201 +310,265 @@ class JoinLobby(QDialog):
         self.accept()
 
     def backToOnlineDialog(self):
-        if self.clientSocket:
-            try:
-                self.clientSocket.sendall(b'leave')
-            except (ConnectionResetError, BrokenPipeError):
-                pass
-            self.clientSocket.close()
+        self.cleanup()
         self.accept()
         self.mainWindow.playOnline()
 
     def cleanup(self):
-        if self.clientSocket:
-            try:
-                self.clientSocket.sendall(b'leave')
-            except Exception:
-                pass
-            self.clientSocket.close()
+        if self.client:
+            self.client.leave()
+        self.client = None
 
     def closeEvent(self, event):
         self.cleanup()
         event.accept()
 
-class Server:
-    def __init__(self, host, port, communicator):
+class GamePeer:
+    # Handlers for the messages both ends of a two player game understand,
+    # looked up by opcode. The controller is read when a message arrives,
+    # it is attached after the connection is made.
+    def gameDispatcher(self, name):
+        dispatcher = dispatch.Dispatcher(name)
+        dispatcher.registerAll({
+            'confirmTopCards': self.onConfirmTopCards,
+            'startGame': lambda data: self.controller.proceedWithGameSetup(),
+            'move': self.toController,
+            'intent': self.toController,
+            'resyncRequest': self.toController,
+            'snapshot': self.toController,
+            'playAgainRequest': self.onPlayAgainRequest,
+            'resetGame': lambda data: self.controller.resetGame(),
+            'gameOver': lambda data: self.controller.gameOverSignal.emit(data['winner']),
+            'disconnect': lambda data: self.controller.disconnectSignal.emit(),
+        })
+        return dispatcher
+
+    def createHeartbeat(self, send):
+        # Pings measure the round trip shown in the GameView and notice a peer
+        # that went away without closing the connection
+        self.heartbeat = heartbeat.Heartbeat(send, self.peerDead, self.communicator.latencySignal.emit)
+        self.dispatcher.registerAll({'ping': self.heartbeat.ping, 'pong': self.heartbeat.pong})
+
+    def peerDead(self):
+        # Shutting the socket down wakes the reader thread, which handles the drop
+        netLog.warning("Nothing heard from the peer in %.0f s, dropping the connection", self.heartbeat.timeout)
+        sock = self.clientSocket
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def toController(self, data):
+        # Handled on the GUI thread, see GameController.dispatcher
+        self.controller.messageSignal.emit(data)
+
+    def onConfirmTopCards(self, data):
+        self.toController(data)
+        self.controller.checkBothPlayersConfirmed()
+
+    def onPlayAgainRequest(self, data):
+        self.controller.playAgainCount = data['count']
+        self.controller.handlePlayAgain()
+
+class Server(GamePeer):
+    # The host's end of a two player game, served from one asyncnet event
+    # loop thread. The guest's lobby connection is kept and carries the game
+    # once the host starts it. While a guest is seated, anyone else is turned away.
+    def __init__(self, host, port, communicator, lobby=None):
         self.host = host
         self.port = port
         self.communicator = communicator
-        self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.serverSocket.bind((self.host, self.port))
-        self.serverSocket.listen(1)
+        self.lobby = lobby  # The HostLobby until the game starts
+        self.dispatcher = self.gameDispatcher('server')
+        self.dispatcher.registerAll({'lobbyJoin': self.onLobbyJoin, 'leave': self.onLeave})
+        self.createHeartbeat(self.sendToClient)
+        self.closing = threading.Event()
         self.controller = None 
+        self.client = None  # The guest's asyncnet connection
+        self.clientAddress = None
+        self.codec = wire.JSON
+        self.negotiated = False
+        self.server = asyncnet.AsyncServer(self.host, self.port, self)
+        self.server.start()
         self.communicator.logTextSignal.emit(f"Server listening on {self.host}:{self.port}\n")
-        self.clientSocket, self.clientAddress = self.serverSocket.accept()
-        self.communicator.logTextSignal.emit(f"Connection from {self.clientAddress}\n")
-
-        # Start a thread to handle client communication
-        threading.Thread(target=self.handleClient).start()
 
-    def handleClient(self):
+    # Protocol callbacks, on the loop thread
+    def connectionMade(self, connection):
+        if self.client is not None or self.lobby is None:
+            self.communicator.logTextSignal.emit(f"Connection attempt from {connection.address}")
+            self.turnAway(connection)
+            return False
+        self.communicator.logTextSignal.emit(f"Connection from {connection.address}\n")
+        self.client, self.clientAddress = connection, connection.address
+        self.codec = wire.JSON  # Until the guest's hello says otherwise
+        self.negotiated = False
+
+    def turnAway(self, connection):
+        # Answers the hello in JSON so any client can read why it was closed
+        connection.write(wire.frame(wire.JSON.encode(wire.helloReply(wire.JSON))) +
+                         wire.frame(wire.JSON.encode({'action': 'lobbyFull'})))
+        connection.shutdown()
+
+    def messageReceived(self, connection, message):
         try:
-            while True:
-                data = self.receiveData(self.clientSocket)
-                if data:
-                    self.processClientData(data)
-                else:
-                    self.communicator.logTextSignal.emit("Client disconnected.")
-                    self.handleClientDisconnection()
-                    break
-        except (ConnectionResetError, ConnectionAbortedError, OSError) as e:
-            self.communicator.logTextSignal.emit(f"Connection error: {e}\n")
-            self.handleClientDisconnection()
-        except Exception as e:
-            self.communicator.logTextSignal.emit(f"Unexpected error: {e}\n")
-            self.handleClientDisconnection()
-        if self.clientSocket:
-            self.clientSocket.close()
+            data = self.codec.decode(message)
+        except (ValueError, KeyError, TypeError) as e:
+            netLog.warning("Dropped a malformed message from the client: %s", e)
+            return
+        netLog.debug("Received: %s", data)
+        self.heartbeat.heard()
+        if not self.negotiated:
+            self.negotiateCodec(data)
+        else:
+            self.processClientData(data)
+
+    def connectionLost(self, connection):
+        if connection is not self.client:
+            return
+        self.client = None
+        self.heartbeat.stop()
+        if self.closing.is_set():
+            return
+        if self.lobby is not None:
+            # The guest left the lobby, the next one can take the seat
+            self.communicator.logTextSignal.emit("Client disconnected.")
+            self.lobby.removeClient()
+            return
+        self.dispatcher.report()
+        self.handleClientDisconnection()
+
+    def dropClient(self, connection):
+        # A connection closed from this end is not reported lost, so it is
+        # handled here before the close
+        self.connectionLost(connection)
+        connection.shutdown()
+
+    def negotiateCodec(self, hello):
+        # The hello exchange is JSON, everything after it uses the agreed codec
+        codec = wire.acceptHello(hello)
+        self.sendToClient(wire.helloReply(codec))
+        self.codec = codec
+        self.negotiated = True
+        self.heartbeat.start()
+
+    def peerDead(self):
+        netLog.warning("Nothing heard from the peer in %.0f s, dropping the connection", self.heartbeat.timeout)
+        connection = self.client
+        if connection:
+            self.server.callSoon(self.dropClient, connection)
+
+    def onLobbyJoin(self, data):
+        if self.lobby is not None:
+            self.lobby.addClient(data.get('name') or "Player")
+
+    def onLeave(self, data):
+        if self.lobby is not None and self.client:
+            self.dropClient(self.client)
+
+    def startGame(self):
+        # From here on the guest's connection is the game connection
+        self.lobby = None
+        self.sendToClient({'action': 'start'})
 
     def handleClientDisconnection(self):
-        self.clientSocket.close()
-        self.clientSocket = None
         self.communicator.connectionStatusSignal.emit("Client disconnected.")
         self.communicator.playerDisconnectedSignal.emit("Client has left the server.")
     
     def disconnect(self):
         self.communicator.logTextSignal.emit("Disconnected from client.")
         self.communicator.disconnectSignal.emit() 
-        if self.clientSocket:
-            try:
-                self.clientSocket.shutdown(socket.SHUT_RDWR)
-            except Exception:
-                pass
-            self.clientSocket.close()
-            self.clientSocket = None
-        if self.serverSocket:
-            self.serverSocket.close()
+        self.close()
 
     def sendDisconnectSignalToClient(self):
-        if self.clientSocket:
-            try:
-                data = json.dumps({'action': 'disconnect'}).encode('utf-8')
-                self.clientSocket.sendall(struct.pack('>I', len(data)) + data)
-            except Exception as e:
-                self.communicator.logTextSignal.emit(f"Failed to send disconnect signal to client: {e}")
+        self.sendToClient({'action': 'disconnect'})
     
     def processClientData(self, data):
         if data is None:
             return
-        if data['action'] == 'confirmTopCards':
-            playerIndex = int(data['playerIndex'])
-            self.communicator.updateOpponentBottomCardsSignal.emit(playerIndex, data['bottomCards'])
-            self.communicator.updateOpponentTopCardsSignal.emit(playerIndex, data['topCards'])
-            self.communicator.updateOpponentHandSignal.emit(playerIndex, data['hand'])
-            self.controller.checkBothPlayersConfirmed()
-        elif data['action'] == 'startGame':
-            self.controller.proceedWithGameSetup()
-        elif data['action'] == 'playCard':
-            self.controller.receiveGameState(data)
-        elif data['action'] == 'playAgainRequest':
-            self.controller.playAgainCount = data['count']
-            self.controller.handlePlayAgain()
-        elif data['action'] == 'resetGame':
-            self.controller.resetGame()
-        elif data['action'] == 'gameOver':
-            self.controller.gameOverSignal.emit(data['winner'])
-        elif data['action'] == 'disconnect':
-            self.controller.disconnectSignal.emit()
-
-    def sendToClient(self, data):
-        if self.clientSocket:
-            try:
-                serializedData = json.dumps(data).encode('utf-8')
-                msgLen = struct.pack('>I', len(serializedData))
-                print(f"Sending data to client: {data}\n")
-                self.clientSocket.sendall(msgLen + serializedData)
-            except Exception as e:
-                print(f"Error sending data to client: {e}\n")
+        self.dispatcher.dispatch(data)
+
+    def sendToClient(self, *messages):
+        # Several messages go out as one write, so they arrive together. Any
+        # thread may send, the write happens on the loop thread in call order.
+        connection = self.client
+        if connection:
+            netLog.debug("Sending to client: %s", messages)
+            connection.send(b''.join(wire.frame(self.codec.encode(data)) for data in messages))
         else:
-            print("Client socket is not connected\n")
-
-    def receiveData(self, sock):
-        rawMsgLen = self.recvall(sock, 4)
-        if not rawMsgLen:
-            return None
-        msglen = struct.unpack('>I', rawMsgLen)[0]
-        message = self.recvall(sock, msglen)
-        if message is None:
-            return None
-        data = json.loads(message)
-        print(f"Received data: {data}\n")
-        return data
-
-    def recvall(self, sock, n):
-        data = b''
-        while len(data) < n:
-            packet = sock.recv(n - len(data))
-            if not packet:
-                return None
-            data += packet
-        return data
+            netLog.warning("Client socket is not connected")
 
     def close(self):
-        if self.clientSocket:
-            try:
-                self.clientSocket.shutdown(socket.SHUT_RDWR)
-            except Exception:
-                pass
-            self.clientSocket.close()
-        if self.serverSocket:
-            self.serverSocket.close()
+        self.closing.set()
+        self.heartbeat.stop()
+        self.server.stop()
+        self.client = None
 
-class Client:
+class Client(GamePeer):
     def __init__(self, host, port, communicator):
         self.host = host
         self.port = port
         self.communicator = communicator
-        self.clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.dispatcher = self.gameDispatcher('client')
+        self.sendLock = threading.Lock()
+        self.createHeartbeat(self.sendHeartbeat)
         self.controller = None 
+        self.closing = threading.Event()
         try:
-            self.clientSocket.connect((self.host, self.port))
-            self.communicator.logTextSignal.emit("Connected to the server\n")
+            self.connect()
             threading.Thread(target=self.handleServer).start()
+            self.heartbeat.start()
         except Exception as e:
-            self.communicator.logTextSignal.emit(f"Failed to connect to the server: {e}\n")
             self.clientSocket = None  
+            self.connectFailed(e)
+
+    def connectFailed(self, error):
+        self.communicator.logTextSignal.emit(f"Failed to connect to the server: {error}\n")
+
+    def connect(self):
+        self.codec = wire.JSON
+        self.clientSocket = sockets.connect(self.host, self.port)
+        self.communicator.logTextSignal.emit("Connected to the server\n")
+        self.reader = wire.FrameReader(self.clientSocket)
+        self.sendToServer(wire.helloRequest())
+        self.codec = wire.codecFromReply(self.receiveData())
 
     def handleServer(self):
+        reason = self.readServer()
+        while reason and self.resume():
+            reason = self.readServer()
+        if reason and not self.closing.is_set():
+            self.communicator.connectionStatusSignal.emit(reason)
+            self.disconnect()
+        self.dispatcher.report()
+        if self.clientSocket:
+            self.clientSocket.close()
+
+    def readServer(self):
+        # Handles messages until the connection ends, returns why it ended or
+        # None when that was on purpose
         try:
             while self.clientSocket:
-                data = self.receiveData(self.clientSocket)
-                if data:
-                    if data.get('action') == 'disconnect':
-                        self.communicator.connectionStatusSignal.emit("Server disconnected.")
-                        self.disconnect()
-                        break
-                    self.processServerData(data)
-                else:
+                data = self.receiveData()
+                if not data:
+                    return "Server disconnected."
+                if data.get('action') == 'disconnect':
                     self.communicator.connectionStatusSignal.emit("Server disconnected.")
                     self.disconnect()
-                    break
+                    return None
+                self.processServerData(data)
         except (ConnectionResetError, ConnectionAbortedError, OSError) as e:
-            self.communicator.connectionStatusSignal.emit(f"Connection error: {e}\n")
-            self.disconnect()
+            return f"Connection error: {e}\n"
         except Exception as e:
-            self.communicator.connectionStatusSignal.emit(f"Unexpected error: {e}\n")
-            self.disconnect()
-        if self.clientSocket:
-            self.clientSocket.close()
+            return f"Unexpected error: {e}\n"
+        return None
+
+    def resume(self):
+        # A peer to peer game ends with its connection
+        return False
 
     def disconnect(self):
-        if self.clientSocket:
-            try:
-                self.clientSocket.shutdown(socket.SHUT_RDWR)
-            except Exception:
-                pass
-            self.clientSocket.close()
-            self.clientSocket = None
+        self.close()
         self.communicator.connectionStatusSignal.emit("Disconnected from server.")
         self.communicator.disconnectSignal.emit()
     
@@ -595,62 +576,37 @@ class Client:
         if data is None:
             self.communicator.logTextSignal.emit("Received None data from server\n")
             return
-        if data['action'] == 'confirmTopCards':
-            playerIndex = int(data['playerIndex'])
-            self.communicator.updateOpponentBottomCardsSignal.emit(playerIndex, data['bottomCards'])
-            self.communicator.updateOpponentTopCardsSignal.emit(playerIndex, data['topCards'])
-            self.communicator.updateOpponentHandSignal.emit(playerIndex, data['hand'])
-            self.controller.checkBothPlayersConfirmed()
-        elif data['action'] == 'deckSync':
-            self.communicator.updateDeckSignal.emit(data)
-        elif data['action'] == 'startGame':
-            self.controller.proceedWithGameSetup()
-        elif data['action'] == 'playCard':
-            self.controller.receiveGameState(data)
-        elif data['action'] == 'playAgainRequest':
-            self.controller.playAgainCount = data['count']
-            self.controller.handlePlayAgain()
-        elif data['action'] == 'resetGame':
-            self.controller.resetGame()
-        elif data['action'] == 'gameOver':
-            self.controller.gameOverSignal.emit(data['winner'])
-        elif data['action'] == 'disconnect':
-            self.controller.disconnectSignal.emit()
+        self.dispatcher.dispatch(data)
 
-    def sendToServer(self, data):
+    def sendToServer(self, *messages):
+        # Several messages go out as one write, so they arrive together
         if self.clientSocket:
             try:
-                serializedData = json.dumps(data).encode('utf-8')
-                msgLen = struct.pack('>I', len(serializedData))
-                print(f"Sending data to server: {data}\n")
-                self.clientSocket.sendall(msgLen + serializedData)
+                netLog.debug("Sending to server: %s", messages)
+                payload = b''.join(wire.frame(self.codec.encode(data)) for data in messages)
+                with self.sendLock:
+                    self.clientSocket.sendall(payload)
             except Exception as e:
-                print(f"Error sending data to server: {e}\n")
+                netLog.warning("Error sending data to server: %s", e)
         else:
-            print("Client socket is not connected\n")
+            netLog.warning("Client socket is not connected")
 
-    def receiveData(self, sock):
-        rawMsgLen = self.recvall(sock, 4)
-        if not rawMsgLen:
-            return None
-        msglen = struct.unpack('>I', rawMsgLen)[0]
-        message = self.recvall(sock, msglen)
+    def sendHeartbeat(self, data):
+        if self.clientSocket:  # Nothing to ping while reconnecting
+            self.sendToServer(data)
+
+    def receiveData(self):
+        message = self.reader.readFrame()
         if message is None:
             return None
-        data = json.loads(message)
-        print(f"Received data: {data}\n")
-        return data
-
-    def recvall(self, sock, n):
-        data = b''
-        while len(data) < n:
-            packet = sock.recv(n - len(data))
-            if not packet:
-                return None
-            data += packet
+        data = self.codec.decode(message)
+        netLog.debug("Received: %s", data)
+        self.heartbeat.heard()
         return data
 
     def close(self):
+        self.closing.set()
+        self.heartbeat.stop()
         if self.clientSocket:
             try:
                 self.clientSocket.shutdown(socket.SHUT_RDWR)
@@ -659,6 +615,126 @@ class Client:
             self.clientSocket.close()
             self.clientSocket = None
 
+class LobbyClient(Client):
+    # The guest's end of a hosted game. It joins the host's lobby, and once the
+    # host starts the game the same connection carries it. Game messages that
+    # arrive before the game window exists are held until attach().
+    LOBBY_ACTIONS = ('lobbyLog', 'lobbyFull', 'start', 'ping', 'pong')
+
+    def __init__(self, host, port, communicator, lobby, nickname):
+        self.lobby = lobby
+        self.held = []
+        self.holdLock = threading.Lock()
+        super().__init__(host, port, communicator)
+        if self.clientSocket:
+            self.sendToServer({'action': 'lobbyJoin', 'name': nickname})
+
+    def gameDispatcher(self, name):
+        dispatcher = super().gameDispatcher(name)
+        dispatcher.registerAll({
+            'deal': self.toController,
+            'lobbyLog': lambda data: self.communicator.logTextSignal.emit(data['message']),
+            'lobbyFull': self.onLobbyFull,
+            'start': lambda data: self.lobby.startSignalReceived.emit(),
+        })
+        return dispatcher
+
+    def connectFailed(self, error):
+        code = getattr(error, 'errno', None)
+        if code in (10049, errno.EADDRNOTAVAIL):
+            self.communicator.connectionStatusSignal.emit("Server does not exist.")
+        elif code in (10061, errno.ECONNREFUSED):
+            self.communicator.connectionStatusSignal.emit("Server is not running.")
+        else:
+            self.communicator.connectionStatusSignal.emit(f"Failed to connect: {error}")
+
+    def processServerData(self, data):
+        with self.holdLock:
+            if self.controller is None and data['action'] not in self.LOBBY_ACTIONS:
+                self.held.append(data)
+                return
+        self.dispatcher.dispatch(data)
+
+    def attach(self, controller):
+        # Replays what the host sent while the game window was being built
+        with self.holdLock:
+            self.controller = controller
+            for data in self.held:
+                self.dispatcher.dispatch(data)
+            self.held = []
+
+    def onLobbyFull(self, data):
+        self.close()
+        self.lobby.lobbyFullSignal.emit()
+
+    def leave(self):
+        if self.clientSocket:
+            self.sendToServer({'action': 'leave'})
+        self.close()
+
+    def disconnect(self):
+        if self.controller is not None:
+            super().disconnect()
+            return
+        self.close()
+        self.lobby.lobbyClosedSignal.emit()
+
+class TableClient(Client):
+    # Seat at a table on a dedicated palace server. The server deals, picks the
+    # seat and owns the game state; this side only sends its own choices and moves
+    def __init__(self, host, port, communicator, nickname, numPlayers=2):
+        self.token = None
+        super().__init__(host, port, communicator)
+        self.dispatcher.registerAll({
+            'deal': self.onDeal,
+            'resumed': self.onResumed,
+            'lobbyFull': self.onLobbyFull,
+            # The server sends startGame once every seat has chosen
+            'confirmTopCards': self.toController,
+            'resetGame': lambda data: None,  # The deal that follows starts the next game
+        })
+        if self.clientSocket:
+            self.sendToServer({'action': 'join', 'name': nickname, 'players': numPlayers})
+
+    def processServerData(self, data):
+        if data is None or (self.controller is None and data['action'] not in ('deal', 'lobbyFull', 'ping', 'pong')):
+            return
+        self.dispatcher.dispatch(data)
+
+    def onDeal(self, data):
+        self.token = data.get('token')
+        self.communicator.dealSignal.emit(data)
+
+    def onLobbyFull(self, data):
+        # The server had no seat for this join
+        self.communicator.connectionStatusSignal.emit("No open seat on the server.")
+        self.disconnect()
+
+    def onResumed(self, data):
+        netLog.info("Resumed %s seat %d at move %d", data['table'], data['seat'] + 1, data['seq'])
+        self.communicator.connectionStatusSignal.emit("Reconnected to the server.")
+
+    def resume(self):
+        # Runs on the reader thread after the connection drops. The server
+        # holds the seat for a while and answers the resume request with just
+        # the moves played meanwhile, or a snapshot.
+        if self.token is None or self.controller is None or self.closing.is_set():
+            return False
+        self.communicator.connectionStatusSignal.emit("Connection lost, reconnecting...")
+        for delay in RECONNECT_DELAYS:
+            if self.closing.wait(delay):
+                return False
+            if self.clientSocket:
+                self.clientSocket.close()
+            try:
+                self.connect()
+            except OSError as e:
+                netLog.info("Reconnect failed: %s", e)
+                continue
+            self.sendToServer(self.controller.sync.resumeRequest(self.token))
+            return True
+        return False
+
 class GameOverDialog(QDialog):
     playAgainSignal = pyqtSignal()
     mainMenuSignal = pyqtSignal()
@@ -714,6 +790,7 @@ class HomeScreen(QWidget):
         self.communicator.playerConnectedSignal.connect(self.updateLogText)
         self.communicator.playerDisconnectedSignal.connect(self.updateLogText)
         self.communicator.connectionStatusSignal.connect(self.updateLogText)
+        self.communicator.dealSignal.connect(self.startTableGame)
 
     def initUI(self):
         self.setWindowTitle('Palace')
@@ -813,7 +890,7 @@ class HomeScreen(QWidget):
         self.difficultyGroup.addButton(easyButton, 1)
         self.difficultyGroup.addButton(mediumButton, 2)
         self.difficultyGroup.addButton(hardButton, 3)
-        self.difficultyGroup.addButton(impossibleButton, 3)
+        self.difficultyGroup.addButton(impossibleButton, 4)
 
         layout.addWidget(easyButton)
         layout.addWidget(mediumButton)
@@ -840,9 +917,10 @@ class HomeScreen(QWidget):
         if numPlayers in [2, 3, 4]:
             dialog.accept()
             self.hide()
-            difficultyMap = {1: 'easy', 2: 'medium', 3: 'hard'}
+            difficultyMap = {1: 'easy', 2: 'medium', 3: 'hard', 4: 'impossible'}
             difficultyLevel = difficultyMap.get(difficulty, 'medium')
-            self.controller = GameController(numPlayers, difficultyLevel, self.geometry())  # Pass the geometry
+            # The local player hosts the table, every other seat is a CPU
+            self.controller = GameController(numPlayers, difficultyLevel, self, isHost=True, mainWindow=self)
             self.controller.view.show()
 
     def playOnline(self):
@@ -863,6 +941,12 @@ class HomeScreen(QWidget):
 
         layout.addWidget(QLabel())
 
+        serverButton = QPushButton("Join Dedicated Server")
+        serverButton.clicked.connect(lambda: self.joinDedicatedServer(self.onlineDialog))
+        layout.addWidget(serverButton)
+
+        layout.addWidget(QLabel())
+
         closeButton = QPushButton("Close")
         closeButton.setFixedWidth(75)
         closeButton.clicked.connect(self.onlineDialog.accept)
@@ -882,19 +966,46 @@ class HomeScreen(QWidget):
         self.joinLobbyDialog.show()
         onlineDialog.accept()
 
-    def startHost(self):
+    def startHost(self, server):
+        # The lobby's server, its guest connection carries the game
         self.hide()
-        self.server = Server('localhost', 5555, self.communicator)
+        self.server = server
         self.controller = GameController(numPlayers=2, difficulty='medium', parentCoord=self, connection=self.server, isHost=True, mainWindow=self)  
         self.server.controller = self.controller
         self.controller.view.show()
 
-    def startClient(self):
+    def startClient(self, client):
+        # The lobby's connection, game messages it held are replayed by attach()
         self.hide()
-        self.client = Client('localhost', 5555, self.communicator) 
+        self.client = client
         self.controller = GameController(numPlayers=2, difficulty='medium', parentCoord=self, connection=self.client, isHost=False, mainWindow=self) 
-        self.client.controller = self.controller
+        self.client.attach(self.controller)
         self.controller.view.show()
+
+    def joinDedicatedServer(self, onlineDialog):
+        address, ok = QInputDialog.getText(onlineDialog, "Dedicated Server", "Server address:", text=f"localhost:{tableserver.PORT}")
+        if not ok or not address:
+            return
+        nickname, ok = QInputDialog.getText(onlineDialog, "Dedicated Server", "Nickname:", text="Player")
+        if not ok:
+            return
+        host, _, port = address.partition(':')
+        self.tableClient = TableClient(host, int(port or tableserver.PORT), self.communicator, nickname or "Player")
+        if self.tableClient.clientSocket is None:
+            return
+        onlineDialog.accept()
+        self.hide()
+
+    def startTableGame(self, data):
+        # Every deal from the server, the first one opens the game window
+        if self.controller is None or self.controller.connection is not self.tableClient:
+            self.controller = GameController(numPlayers=len(data['players']), difficulty='medium', parentCoord=self,
+                                             connection=self.tableClient, isHost=False, mainWindow=self, seat=data['seat'])
+            self.tableClient.controller = self.controller
+            self.controller.view.show()
+        else:
+            self.controller.resetGame()
+        self.controller.loadDeal(data)
     
     def showRules(self):
         self.rulesDialog = QDialog(self)
@@ -1001,6 +1112,42 @@ class Player:
         self.hand.extend(pile)
         pile.clear()
 
+class CpuPlayer(QObject):
+    moveReady = pyqtSignal(int, object)
+
+    def __init__(self, difficulty):
+        super().__init__()
+        self.difficulty = difficulty
+        self.generation = 0
+        # The search is CPU bound, so it gets its own process to keep the GIL
+        # away from the event loop; the cheap policies only need a thread
+        if difficulty in ai.SEARCH_DIFFICULTIES:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executor.submit(ai.warmUp)  # Start the worker before the first CPU turn
+
+    def requestMove(self, state, seed):
+        seat = state.currentPlayerIndex
+        generation = self.generation
+        future = self.executor.submit(ai.chooseMove, state, self.difficulty, seed)
+        future.add_done_callback(lambda future: self.deliverMove(seat, generation, future))
+
+    def cancelMoves(self):
+        self.generation += 1
+
+    def deliverMove(self, seat, generation, future):
+        # Runs on the executor's thread, the queued signal hands the move to the GUI thread
+        if future.cancelled() or generation != self.generation:
+            return
+        try:
+            self.moveReady.emit(seat, future.result())
+        except Exception as e:
+            log.error("CPU move failed: %s", e)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 class GameView(QWidget):
     def __init__(self, controller, playerType, communicator, parentCoord):
         super().__init__()
@@ -1010,11 +1157,9 @@ class GameView(QWidget):
         self.initUI()
 
         # Connect signals to slots
-        self.communicator.updateOpponentBottomCardsSignal.connect(self.updateOpponentBottomCards)
-        self.communicator.updateOpponentTopCardsSignal.connect(self.updateOpponentTopCards)
-        self.communicator.updateOpponentHandSignal.connect(self.updateOpponentHand)
         self.communicator.resetGameSignal.connect(self.handleResetGame)
         self.communicator.disconnectSignal.connect(self.handleDisconnect)
+        self.communicator.latencySignal.connect(self.updateLatency)
 
         # Use the centerDialog function to position the window
         centerDialog(self, parentCoord, "GameView")
@@ -1034,11 +1179,12 @@ class GameView(QWidget):
         self.disconnectButton.clicked.connect(self.disconnect)
         self.layout.addWidget(self.disconnectButton, 0, 0)
         
-        # Disconnect Button Spacer (row 0, column 0)
-        self.disconnectButtonSpacer = QLabel()
-        self.disconnectButtonSpacer.setFixedWidth(125)
-        self.disconnectButtonSpacer.setFixedHeight(25)
-        self.layout.addWidget(self.disconnectButtonSpacer, 0, 9)
+        # Round trip to the other side, also the Disconnect Button's spacer (row 0, column 9)
+        self.latencyLabel = QLabel()
+        self.latencyLabel.setFixedWidth(125)
+        self.latencyLabel.setFixedHeight(25)
+        self.latencyLabel.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        self.layout.addWidget(self.latencyLabel, 0, 9)
         
         # Opponent Hand (row 0, column 5)
         self.opponentHandContainer = QWidget()
@@ -1052,7 +1198,7 @@ class GameView(QWidget):
         self.layout.addLayout(self.opponentHandContainerLayout, 0, 5, alignment=Qt.AlignmentFlag.AlignCenter)
         
         # Opponent Hand Label (row 1, column 5)
-        self.opponentHandLabel = QLabel(f"{'Player 2' if self.playerType == 'Player 1' else 'Player 1'}'s Hand")
+        self.opponentHandLabel = QLabel(self.seatLabel(1))
         self.opponentHandLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.layout.addWidget(self.opponentHandLabel, 1, 5, alignment=Qt.AlignmentFlag.AlignCenter)
 
@@ -1148,6 +1294,13 @@ class GameView(QWidget):
         # Width of the center console column
         self.layout.setColumnMinimumWidth(5, 500)
 
+        self.playerHandRow = self.cardRow(self.playerHandLayout, spacer=True)
+        self.opponentHandRow = self.cardRow(self.opponentHandLayout, hidden=True, spacer=True)
+        self.topCardsRow = self.cardRow(self.topCardsLayout, enabled=False, placeholder=True)
+        self.opponentTopCardsRow = self.cardRow(self.opponentTopCardsLayout, enabled=False, placeholder=True)
+        self.bottomCardsRow = self.cardRow(self.bottomCardsLayout, hidden=True, placeholder=True)
+        self.opponentBottomCardsRow = self.cardRow(self.opponentBottomCardsLayout, hidden=True, placeholder=True)
+
         if self.controller.numPlayers >= 3:
             # Player 3 setup
             self.player3HandLayout = QVBoxLayout()
@@ -1155,7 +1308,7 @@ class GameView(QWidget):
             self.player3BottomCardsLayout = QVBoxLayout()
 
             self.layout.addLayout(self.player3HandLayout, 5, 0, alignment=Qt.AlignmentFlag.AlignCenter)
-            self.player3HandLabel = QLabel("Player 3's Hand")
+            self.player3HandLabel = QLabel(self.seatLabel(2))
             self.player3HandLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.layout.addWidget(self.player3HandLabel, 5, 1, alignment=Qt.AlignmentFlag.AlignCenter)
             self.layout.addLayout(self.player3TopCardsLayout, 5, 2, alignment=Qt.AlignmentFlag.AlignCenter)
@@ -1164,6 +1317,7 @@ class GameView(QWidget):
             # Spacer (row 5, column 4)
             spacer3 = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
             self.layout.addItem(spacer3, 5, 4)
+            self.player3Rows = self.sideSeatRows(self.player3HandLayout, self.player3TopCardsLayout, self.player3BottomCardsLayout)
 
         if self.controller.numPlayers == 4:
             # Player 4 setup
@@ -1176,184 +1330,66 @@ class GameView(QWidget):
 
             self.layout.addLayout(self.player4BottomCardsLayout, 5, 7, alignment=Qt.AlignmentFlag.AlignCenter)
             self.layout.addLayout(self.player4TopCardsLayout, 5, 8, alignment=Qt.AlignmentFlag.AlignCenter)
-            self.player4HandLabel = QLabel("Player 4's Hand")
+            self.player4HandLabel = QLabel(self.seatLabel(3))
             self.player4HandLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.layout.addWidget(self.player4HandLabel, 5, 9, alignment=Qt.AlignmentFlag.AlignCenter)
             self.layout.addLayout(self.player4HandLayout, 5, 10, alignment=Qt.AlignmentFlag.AlignCenter)
+            self.player4Rows = self.sideSeatRows(self.player4HandLayout, self.player4TopCardsLayout, self.player4BottomCardsLayout)
 
         self.setLayout(self.layout)
     
-    def clear_layout(self, layout):
-        while layout.count():
-            item = layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
-    
+    def seatLabel(self, offset):
+        # Seats go round the table from this window's: across, left, then right
+        return f"Player {(self.controller.seat + offset) % self.controller.numPlayers + 1}'s Hand"
+
+    def cardRow(self, layout, **options):
+        return CardRow(layout, (CARD_WIDTH, CARD_HEIGHT), (BUTTON_WIDTH, BUTTON_HEIGHT), **options)
+
+    def sideSeatRows(self, handLayout, topCardsLayout, bottomCardsLayout):
+        return (self.cardRow(handLayout, hidden=True, rotate=True),
+                self.cardRow(topCardsLayout, rotate=True, enabled=False),
+                self.cardRow(bottomCardsLayout, hidden=True, rotate=True, enabled=False))
+
     def handleResetGame(self):
         self.clearSelectionLayout()
     
-    def updateHandButtons(self, hand, layout, isPlayer, rotate):
-        self.controller.playCardButtons = []
-        for idx, card in enumerate(hand):
-            button = QLabel()
-            if rotate:
-                button.setFixedSize(BUTTON_HEIGHT, BUTTON_WIDTH)
-            else:
-                button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            if not card[0] == "":
-                if not card[3] and isPlayer:
-                    pixmap = QPixmap(fr"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    if rotate:
-                        transform = QTransform().rotate(90)
-                        pixmap = pixmap.transformed(transform, Qt.TransformationMode.SmoothTransformation).scaled(CARD_HEIGHT, CARD_WIDTH, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    else:
-                        pixmap = pixmap.scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    button.setPixmap(pixmap)
-                else:
-                    pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    if rotate:
-                        transform = QTransform().rotate(90)
-                        pixmap = pixmap.transformed(transform, Qt.TransformationMode.SmoothTransformation).scaled(CARD_HEIGHT, CARD_WIDTH, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    else:
-                        pixmap = pixmap.scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                    button.setPixmap(pixmap)
-                button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                if self.controller.topCardSelectionPhase:
-                    button.mousePressEvent = lambda event, idx=idx, btn=button: self.selectTopCard(idx, btn)
-                else:
-                    try:
-                        button.mousePressEvent = lambda event, idx=idx, btn=button: self.controller.prepareCardPlacement(idx, btn)
-                    except IndexError:
-                        return
-            self.controller.playCardButtons.append(button)
-            layout.addWidget(button)
-
-        if len(hand) >= 10:
-            spacer = QLabel()
-            spacer.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            layout.addWidget(spacer)
-
-    def updateOpponentHand(self, playerIndex, hand):
-        self.controller.players[playerIndex].hand = hand
-        self.updateOpponentHandButtons(hand)
-        
-    def updateOpponentTopCards(self, playerIndex, topCards):
-        self.controller.players[playerIndex].topCards = topCards
-        self.updateOpponentTopCardButtons(topCards)
-        
-    def updateOpponentBottomCards(self, playerIndex, bottomCards):
-        self.controller.players[playerIndex].bottomCards = bottomCards
-        self.updateOpponentBottomCardButtons(bottomCards)
-    
+    def updateHandButtons(self, hand, row, isPlayer):
+        onClick = None
+        if isPlayer:
+            onClick = self.selectTopCard if self.controller.topCardSelectionPhase else self.controller.prepareCardPlacement
+        row.update(hand, onClick)
+        self.controller.playCardButtons = row.labels()
+
     def updatePlayerHandButtons(self, hand):
-        self.clear_layout(self.playerHandLayout)  # Clear the layout before updating
-        self.updateHandButtons(hand, self.playerHandLayout, True, False)
+        self.updateHandButtons(hand, self.playerHandRow, True)
 
     def updateOpponentHandButtons(self, hand):
-        self.clear_layout(self.opponentHandLayout)  # Clear the layout before updating
-        self.updateHandButtons(hand, self.opponentHandLayout, False, False)
+        self.updateHandButtons(hand, self.opponentHandRow, False)
 
     def updatePlayerTopCardButtons(self, topCards):
-        self.clear_layout(self.topCardsLayout)  # Clear the layout before updating
-        for card in topCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(f"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            button.setDisabled(True)
-            self.topCardsLayout.addWidget(button)
-        if not topCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.topCardsLayout.addWidget(self.placeholder)
+        self.topCardsRow.update(topCards)
 
     def updateOpponentTopCardButtons(self, topCards):
-        self.clear_layout(self.opponentTopCardsLayout)  # Clear the layout before updating
-        for card in topCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(f"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            button.setDisabled(True)
-            self.opponentTopCardsLayout.addWidget(button)
-        if not topCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.opponentTopCardsLayout.addWidget(self.placeholder)
+        self.opponentTopCardsRow.update(topCards)
 
     def updatePlayerBottomCardButtons(self, bottomCards):
-        self.clear_layout(self.bottomCardsLayout)  # Clear the layout before updating
-        for card in bottomCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.bottomCardsLayout.addWidget(button)
-        if not bottomCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.bottomCardsLayout.addWidget(self.placeholder)
+        self.bottomCardsRow.update(bottomCards)
 
     def updateOpponentBottomCardButtons(self, bottomCards):
-        self.clear_layout(self.opponentBottomCardsLayout)  # Clear the layout before updating
-        for card in bottomCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.opponentBottomCardsLayout.addWidget(button)
-        if not bottomCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.opponentBottomCardsLayout.addWidget(self.placeholder)
+        self.opponentBottomCardsRow.update(bottomCards)
 
-    def confirmTopCardSelection(self):
-        if self.controller.isHost:
-            playerIndex = 0
-        else:
-            playerIndex = 1
-        player = self.controller.players[playerIndex]
-        for card, _ in self.chosenCards:
-            player.topCards.append((card[0], card[1], True, False))
-        for card, cardIndex in sorted(self.chosenCards, key=lambda x: x[1], reverse=True):
-            del player.hand[cardIndex]
+    def updateSideSeatButtons(self, player, rows):
+        handRow, topCardsRow, bottomCardsRow = rows
+        handRow.update(player.hand)
+        topCardsRow.update(player.topCards)
+        bottomCardsRow.update(player.bottomCards)
 
-        if self.controller.isHost:
-            self.updatePlayerBottomCardButtons(player.bottomCards)
-            self.updatePlayerTopCardButtons(player.topCards)
-            self.updatePlayerHandButtons(player.hand)
-            self.controller.connection.sendToClient({
-                'action': 'confirmTopCards',
-                'playerIndex': playerIndex,
-                'topCards': player.topCards,
-                'bottomCards': player.bottomCards,
-                'hand': player.hand
-            })
-        else:
-            self.updatePlayerBottomCardButtons(player.bottomCards)
-            self.updatePlayerTopCardButtons(player.topCards)
-            self.updatePlayerHandButtons(player.hand)
-            self.controller.connection.sendToServer({
-                'action': 'confirmTopCards',
-                'playerIndex': playerIndex,
-                'topCards': player.topCards,
-                'bottomCards': player.bottomCards,
-                'hand': player.hand
-            })
+    def confirmTopCardSelection(self):
+        self.controller.confirmTopCards(tuplesToMask([card for card, _ in self.chosenCards]))
         self.confirmButton.setDisabled(True)
         self.disablePlayerHand()
     
-    def updateUI(self, currentPlayer, deckSize, pile):
+    def updateUI(self, currentPlayer, deckSize, pile, regions=TABLE_REGIONS):
         self.enableOpponentHandNotClickable()
         if self.controller.topCardSelectionPhase:
             self.confirmButton.setEnabled(len(self.chosenCards) == 3)
@@ -1363,38 +1399,35 @@ class GameView(QWidget):
             self.deckLabel.setVisible(True)
             self.currentPlayerLabel.setVisible(True)
             self.pickUpPileButton.setVisible(True)
-            self.currentPlayerLabel.setText("Current Player: ")
             self.pileLabel.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.currentPlayerLabel.setText(f"Current Player: {currentPlayer.name}")
 
-            if deckSize:
-                self.deckLabel.setText(f"Draw Deck:\n\n{deckSize} cards remaining")
-            else:
-                self.deckLabel.setText("Draw Deck:\n\nEmpty")
+            if TURN in regions:
+                self.currentPlayerLabel.setText(f"Current Player: {currentPlayer.name}")
+
+            if DECK in regions:
+                if deckSize:
+                    self.deckLabel.setText(f"Draw Deck:\n\n{deckSize} cards remaining")
+                else:
+                    self.deckLabel.setText("Draw Deck:\n\nEmpty")
 
-            if self.pileLabel.text() != "Bombed!!!" and not pile:
-                self.pileLabel.setText("Pile: Empty")
-            
-            if pile:
-                topCard = pile[-1]
-                pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                self.pileLabel.setPixmap(pixmap)
+            if PILE in regions:
+                if self.pileLabel.text() != "Bombed!!!" and not pile:
+                    self.pileLabel.setText("Pile: Empty")
+                if pile:
+                    topCard = pile[-1]
+                    self.pileLabel.setPixmap(cardPixmap(topCard))
 
             self.placeButton.setEnabled(len(self.controller.selectedCards) > 0)
        
     def revealCard(self, cardLabel, card):
-        pixmap = QPixmap(fr"_internal/palaceData/cards/{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        cardLabel.setPixmap(pixmap)
+        self.playerHandRow.reveal(cardLabel, card)
 
     def showTopCardSelection(self):
         self.chosenCards = []
         self.cardButtons = []
 
     def selectTopCard(self, cardIndex, button):
-        if self.controller.isHost:
-            playerIndex = 0 
-        else:
-            playerIndex = 1
+        playerIndex = self.controller.seat
         card = self.controller.players[playerIndex].hand[cardIndex]
         if (card, cardIndex) in self.chosenCards:
             self.chosenCards.remove((card, cardIndex))
@@ -1418,74 +1451,21 @@ class GameView(QWidget):
         self.placeButton.setVisible(False)
         self.confirmButton.setVisible(True)
         
-        # Clear player hand layout
-        while self.playerHandLayout.count():
-            item = self.playerHandLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent hand layout
-        while self.opponentHandLayout.count():
-            item = self.opponentHandLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear player top cards layout
-        while self.topCardsLayout.count():
-            item = self.topCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear player bottom cards layout
-        while self.bottomCardsLayout.count():
-            item = self.bottomCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent top cards layout
-        while self.opponentTopCardsLayout.count():
-            item = self.opponentTopCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent bottom cards layout
-        while self.opponentBottomCardsLayout.count():
-            item = self.opponentBottomCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
+        for row in (self.playerHandRow, self.opponentHandRow, self.topCardsRow, self.bottomCardsRow, self.opponentTopCardsRow, self.opponentBottomCardsRow):
+            row.clear()
 
     def enablePlayerHand(self):
-        for i in range(self.playerHandLayout.count()):
-            widget = self.playerHandLayout.itemAt(i).widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.setEnabled(True)
+        self.playerHandRow.setEnabled(True)
 
     def disablePlayerHand(self):
-        for i in range(self.playerHandLayout.count()):
-            widget = self.playerHandLayout.itemAt(i).widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.setEnabled(False)
+        self.playerHandRow.setEnabled(False)
 
     def enableOpponentHandNotClickable(self):
-        for i in range(self.opponentHandLayout.count()):
-            widget = self.opponentHandLayout.itemAt(i).widget()
-            if widget:
-                widget.setEnabled(True)
-                widget.mousePressEvent = lambda event: None 
+        self.opponentHandRow.setEnabled(True)
+
+    def updateLatency(self, average, p99):
+        self.latencyLabel.setText(f"Ping {average * 1000:.0f} ms")
+        self.latencyLabel.setToolTip(f"Round trip: {average * 1000:.1f} ms average, {p99 * 1000:.1f} ms p99")
 
     def handleDisconnect(self):
         if self.controller.isHost:
@@ -1507,8 +1487,10 @@ class GameView(QWidget):
     
 class GameController(QObject):
     gameOverSignal = pyqtSignal(str)
+    repaintSignal = pyqtSignal()
+    messageSignal = pyqtSignal(dict)
 
-    def __init__(self, numPlayers, difficulty, parentCoord, connection=None, isHost=False, mainWindow=None):
+    def __init__(self, numPlayers, difficulty, parentCoord, connection=None, isHost=False, mainWindow=None, seat=None):
         super().__init__()
         self.numPlayers = numPlayers
         self.difficulty = difficulty
@@ -1521,25 +1503,60 @@ class GameController(QObject):
         self.communicator.startGameSignal.connect(self.proceedWithGameSetup)
         self.communicator.proceedWithGameSetupSignal.connect(self.proceedWithGameSetupOnMainThread)
         self.communicator.updateUISignal.connect(self.updateUI)
-        self.communicator.updateDeckSignal.connect(self.receiveDeckFromServer)
-        self.gameOverSignal.connect(self.stopTimer)
-        self.communicator.setupGameSignal.connect(self.setupGame)
+        self.gameOverSignal.connect(self.announceWinner)
+        # Game messages arrive on the network thread and are handled on this
+        # one. The host holds the whole game and takes the guest's intents;
+        # every other seat holds only its own view and is sent the moves.
+        self.dispatcher = dispatch.Dispatcher('game')
         if isHost:
-            self.playerType = "Player 1"
+            self.dispatcher.registerAll({
+                'intent': self.receiveIntent,
+                'resyncRequest': lambda data: self.sendSnapshot(),
+            })
         else:
-            self.playerType = "Player 2"
+            self.dispatcher.registerAll({
+                'deal': self.loadDeal,
+                'move': self.receiveMove,
+                'snapshot': self.receiveSnapshot,
+            })
+        self.dispatcher.register('confirmTopCards', self.receiveTopCards)
+        self.messageSignal.connect(self.dispatcher.dispatch)
+        self.scheduler = Scheduler()
+        # Queued, so every change made before control returns to the event
+        # loop is drawn by a single repaint
+        self.dirty = set()
+        self.dirtyLock = threading.Lock()
+        self.repaintPending = False
+        self.repaintSignal.connect(self.repaint, Qt.ConnectionType.QueuedConnection)
+        self.communicator.setupGameSignal.connect(self.setupGame)
+        # The seat this window plays; a dedicated server may seat us anywhere
+        if seat is None:
+            seat = 0 if isHost else 1
+        self.seat = seat
+        self.playerType = f"Player {seat + 1}"
         self.view = GameView(self, self.playerType, self.communicator, parentCoord)
-        self.players = [Player("Player 1"), Player("Player 2")]
+        self.players = [Player(f"Player {i + 1}") for i in range(numPlayers)]
         self.sevenSwitch = False
         self.deck = []
         self.pile = []
         self.currentPlayerIndex = 0
         self.selectedCards = []
         self.playCardButtons = []
+        self.playableHand = None
+        self.playableKey = None
+        self.playableFlags = []
         self.topCardSelectionPhase = True
         self.connection = connection
+        self.sync = sync.StateSync()
+        self.seatView = None  # What a seat other than the host's may see, see seatview
+        self.cpuPlayer = None
+        if connection is None:
+            self.cpuPlayer = CpuPlayer(difficulty)
+            self.cpuPlayer.moveReady.connect(self.applyMove)
         self.gameOver = False    
         self.playAgainCount = 0
+        self.rng = random.Random()
+        self.logGame = None  # This game's id in the move log, only the dealer writes one
         self.setupGame()
 
         # Track threads for cleanup
@@ -1579,6 +1596,10 @@ class GameController(QObject):
         self.connection.sendToClient(data)
     
     def requestPlayAgain(self):
+        if self.cpuPlayer:
+            self.resetGame()
+            self.setupGame()
+            return
         if self.playAgainCount == 2:
             self.handlePlayAgain()
         else:
@@ -1609,49 +1630,53 @@ class GameController(QObject):
         self.selectedCards = []
         self.playCardButtons = []
         self.topCardSelectionPhase = True
-        self.players = [Player("Player 1"), Player("Player 2")]
+        self.gameOver = False
+        self.logGame = None
+        self.sync.reset()
+        self.scheduler.cancel()
+        if self.cpuPlayer:
+            self.cpuPlayer.cancelMoves()
+        self.players = [Player(f"Player {i + 1}") for i in range(self.numPlayers)]
         self.view.clearSelectionLayout()
         self.communicator.resetGameSignal.emit()
     
-    def stopTimer(self, winner):
-        if hasattr(self, 'timer'):
-            self.timer.stop()
-        QApplication.processEvents()
-        time.sleep(1.2)
-        self.showGameOverDialog(winner)
+    def announceWinner(self, winner):
+        self.scheduler.after(GAME_OVER_DELAY, lambda: self.showGameOverDialog(winner))
     
-    def startGameLoop(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.gameLoop)
-        self.timer.start(1000)  # Run the game loop every second
-
-    def gameLoop(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        self.view.updateUI(currentPlayer, len(self.deck), self.pile)
-
     def pickUpPile(self):
         if not self.pile:
             return
+        if not self.isHost:
+            self.sendIntent((engine.PICKUP, 0))
+            return
         currentPlayer = self.players[self.currentPlayerIndex]
-        currentPlayer.pickUpPile(self.pile)
-        print(f"{currentPlayer.name} picks up the pile\n")
+        before = self.engineState()
+        move = (engine.PICKUP, 0)
+        state = engine.apply(before, move)
+        self.recordMove(self.currentPlayerIndex, move, state)
+        self.loadEngineState(state)
+        log.info("%s picks up the pile", currentPlayer.name)
         self.view.pileLabel.setText("Pile: Empty")
-        self.sevenSwitch = False
-        self.updateUI()
         self.changeTurn()
-        self.sendGameState()
+        self.sendMove(before, move, state)
         self.view.placeButton.setText("Opponent's Turn...")
 
     def setupGame(self):
         if self.isHost:
-            self.deck = self.createDeck()
-            random.shuffle(self.deck)
-            self.dealInitialCards(self.players[0])
-            self.dealInitialCards(self.players[1])
-            self.sendDeckToClient()
+            # Every game has its own seed; the deal and the CPU's choices all
+            # come from it, and the move log can deal the game again from it
+            seed = gamelog.newSeed()
+            self.rng = random.Random(seed)
+            self.loadEngineState(engine.newGame(self.numPlayers, self.rng, [player.name for player in self.players]))
+            if gameLog:
+                self.logGame = gameLog.newGame(seed, self.numPlayers)
+            if self.cpuPlayer:
+                self.chooseCpuTopCards()
+            else:
+                self.sendDeal()
             self.view.updatePlayerHandButtons(self.players[0].hand)
         else:
-            self.view.updatePlayerHandButtons(self.players[1].hand)
+            self.view.updatePlayerHandButtons(self.players[self.seat].hand)
         self.view.showTopCardSelection()
 
     def proceedWithGameSetup(self):
@@ -1659,41 +1684,110 @@ class GameController(QObject):
 
     def proceedWithGameSetupOnMainThread(self):
         self.topCardSelectionPhase = False
+        if self.logGame is not None:
+            state = self.engineState()
+            for seat, player in enumerate(self.players):
+                self.recordMove(seat, (engine.CHOOSE_TOP, tuplesToMask(player.topCards)), state)
         self.updateUI()
         self.view.pileLabel.setText("Pile: Empty")
-        if self.playerType == "Player 2":
+        if not self.isSessionPlayer():
             self.view.disablePlayerHand()
             self.view.pickUpPileButton.setDisabled(True)
-        self.startGameLoop()
-
-    def createDeck(self):
-        suits = ['clubs', 'spades', 'hearts', 'diamonds']
-        return [(rank, suit, False, False) for rank in RANKS for suit in suits]
-
-    def dealInitialCards(self, player):
-        player.bottomCards = [(card[0], card[1], False, True) for card in self.deck[:3]]
-        player.hand = self.deck[3:9]
-        self.deck = self.deck[9:]
-
-    def sendDeckToClient(self):
-        data = {'action': 'deckSync', 
-                'deck': self.deck, 
-                'player2bot': self.players[1].bottomCards,
-                'player2top': self.players[1].topCards,
-                'player2hand': self.players[1].hand
-            }
+        self.requestCpuMove()
+
+    def chooseCpuTopCards(self):
+        for player in self.players[1:]:
+            hand = tuplesToMask(player.hand)
+            state = engine.GameState([engine.PlayerState(player.name, hand)])
+            _, topCards = ai.greedyPolicy(state, self.rng)
+            player.topCards = maskToTuples(topCards, FACE_UP)
+            player.hand = maskToTuples(hand & ~topCards)
+
+    def requestCpuMove(self):
+        if self.cpuPlayer and not self.gameOver and not self.topCardSelectionPhase and not self.isSessionPlayer():
+            self.view.placeButton.setText("Opponent's Turn...")
+            self.cpuPlayer.requestMove(self.engineState(), self.rng.getrandbits(32))
+
+    def applyMove(self, seat, move):
+        # A CPU seat's move, or the guest's once the host has checked it
+        if self.gameOver or self.topCardSelectionPhase or seat != self.currentPlayerIndex:
+            return
+        currentPlayer = self.players[seat]
+        before = self.engineState()
+        state = engine.apply(before, move)
+        self.recordMove(seat, move, state)
+        if state.lastEvent == engine.PICKED_UP:
+            log.info("%s picks up the pile", currentPlayer.name)
+        else:
+            playedCards = maskToTuples(move[1])
+            log.info("%s plays %s", currentPlayer.name, logs.lazy(describeCards, playedCards))
+        self.loadEngineState(state)
+        self.checkGameState(state)
+        self.sendMove(before, move, state)
+        if state.burnt:
+            log.info("Bombed! Clearing the pile.")
+            self.view.pileLabel.setText("Bombed!!!")
+        elif not self.pile:
+            self.view.pileLabel.setText("Pile: Empty")
+        if self.gameOver:
+            self.gameOverSignal.emit(currentPlayer.name)
+        elif self.isSessionPlayer():
+            self.view.placeButton.setText("Select A Card")
+            self.view.pickUpPileButton.setEnabled(True)
+        else:
+            self.requestCpuMove()
+
+    def sendDeal(self):
+        # The guest is dealt only what it may see of the table
+        data = self.sync.snapshotMessage(self.engineState(), 1 - self.seat)
+        data['action'] = 'deal'
         self.connection.sendToClient(data)
-                
-    def receiveDeckFromServer(self, data):
-        self.deck = data['deck']
-        self.players[1].bottomCards = data['player2bot']
-        self.players[1].topCards = data['player2top']
-        self.players[1].hand = data['player2hand']
-        self.view.updatePlayerHandButtons(self.players[1].hand)
-        self.view.placeButton.setText("Opponent's Turn...")
+
+    def confirmTopCards(self, mask):
+        if self.isHost:
+            state = engine.chooseTopCards(self.engineState(), self.seat, mask)
+        else:
+            state = self.seatView = seatview.chooseTopCards(self.seatView, self.seat, mask)
+        self.loadEngineState(state)
+        self.repaintSeat(self.seat)
+        if self.cpuPlayer:
+            # CPU seats chose their top cards while dealing
+            self.proceedWithGameSetup()
+        else:
+            self.sendToPeer({'action': 'confirmTopCards', 'playerIndex': self.seat, 'topCards': maskToTuples(mask, FACE_UP)})
+
+    def receiveTopCards(self, data):
+        if self.isHost:
+            # The guest can only choose for its own seat
+            seat = 1 - self.seat
+            state = self.engineState()
+            try:
+                mask = sync.parseTopCards(data['topCards'])
+                if not engine.isLegal(state, (engine.CHOOSE_TOP, mask), seat):
+                    raise sync.SyncError("Illegal top cards")
+            except ValueError as e:
+                log.warning("Rejected top cards from seat %d (%s), sending a snapshot", seat + 1, e)
+                self.sendSnapshot()
+                return
+            self.loadEngineState(engine.chooseTopCards(state, seat, mask))
+        else:
+            seat = int(data['playerIndex'])
+            try:
+                mask = sync.parseTopCards(data['topCards'])
+                self.seatView = seatview.chooseTopCards(self.seatView, seat, mask)
+            except ValueError as e:
+                log.warning("Out of sync (%s), requesting a snapshot", e)
+                self.sendToPeer(self.sync.resyncRequest())
+                return
+            self.loadEngineState(self.seatView)
+        self.repaintSeat(seat)
 
     def checkBothPlayersConfirmed(self):
-        time.sleep(1)
+        # Called on the network thread; the check runs on the GUI thread once
+        # the opponent's top cards queued ahead of it have been stored
+        self.scheduler.after(0, self.startIfAllConfirmed)
+
+    def startIfAllConfirmed(self):
         if all(player.topCards for player in self.players):
             self.sendStartGameSignal()
             self.proceedWithGameSetup()
@@ -1705,31 +1799,55 @@ class GameController(QObject):
         else:
             self.connection.sendToServer(data)
     
+    def markDirty(self, *regions):
+        # May be called from the network threads, the repaint itself always
+        # runs on the GUI thread
+        with self.dirtyLock:
+            self.dirty.update(regions)
+            if self.repaintPending:
+                return
+            self.repaintPending = True
+        self.repaintSignal.emit()
+
     def updateUI(self):
+        self.markDirty(*TABLE_REGIONS, *range(self.numPlayers))
+
+    def repaint(self):
+        with self.dirtyLock:
+            regions, self.dirty = self.dirty, set()
+            self.repaintPending = False
         self.view.enableOpponentHandNotClickable()
         currentPlayer = self.players[self.currentPlayerIndex]
-        if not self.topCardSelectionPhase:
+        if self.topCardSelectionPhase:
             self.view.updateUI(currentPlayer, len(self.deck), self.pile)
-            if self.isHost:
-                self.view.updatePlayerHandButtons(self.players[0].hand)
-                self.view.updateOpponentHandButtons(self.players[1].hand)
-                self.view.updatePlayerTopCardButtons(self.players[0].topCards)
-                self.view.updateOpponentTopCardButtons(self.players[1].topCards)
-                self.view.updatePlayerBottomCardButtons(self.players[0].bottomCards)
-                self.view.updateOpponentBottomCardButtons(self.players[1].bottomCards)
-            else:
-                self.view.updatePlayerHandButtons(self.players[1].hand)
-                self.view.updateOpponentHandButtons(self.players[0].hand)
-                self.view.updatePlayerTopCardButtons(self.players[1].topCards)
-                self.view.updateOpponentTopCardButtons(self.players[0].topCards)
-                self.view.updatePlayerBottomCardButtons(self.players[1].bottomCards)
-                self.view.updateOpponentBottomCardButtons(self.players[0].bottomCards)
-        if not self.gameOver:
+        else:
+            if regions & TABLE_REGIONS:
+                self.view.updateUI(currentPlayer, len(self.deck), self.pile, regions)
+            for seat in regions - TABLE_REGIONS:
+                self.repaintSeat(seat)
+        if not self.gameOver and not self.topCardSelectionPhase:
             if self.isSessionPlayer():
                 self.updatePlayableCards()
             else:
                 self.view.disablePlayerHand()
 
+    def repaintSeat(self, seat):
+        # Rows are placed relative to this window's seat, see GameView.seatLabel
+        player = self.players[seat]
+        offset = (seat - self.seat) % self.numPlayers
+        if offset == 0:
+            self.view.updatePlayerHandButtons(player.hand)
+            self.view.updatePlayerTopCardButtons(player.topCards)
+            self.view.updatePlayerBottomCardButtons(player.bottomCards)
+        elif offset == 1:
+            self.view.updateOpponentHandButtons(player.hand)
+            self.view.updateOpponentTopCardButtons(player.topCards)
+            self.view.updateOpponentBottomCardButtons(player.bottomCards)
+        elif offset == 2:
+            self.view.updateSideSeatButtons(player, self.view.player3Rows)
+        else:
+            self.view.updateSideSeatButtons(player, self.view.player4Rows)
+
     def prepareCardPlacement(self, cardIndex, cardLabel):
         card = self.players[self.currentPlayerIndex].hand[cardIndex]
         if (card, cardLabel) in self.selectedCards:
@@ -1739,291 +1857,272 @@ class GameController(QObject):
             self.selectedCards.append((card, cardLabel))
             cardLabel.setStyleSheet("border: 0px solid black; background-color: blue;")
 
-        selectedCardRank = card[0]
-        handIndex = 0
+        hand = self.players[self.currentPlayerIndex].hand
+        labels = self.view.playerHandRow.labels()
         if not self.selectedCards:
-            for i in range(self.view.playerHandLayout.count()):
-                lbl = self.view.playerHandLayout.itemAt(i).widget()
-                if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):
-                    continue
-                if handIndex >= len(self.players[self.currentPlayerIndex].hand):
-                    break
-                handCard = self.players[self.currentPlayerIndex].hand[handIndex]
-                if handCard[3] or self.isCardPlayable(handCard):
+            playableFlags = self.playableCardFlags()
+            for lbl, playable in zip(labels, playableFlags):
+                if playable:
                     lbl.setEnabled(True)
-                handIndex += 1
         else:
-            handIndex = 0
-            for i in range(self.view.playerHandLayout.count()):
-                lbl = self.view.playerHandLayout.itemAt(i).widget()
-                if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):
-                    continue
-                if handIndex >= len(self.players[self.currentPlayerIndex].hand):
-                    break
-                handCard = self.players[self.currentPlayerIndex].hand[handIndex]
-                if handCard[0] == selectedCardRank or (handCard, lbl) in self.selectedCards:
+            # Cards of the selected rank go together; a face down card is
+            # played on its own
+            selected = self.selectedCards[0][0]
+            for lbl, handCard in zip(labels, hand):
+                if (handCard, lbl) in self.selectedCards:
                     lbl.setEnabled(True)
-                elif not handCard[3]:
-                    lbl.setEnabled(False)
-                handIndex += 1
+                else:
+                    lbl.setEnabled(not selected[3] and not handCard[3] and handCard[0] == selected[0])
         self.view.placeButton.setEnabled(len(self.selectedCards) > 0)
         if self.view.placeButton.text() == "Place":
             self.view.placeButton.setText("Select A Card")
         else:
             self.view.placeButton.setText("Place")
 
-    def isCardPlayable(self, card):
-        if self.pile:
-            topCard = self.pile[-1]
-        else:
-            topCard = None
-        if self.sevenSwitch:
-            return VALUES[card[0]] <= 7 or card[0] in ['2', '10']
-        if not topCard:
-            return True
-        return card[0] == '2' or card[0] == '10' or VALUES[card[0]] >= VALUES[topCard[0]]
+    def playableCardFlags(self):
+        # Recomputed only when the pile top or the current hand changes; keeping a
+        # reference to the hand list makes the identity check safe
+        hand = self.players[self.currentPlayerIndex].hand
+        top = RANK_INDEX[self.pile[-1][0]] if self.pile else NO_RANK
+        key = (top, self.sevenSwitch, len(hand))
+        if self.playableHand is not hand or self.playableKey != key:
+            playable = engine.playableRanks(top, self.sevenSwitch)
+            self.playableFlags = [bool(card[3]) or playable >> RANK_INDEX[card[0]] & 1 == 1 for card in hand]
+            self.playableHand = hand
+            self.playableKey = key
+        return self.playableFlags
+
+    def engineState(self):
+        return engine.GameState.fromTuples(self.players, self.deck, self.pile, self.sevenSwitch, self.currentPlayerIndex, self.topCardSelectionPhase)
+
+    def loadEngineState(self, state):
+        # Only what differs from the current table is replaced and marked dirty
+        changed = []
+        for seat, (player, playerState) in enumerate(zip(self.players, state.players)):
+            hand = playerState.handTuples()
+            topCards = playerState.topTuples()
+            bottomCards = playerState.bottomTuples()
+            if (hand, topCards, bottomCards) != (player.hand, player.topCards, player.bottomCards):
+                player.hand = hand
+                player.topCards = topCards
+                player.bottomCards = bottomCards
+                changed.append(seat)
+        deck = state.deckTuples()
+        if len(deck) != len(self.deck):
+            changed.append(DECK)
+        self.deck = deck
+        pile = state.pileTuples()
+        if pile != self.pile:
+            changed.append(PILE)
+            self.pile = pile
+        self.sevenSwitch = state.sevenSwitch
+        if state.currentPlayerIndex != self.currentPlayerIndex:
+            changed.append(TURN)
+            self.currentPlayerIndex = state.currentPlayerIndex
+        self.markDirty(*changed)
 
     def placeCard(self):
         currentPlayer = self.players[self.currentPlayerIndex]
-        playedCards = []
-        pickUp = False
-
-        for card, button in sorted(self.selectedCards, key=lambda x: currentPlayer.hand.index(x[0])):
-            if card[3] and not self.isCardPlayable(card):
-                playedCards.append(card)
-                for i, card in enumerate(playedCards):
-                    self.pile.append(currentPlayer.hand.pop(currentPlayer.hand.index(playedCards[i])))
-                    self.pile[-1] = (card[0], card[1], card[2], False)
-                    self.view.revealCard(button, card)
-                pickUp = True
-                button.setParent(None)
-                button.deleteLater()
-            else:
-                playedCards.append(card)
-                currentPlayer.playCard(currentPlayer.hand.index(card), self.pile)
-                self.view.revealCard(button, card)
-                button.setParent(None)
-                button.deleteLater()
-
-        if pickUp:
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            QCoreApplication.processEvents()
-            time.sleep(1)
-            currentPlayer.pickUpPile(self.pile)
-            print(f"{currentPlayer.name} picks up the pile\n")
-            self.view.pileLabel.setText("Pile: Empty")
-            self.sevenSwitch = False
-            for card in reversed(currentPlayer.hand):
-                if card[3]:
-                    currentPlayer.bottomCards.append(currentPlayer.hand.pop(currentPlayer.hand.index(card)))
-            self.updateUI()
-            self.changeTurn()
-            self.sendGameState()
-            self.view.placeButton.setText("Opponent's Turn...")
+        playedCards = [card for card, _ in self.selectedCards]
+        if not self.isHost:
+            self.sendIntent(seatview.selectedMove(playedCards))
+            return
+        before = self.engineState()
+        move = (engine.PLAY, tuplesToMask(playedCards))
+        try:
+            state = engine.apply(before, move)
+        except ValueError as e:
+            log.warning("Illegal move: %s", e)
+            self.selectedCards = []
+            self.view.placeButton.setEnabled(False)
+            self.view.placeButton.setText("Select A Card")
+            self.markDirty(self.seat)  # Redraws the hand without the selection
             return
+        self.recordMove(before.currentPlayerIndex, move, state)
 
+        for card, button in self.selectedCards:
+            self.view.revealCard(button, card)
+            button.hide()  # The row shows the label again when it reuses it
         self.selectedCards = []
-        print(f"{currentPlayer.name} plays {', '.join([f'{card[0]} of {card[1]}' for card in playedCards])}\n")
-
-        while len(currentPlayer.hand) < 3 and self.deck:
-            currentPlayer.hand.append(self.deck.pop(0))
-
-        self.view.updatePlayerHandButtons(currentPlayer.hand)
-
-        if self.checkFourOfAKind():
-            print("Four of a kind! Clearing the pile.\n")
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.checkGameState()
-            self.updateUI()
-            self.sendGameState()
-            self.pile.clear()
-            self.updateUI()
-            self.view.pileLabel.setText("Bombed!!!")
-            self.view.placeButton.setText("Select A Card")
+        topCard = playedCards[-1]
+        self.view.pileLabel.setPixmap(cardPixmap(topCard))
+
+        if state.lastEvent == engine.PICKED_UP:
+            # Leave the failed card on the pile for a moment before picking up
+            self.view.disablePlayerHand()
+            self.view.placeButton.setEnabled(False)
+            self.view.pickUpPileButton.setEnabled(False)
+            self.scheduler.after(REVEAL_DELAY, lambda: self.finishPickUp(currentPlayer, before, move, state))
             return
-        
-        if '2' in [card[0] for card in playedCards]:
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.updateUI()
-            self.checkGameState()
-            self.sendGameState()
-            self.view.placeButton.setText("Select A Card")
-        elif '10' in [card[0] for card in playedCards]:
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.checkGameState()
-            self.updateUI()
-            self.sendGameState()
-            self.pile.clear()
-            self.updateUI()
+
+        log.info("%s plays %s", currentPlayer.name, logs.lazy(describeCards, playedCards))
+        self.loadEngineState(state)
+        self.checkGameState(state)
+
+        if state.burnt:
+            log.info("Bombed! Clearing the pile.")
+            self.sendMove(before, move, state)
             self.view.pileLabel.setText("Bombed!!!")
             self.view.placeButton.setText("Select A Card")
-        else:
-            if '7' in [card[0] for card in playedCards]:
-                self.sevenSwitch = True
-            else:
-                self.sevenSwitch = False
+        elif state.lastEvent == engine.PLAYED:
             self.view.placeButton.setEnabled(False)
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.checkGameState()
-            self.updateUI()
-            if not self.gameOver:
-                self.changeTurn()
-            self.sendGameState()
+            self.changeTurn()
+            self.sendMove(before, move, state)
             self.view.placeButton.setText("Opponent's Turn...")
+        else:
+            self.sendMove(before, move, state)
+            self.view.placeButton.setText("Select A Card")
         if self.gameOver:
             self.gameOverSignal.emit(currentPlayer.name)
 
+    def finishPickUp(self, currentPlayer, before, move, state):
+        self.loadEngineState(state)
+        log.info("%s picks up the pile", currentPlayer.name)
+        self.view.pileLabel.setText("Pile: Empty")
+        self.changeTurn()
+        self.sendMove(before, move, state)
+        self.view.placeButton.setText("Opponent's Turn...")
+
     def changeTurn(self):
-        self.currentPlayerIndex = (self.currentPlayerIndex + 1) % len(self.players)
         self.selectedCards = []
-        self.updateUI()
+        self.markDirty()
         self.view.disablePlayerHand()
         self.view.pickUpPileButton.setEnabled(False)
-
-    def checkFourOfAKind(self):
-        if len(self.pile) < 4:
-            return False
-        return len(set(card[0] for card in self.pile[-4:])) == 1
+        self.requestCpuMove()
 
     def isSessionPlayer(self):
-        if self.isHost:
-            return self.currentPlayerIndex == 0 and self.playerType == "Player 1"
-        else:
-            return self.currentPlayerIndex == 1 and self.playerType == "Player 2"
+        return self.currentPlayerIndex == self.seat
     
-    def checkGameState(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        if not currentPlayer.hand and not self.deck:
-            if currentPlayer.topCards:
-                currentPlayer.hand = currentPlayer.topCards
-                currentPlayer.topCards = []
-                if self.isSessionPlayer():
-                    self.view.updatePlayerHandButtons(currentPlayer.hand)
-                    self.view.updatePlayerTopCardButtons(currentPlayer.topCards)
-                else:
-                    self.view.updateOpponentHandButtons(currentPlayer.hand)
-                    self.view.updateOpponentTopCardButtons(currentPlayer.topCards)
-            elif currentPlayer.bottomCards:
-                currentPlayer.hand = currentPlayer.bottomCards
-                currentPlayer.bottomCards = []
-                if self.isSessionPlayer():
-                    self.view.updatePlayerHandButtons(currentPlayer.hand)
-                    self.view.updatePlayerBottomCardButtons(currentPlayer.bottomCards)
-                else:
-                    self.view.updateOpponentHandButtons(currentPlayer.hand)
-                    self.view.updateOpponentBottomCardButtons(currentPlayer.bottomCards)
-            elif not currentPlayer.bottomCards:
-                placeholder = ("", "", False, False)
-                currentPlayer.hand.append(placeholder)
-                self.view.pickUpPileButton.setDisabled(True)
-                self.view.placeButton.setDisabled(True)
-                for button in self.playCardButtons:
-                    button.setDisabled(True)
-                print(f"{currentPlayer.name} wins!")
-                self.gameOver = True
+    def checkGameState(self, state):
+        if state.winner is None:
+            return
+        winner = self.players[state.winner]
+        placeholder = ("", "", False, False)
+        winner.hand.append(placeholder)
+        self.markDirty(state.winner)
+        self.view.pickUpPileButton.setDisabled(True)
+        self.view.placeButton.setDisabled(True)
+        for button in self.playCardButtons:
+            button.setDisabled(True)
+        log.info("%s wins!", winner.name)
+        self.gameOver = True
 
     def updatePlayableCards(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        handIndex = 0  # To keep track of the actual card index in the player's hand
-
-        for i in range(self.view.playerHandLayout.count()):
-            item = self.view.playerHandLayout.itemAt(i)
-            if item is None:
-                continue
-            lbl = item.widget()
-            if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):  # Check if it's the spacer
-                continue  # Skip the spacer
+        playableFlags = self.playableCardFlags()
+        for lbl, playable in zip(self.view.playerHandRow.labels(), playableFlags):
+            lbl.setEnabled(playable)
+        
+    def recordMove(self, seat, move, state):
+        if gameLog and self.logGame is not None:
+            gameLog.record(self.logGame, seat, move, state)
 
-            if handIndex >= len(currentPlayer.hand):
-                break  # Prevent index out of range error
+    def sendToPeer(self, *messages):
+        if isinstance(self.connection, Server):
+            self.connection.sendToClient(*messages)
+        else:
+            self.connection.sendToServer(*messages)
 
-            handCard = currentPlayer.hand[handIndex]
-            if handCard[0] in ['2', '10'] or handCard[3] or self.isCardPlayable(handCard):
-                lbl.setEnabled(True)
-            else:
-                lbl.setEnabled(False)
-            
-            handIndex += 1
-        
-    def sendGameState(self):
+    def sendMove(self, before, move, state):
+        # The host's moves and the guest's, as the guest may see them
         if self.connection:
-            data = self.serializeGameState()
-            if isinstance(self.connection, Server):
-                self.connection.sendToClient(data)
-            else:
-                self.connection.sendToServer(data)
+            messages = [self.sync.moveMessage(before, move, state, 1 - self.seat)]
             if self.gameOver:
-                data = {
+                # The winning move and the game over share one write
+                messages.append({
                     'action': 'gameOver',
-                    'winner': self.players[self.currentPlayerIndex].name
-                }
-                if isinstance(self.connection, Server):
-                    self.connection.sendToClient(data)
-                else:
-                    self.connection.sendToServer(data)
-
-    def receiveGameState(self, data):
-        self.deserializeGameState(data)
-        if self.pile and self.pile[-1][0] == "2":
-            pass
-        elif self.pile and self.pile[-1][0] == "10":
-            self.pile.clear()
+                    'winner': self.players[state.winner].name
+                })
+            self.sendToPeer(*messages)
+
+    def sendIntent(self, move):
+        # A seat without the whole game only asks for its move, it is shown
+        # when the host or the server sends it back
+        self.selectedCards = []
+        self.view.disablePlayerHand()
+        self.view.placeButton.setEnabled(False)
+        self.view.pickUpPileButton.setEnabled(False)
+        self.sendToPeer({'action': 'intent', 'kind': move[0], 'cards': cardsIn(move[1])})
+
+    def receiveIntent(self, data):
+        seat = 1 - self.seat
+        before = self.engineState()
+        try:
+            move = sync.resolveMove(before, sync.parseMove(data), self.rng)
+            if not engine.isLegal(before, move, seat):
+                raise sync.SyncError("Illegal move")
+        except ValueError as e:
+            # The host's copy is the one that counts, the guest starts over from it
+            log.warning("Rejected move (%s), sending a snapshot", e)
+            self.sendSnapshot()
+            return
+        self.applyMove(seat, move)
+
+    def receiveMove(self, data):
+        before = self.seatView
+        try:
+            state = self.seatView = self.sync.applyMove(before, data)
+        except ValueError as e:
+            log.warning("Out of sync (%s), requesting a snapshot", e)
+            self.sendToPeer(self.sync.resyncRequest())
+            return
+        mover = self.players[before.currentPlayerIndex]
+        if state.lastEvent == engine.PICKED_UP:
+            log.info("%s picks up the pile", mover.name)
+        else:
+            log.info("%s plays %s", mover.name, logs.lazy(describeCards, maskToTuples(state.lastMove[1])))
+        self.loadEngineState(state)
+        self.checkGameState(state)
+        if state.burnt:
             self.view.pileLabel.setText("Bombed!!!")
+        elif not self.pile:
+            self.view.pileLabel.setText("Pile: Empty")
+        if self.gameOver:
+            return  # The game over follows
+        if self.isSessionPlayer():
+            self.view.placeButton.setText("Select A Card")
+            self.view.pickUpPileButton.setEnabled(bool(self.pile))
         else:
+            self.view.placeButton.setText("Opponent's Turn...")
+
+    def loadDeal(self, data):
+        # The host or a dedicated server deals, each seat is sent its own view
+        self.seatView = self.sync.applySnapshot([player.name for player in self.players], data)
+        self.loadEngineState(self.seatView)
+        self.topCardSelectionPhase = self.seatView.topCardSelectionPhase
+        self.playAgainCount = 0
+        self.view.updatePlayerHandButtons(self.players[self.seat].hand)
+        self.view.showTopCardSelection()
+
+    def sendSnapshot(self):
+        self.sendToPeer(self.sync.snapshotMessage(self.engineState(), 1 - self.seat))
+
+    def receiveSnapshot(self, data):
+        try:
+            self.seatView = self.sync.applySnapshot([player.name for player in self.players], data)
+        except sync.SyncError as e:
+            log.warning("Rejected snapshot: %s", e)
+            return
+        self.loadEngineState(self.seatView)
+        if self.seatView.topCardSelectionPhase:
+            self.resumeTopCardSelection()
+        elif self.topCardSelectionPhase:
+            self.proceedWithGameSetupOnMainThread()
+        elif self.isSessionPlayer():
             self.view.placeButton.setText("Select a Card")
             self.view.pickUpPileButton.setEnabled(True)
 
-    def serializeGameState(self):
-        return {
-            'action': 'playCard',
-            'players': [
-                {
-                    'hand': self.players[0].hand,
-                    'topCards': self.players[0].topCards,
-                    'bottomCards': self.players[0].bottomCards
-                },
-                {
-                    'hand': self.players[1].hand,
-                    'topCards': self.players[1].topCards,
-                    'bottomCards': self.players[1].bottomCards
-                }
-            ],
-            'deck': self.deck,
-            'pile': self.pile,
-            'seven': self.sevenSwitch,
-            'currentPlayerIndex': self.currentPlayerIndex,
-        }
-
-    def deserializeGameState(self, data):
-        self.deck = data['deck']
-        self.pile = data['pile']
-        self.currentPlayerIndex = data['currentPlayerIndex']
-        self.sevenSwitch = data['seven']
-        self.players[0].hand = data['players'][0]['hand']
-        self.players[0].topCards = data['players'][0]['topCards']
-        self.players[0].bottomCards = data['players'][0]['bottomCards']
-        self.players[1].hand = data['players'][1]['hand']
-        self.players[1].topCards = data['players'][1]['topCards']
-        self.players[1].bottomCards = data['players'][1]['bottomCards']
-        self.communicator.updateUISignal.emit()
-    
-    def startHostServerThread(self):
-        thread = threading.Thread(target=self.connection.handleClient, daemon=True)
-        self.threads.append(thread)
-        thread.start()
+    def resumeTopCardSelection(self):
+        # A rejected choice comes back as a snapshot, the seat chooses again
+        # unless the host already has its top cards
+        self.topCardSelectionPhase = True
+        player = self.players[self.seat]
+        self.view.updatePlayerHandButtons(player.hand)
+        self.view.showTopCardSelection()
+        self.view.confirmButton.setEnabled(False)
+        if player.topCards:
+            self.view.disablePlayerHand()
+        else:
+            self.view.enablePlayerHand()
 
     def startClientServerThread(self):
         thread = threading.Thread(target=self.connection.handleServer, daemon=True)
@@ -2042,23 +2141,25 @@ class GameController(QObject):
                 thread.join(timeout=1)
     
     def closeConnections(self):
+        if self.cpuPlayer:
+            self.cpuPlayer.shutdown()
         if self.connection:
             self.connection.close()
        
 def main():
-    global scalingFactorWidth
-    global scalingFactorHeight
-    app = QApplication(sys.argv)
-    app.setStyleSheet(Dark)
-    screen = app.primaryScreen()
-    screenSize = screen.size()
-    screenWidth = screenSize.width()
-    screenHeight = screenSize.height()
-    scalingFactorWidth = screenWidth / 1920
-    scalingFactorHeight = screenHeight / 1080
+    multiprocessing.freeze_support()  # CPU search workers in the frozen build
+    global gameLog
+    parser = argparse.ArgumentParser(prog='palace')
+    parser.add_argument('--profile-startup', action='store_true', help="report the time from launch to the first interactive frame")
+    args, qtArgs = parser.parse_known_args()  # The rest is Qt's
+    profile = startup.StartupProfile(STARTED) if args.profile_startup else None
+    startup.mark(profile, 'imports')
+    logs.configure()  # PALACE_LOG=debug also dumps every network message
+    gameLog = gamelog.openLog()  # PALACE_MOVE_LOG='' turns it off
+    app = QApplication(sys.argv[:1] + qtArgs)
+    startup.mark(profile, 'application')
     communicator = SignalCommunicator()
-    mainWindow = HomeScreen(communicator)  # Create the main window
-    mainWindow.show()
+    _ = startup.launch(app, lambda: HomeScreen(communicator), CARD_VARIANTS, profile)  # Held until exit, an unreferenced window is destroyed
     sys.exit(app.exec())
 
 if __name__ == '__main__':
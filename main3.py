@@ -1,76 +1,60 @@
+import time
+STARTED = time.perf_counter()  # Before the Qt imports, see --profile-startup
 import sys
+import argparse
 import random
-import json
 import socket
 import threading
-import struct
-import time
 from PyQt6.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, \
     QLabel, QDialog, QGridLayout, QRadioButton, QButtonGroup, QSpacerItem, QSizePolicy, \
     QTextEdit, QLineEdit
-from PyQt6.QtGui import QPixmap, QIcon, QTransform
-from PyQt6.QtCore import Qt, QCoreApplication, QTimer, pyqtSignal, QObject
-import qdarktheme
-
-# Dark Mode Styling
-Dark = qdarktheme.load_stylesheet(
-    theme="dark",
-    custom_colors={
-        "[dark]": {
-            "primary": "#0078D4",
-            "background": "#202124",
-            "border": "#8A8A8A",
-            "background>popup": "#252626",
-        }
-    },
-) + """
-    QMessageBox QLabel {
-        color: #E4E7EB;
-    }
-    QDialog {
-        background-color: #252626;
-    }
-    QComboBox:disabled {
-        background-color: #1A1A1C; 
-        border: 1px solid #3B3B3B;
-        color: #3B3B3B;  
-    }
-    QPushButton {
-    background-color: #0078D4; 
-    color: #FFFFFF;           
-    border: 1px solid #8A8A8A; 
-    }
-    QPushButton:hover {
-        background-color: #669df2; 
-        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                    stop:0 #80CFFF, stop:1 #004080);
-    }
-    QPushButton:pressed {
-        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
-                                    stop:0 #004080, stop:1 #001B3D);
-    }
-    QPushButton:disabled {
-        background-color: #202124; 
-        border: 1px solid #3B3B3B;
-        color: #FFFFFF;   
-    }
-"""
-
-RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
-VALUES = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11, 'Q': 12, 'K': 13, 'A': 14}
+from PyQt6.QtGui import QIcon
+from PyQt6.QtCore import Qt, QCoreApplication, pyqtSignal, QObject
+import engine
+import sync
+import seatview
+import gamelog
+import wire
+import asyncnet
+import logs
+import dispatch
+import sockets
+import cardimages
+import startup
+from cardrow import CardRow
+from scheduler import Scheduler
+from cards import RANK_INDEX, NO_RANK, HIDDEN_CARD, cardsIn, tuplesToMask, maskToTuples
+
 CARD_WIDTH = 56
 CARD_HEIGHT = 84
+CARD_VARIANTS = [(0, CARD_WIDTH, CARD_HEIGHT)]  # Every (rotation, size) drawn, see cardimages.preload
 BUTTON_WIDTH = 66
 BUTTON_HEIGHT = 87
 
+MAX_PLAYERS = 4
+
+REVEAL_DELAY = 1000  # ms a blind card that cannot be played stays up
+GAME_OVER_DELAY = 1200
+
+log = logs.getLogger('game')
+netLog = logs.getLogger('net')
+
+gameLog = None  # Opened by main(), see gamelog
+
+def describeCards(cards):
+    return ', '.join(f'{card[0]} of {card[1]}' for card in cards)
+
+def cardPixmap(card, faceDown=False, rotate=False):
+    return cardimages.pixmap(card, faceDown, 90 if rotate else 0, CARD_WIDTH, CARD_HEIGHT)
+
 class SignalCommunicator(QObject):
-    updateOpponentBottomCardsSignal = pyqtSignal(int, list)
-    updateOpponentTopCardsSignal = pyqtSignal(int, list)
-    updateOpponentHandSignal = pyqtSignal(int, list)
-    updateDeckSignal = pyqtSignal(dict)
     startGameSignal = pyqtSignal()
     proceedWithGameSetupSignal = pyqtSignal()
     updateUISignal = pyqtSignal()
+    logTextSignal = pyqtSignal(str)
+    playerCountLabelSignal = pyqtSignal(str)
+    startButtonEnabledSignal = pyqtSignal(bool)
+    dealSignal = pyqtSignal(dict)
 
 def centerDialog(dialog, parent, name):
     offset = 0
@@ -94,13 +78,8 @@ class HostLobby(QDialog):
         self.mainWindow = mainWindow
         self.setWindowTitle("Host Lobby")
         self.setGeometry(0, 0, 300, 200)
-        self.serverSocket = None
-        self.clientSockets = []
-        self.clientAddresses = {}
-        self.clientNicknames = {}
-        self.serverThread = None
+        self.server = None
         self.running = False
-        self.playerCount = 1  # Starting with host player
         self.initUI()
 
     def initUI(self):
@@ -113,7 +92,7 @@ class HostLobby(QDialog):
         self.logText.setReadOnly(True)
         layout.addWidget(self.logText)
 
-        self.playerCountLabel = QLabel("Players: 1/4")
+        self.playerCountLabel = QLabel(f"Players: 1/{MAX_PLAYERS}")
         layout.addWidget(self.playerCountLabel)
 
         self.startButton = QPushButton("Start Game")
@@ -132,123 +111,51 @@ class HostLobby(QDialog):
         centerDialog(self, self.mainWindow, "Host Lobby")
     
     def startServer(self):
+        # The game server listens from the start; each guest's lobby
+        # connection becomes its game connection
         try:
-            self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.serverSocket.bind(('127.0.0.1', 12345))  # Bind to the loopback address for local testing
-            self.serverSocket.listen(5)
+            self.server = Server('127.0.0.1', 12345, self.mainWindow.communicator)  # Bind to the loopback address for local testing
             self.logText.append("Server started, waiting for connections...")
             self.logText.append("Host Connected")
             self.running = True
-            self.serverThread = threading.Thread(target=self.acceptConnections, daemon=True)
-            self.serverThread.start()
         except OSError as e:
+            self.server = None
             if e.errno == 10048:
                 self.logText.append("Server is already running")
             else:
                 self.logText.append(f"Failed to start server: {e}")
 
-    def acceptConnections(self):
-        while self.running:
-            try:
-                clientSocket, clientAddress = self.serverSocket.accept()
-                if len(self.clientSockets) >= 3:
-                    clientSocket.send(b'lobby full')
-                    self.logText.append(f"Connection attempt from {clientAddress}")
-                else:
-                    self.clientSockets.append(clientSocket)
-                    self.clientAddresses[clientSocket] = clientAddress
-                    playerIndex = len(self.clientSockets)  # Assign unique index based on order of joining
-                    threading.Thread(target=self.handleClient, args=(clientSocket, playerIndex), daemon=True).start()
-                    threading.Thread(target=self.listenForDisconnection, args=(clientSocket,), daemon=True).start()
-            except Exception as e:
-                if self.running:  # Only log if the server is supposed to be running
-                    self.logText.append(f"Error accepting connections: {e}")
-
-    def handleClient(self, clientSocket, playerIndex):
-        try:
-            data = clientSocket.recv(1024).decode('utf-8')
-            if data == "Player":
-                data = f"Player {playerIndex + 1}"
-            nickname = data
-            self.clientNicknames[clientSocket] = nickname
-            self.playerCount += 1
-            logMessage = f"{nickname} connected from {self.clientAddresses[clientSocket]} as Player {playerIndex + 1}"
-            self.logText.append(logMessage)
-            self.sendLogToClients(logMessage)  # Send log message to all clients
-            self.playerCountLabel.setText(f"Players: {self.playerCount}/4")
-            if self.playerCount > 1:
-                self.startButton.setEnabled(True)
-        except Exception as e:
-            self.logText.append(f"Error handling client: {e}")
-
-    def sendLogToClients(self, message):
-        for clientSocket in self.clientSockets:
-            try:
-                clientSocket.sendall(f"log: {message}".encode('utf-8'))
-            except Exception as e:
-                self.logText.append(f"Failed to send log to client: {e}")
-
-    def listenForDisconnection(self, clientSocket):
-        try:
-            while self.running:
-                data = clientSocket.recv(1024).decode('utf-8')
-                if data == 'leave':
-                    self.removeClient(clientSocket)
-                    break
-        except Exception as e:
-            self.removeClient(clientSocket)
-
-    def removeClient(self, clientSocket):
-        nickname = self.clientNicknames.pop(clientSocket, "Unknown")
-        if clientSocket in self.clientSockets:
-            self.clientSockets.remove(clientSocket)
-            self.clientAddresses.pop(clientSocket, None)
-            self.playerCount -= 1
-            message = f"{nickname} has left the server."
-            self.logText.append(message)
-            self.sendLogToClients(message)  # Send the disconnection message to all clients
-            self.playerCountLabel.setText(f"Players: {self.playerCount}/4")
-            clientSocket.close()
-            if self.playerCount <= 1:
-                self.startButton.setEnabled(False)
-
     def startGame(self):
         self.logText.append("Starting game...")
-        self.notifyClientsToStart()
+        server = self.server
+        self.server = None  # The game owns the connections from here on
         self.accept()  # Close the lobby window
-        self.mainWindow.startHost(self.clientSockets)  # Pass client sockets to the main window
+        self.mainWindow.startHost(server)
+        server.startGame()
 
-    def notifyClientsToStart(self):
-        for clientSocket in self.clientSockets:
-            try:
-                clientSocket.sendall(b'start')
-            except Exception as e:
-                self.logText.append(f"Failed to notify client: {e}")
-    
-    def backToOnlineDialog(self):
+    def stopServer(self):
         self.running = False
-        if self.serverSocket:
-            self.serverSocket.close()
-        for clientSocket in self.clientSockets:
-            clientSocket.close()
+        if self.server:
+            self.server.close()
+            self.server = None
+
+    def backToOnlineDialog(self):
+        self.stopServer()
         self.accept()
         self.mainWindow.playOnline()
         
     def cleanup(self):
-        if self.serverSocket:
-            self.serverSocket.close()
-        for clientSocket in self.clientSockets:
-            clientSocket.close()
-        self.running = False
+        self.stopServer()
 
     def closeEvent(self, event):
         self.cleanup()
         event.accept()
 
 class JoinLobby(QDialog):
-    connectionEstablished = pyqtSignal()
     startSignalReceived = pyqtSignal()
     lobbyFullSignal = pyqtSignal()
+    lobbyClosedSignal = pyqtSignal()
+    logSignal = pyqtSignal(str)
 
     def __init__(self, parent=None, mainWindow=None):
         super().__init__(parent)
@@ -256,13 +163,14 @@ class JoinLobby(QDialog):
         self.setWindowTitle("Join Lobby")
         self.setGeometry(0, 0, 300, 200)  # Default position, will be centered later
         self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, True)
-        self.clientSocket = None
+        self.client = None
         self.initUI()
         
-        # Connect signals to slots
-        self.connectionEstablished.connect(self.onConnectionEstablished)
+        # The client's reader thread reaches the widgets only through these
         self.startSignalReceived.connect(self.onStartSignalReceived)
         self.lobbyFullSignal.connect(self.onLobbyFull)
+        self.lobbyClosedSignal.connect(self.onLobbyClosed)
+        self.logSignal.connect(self.logText.append)
 
     def initUI(self):
         layout = QVBoxLayout()
@@ -304,16 +212,8 @@ class JoinLobby(QDialog):
     def joinLobby(self):
         hostAddress = self.addressInput.text()
         nickname = self.nicknameInput.text() or "Player"
-        self.clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            self.clientSocket.connect((hostAddress, 12345))
-            self.clientSocket.sendall(nickname.encode('utf-8'))
-            self.connectionEstablished.emit() 
-            threading.Thread(target=self.listenForStartSignal, daemon=True).start()
-            self.backButton.setVisible(False)
-            self.leaveButton.setVisible(True)
-            self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, False)
-            self.show()
+            self.client = Client(hostAddress, 12345, self.mainWindow.communicator, self, nickname)
         except OSError as e:
             if e.errno == 10049:
                 self.logText.append("Server does not exist.")
@@ -321,35 +221,30 @@ class JoinLobby(QDialog):
                 self.logText.append("Server is not running.")
             else:
                 self.logText.append(f"Failed to connect: {e}")
+            return
+        self.logText.append("Connected to lobby")
+        self.joinButton.setDisabled(True)
+        self.backButton.setVisible(False)
+        self.leaveButton.setVisible(True)
+        self.setWindowFlag(Qt.WindowType.WindowCloseButtonHint, False)
+        self.show()
 
-    def listenForStartSignal(self):
-        try:
-            while True:
-                self.joinButton.setDisabled(True)
-                data = self.clientSocket.recv(1024).decode('utf-8')
-                if data == 'start':
-                    self.startSignalReceived.emit()
-                    break
-                elif data == 'lobby full':
-                    self.lobbyFullSignal.emit()
-                    break
-                elif data.startswith('log:'):
-                    logMessage = data[4:].strip()
-                    self.logText.append(logMessage)
-        except ConnectionResetError:
-            self.logText.append("Connection was closed by the server.")
-        except Exception as e:
-            self.logText.append(f"Error in listenForStartSignal: {e}")
-
-    def onConnectionEstablished(self):
-        self.logText.append(f"Connected to lobby")
-        
     def onStartSignalReceived(self):
+        client = self.client
+        self.client = None  # The game owns the connection from here on
         self.accept() 
-        self.mainWindow.startClient()
+        self.mainWindow.startClient(client)
 
     def onLobbyFull(self):
         self.logText.append("Lobby is full. Unable to join.\n")
+        self.resetJoin()
+
+    def onLobbyClosed(self):
+        self.logText.append("Connection was closed by the server.")
+        self.resetJoin()
+
+    def resetJoin(self):
+        self.client = None
         self.leaveButton.setVisible(False)
         self.backButton.setVisible(True)
         self.joinButton.setDisabled(False)
@@ -357,10 +252,7 @@ class JoinLobby(QDialog):
         self.show()
 
     def leaveServer(self):
-        if self.clientSocket:
-            self.clientSocket.sendall(b'leave')
-            self.clientSocket.close()
-        self.clientSocket = None
+        self.cleanup()
         self.leaveButton.setVisible(False)
         self.logText.append("Disconnected from server.")
         self.addressInput.setEnabled(True)
@@ -371,237 +263,362 @@ class JoinLobby(QDialog):
         self.accept()
 
     def backToOnlineDialog(self):
-        if self.clientSocket:
-            self.clientSocket.sendall(b'leave')
-            self.clientSocket.close()
+        self.cleanup()
         self.accept()
         self.mainWindow.playOnline()
     
     def cleanup(self):
-        if self.clientSocket:
-            try:
-                self.clientSocket.sendall(b'leave')
-            except Exception:
-                pass
-            self.clientSocket.close()
+        if self.client:
+            self.client.leave()
+        self.client = None
 
     def closeEvent(self, event):
         self.cleanup()
         event.accept()
 
-class Server:
+class GamePeer:
+    # What every seat does with the host's messages. The deal goes to the home
+    # screen, which opens the game window for it; the rest is handed to the
+    # controller's GUI thread, held until attach() when it does not exist yet.
+    def peerDispatcher(self, name):
+        self.controller = None
+        self.held = []
+        self.holdLock = threading.Lock()
+        dispatcher = dispatch.Dispatcher(name)
+        dispatcher.register('deal', self.communicator.dealSignal.emit)
+        for action in ('move', 'snapshot', 'confirmTopCards', 'startGame', 'resetGame', 'disconnect'):
+            dispatcher.register(action, self.toController)
+        return dispatcher
+
+    def toController(self, data):
+        with self.holdLock:
+            if self.controller is None:
+                self.held.append(data)
+                return
+        self.controller.messageSignal.emit(data)
+
+    def attach(self, controller):
+        with self.holdLock:
+            self.controller = controller
+            for data in self.held:
+                controller.messageSignal.emit(data)
+            self.held = []
+
+class Server(GamePeer):
+    # The host is the only writer of an N player game. Guests join its lobby,
+    # and once the host starts the game the same connections carry it. Every
+    # seat, the host's own window included, sends intents; the host checks
+    # each one against its own state on the event loop thread, numbers it and
+    # sends the move to every seat, the sender included. Each peer applies
+    # each move once, in the host's order.
     def __init__(self, host, port, communicator):
         self.host = host
         self.port = port
         self.communicator = communicator
-        self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.serverSocket.bind((self.host, self.port))
-        self.serverSocket.listen(1)
-        self.controller = None
-        self.clientSockets = []  # Store client sockets
-        print(f"Server listening on {self.host}:{self.port}\n")
-        self.acceptThread = threading.Thread(target=self.acceptConnections, daemon=True)
-        self.acceptThread.start()
-
-    def acceptConnections(self):
-        while True:
-            clientSocket, clientAddress = self.serverSocket.accept()
-            self.clientSockets.append(clientSocket)
-            print(f"Connection from {clientAddress}\n")
-            threading.Thread(target=self.handleClient, args=(clientSocket,), daemon=True).start()
-
-    def broadcastToClients(self, data):
-        serializedData = json.dumps(data).encode('utf-8')
-        msgLen = struct.pack('>I', len(serializedData))
-        for clientSocket in self.clientSockets:
-            try:
-                print(f"Sending data to client: {data}\n")
-                clientSocket.sendall(msgLen + serializedData)
-            except Exception as e:
-                print(f"Error broadcasting to client: {e}\n")
+        self.numPlayers = MAX_PLAYERS  # Until the game starts with whoever joined
+        self.dispatcher = self.peerDispatcher('server')
+        self.lobbyMessages = dispatch.Dispatcher('lobby')
+        self.lobbyMessages.registerAll({'lobbyJoin': self.lobbyJoin, 'leave': self.leave})
+        self.intents = dispatch.Dispatcher('intents')
+        self.intents.registerAll({
+            'confirmTopCards': self.chooseTopCards,
+            'intent': self.move,
+            'resyncRequest': self.resync,
+            'playAgainRequest': self.playAgain,
+        })
+        self.seats = [None] * MAX_PLAYERS  # Seat 0 is the host
+        self.names = []
+        self.started = False
+        self.sync = sync.StateSync()
+        self.rng = random.Random()  # Turns over the face down cards seats play
+        self.state = None
+        self.game = None
+        self.playAgainSeats = set()
+        self.server = asyncnet.AsyncServer(self.host, self.port, self)
+        self.server.start()
+        netLog.info("Server listening on %s:%d", self.host, self.port)
+
+    # Protocol callbacks, on the loop thread
+    def connectionMade(self, connection):
+        seat = None if self.started else next((seat for seat in range(1, MAX_PLAYERS) if self.seats[seat] is None), None)
+        if seat is None:
+            netLog.info("Turned away %s, the table is full", connection.address)
+            if not self.started:
+                self.communicator.logTextSignal.emit(f"Connection attempt from {connection.address}")
+            connection.write(wire.frame(wire.JSON.encode({'action': 'lobbyFull'})))
+            connection.shutdown()
+            return False
+        self.seats[seat] = connection
+        connection.seat = seat
+        connection.name = None  # Set by its lobbyJoin
+        netLog.info("Connection from %s takes seat %d", connection.address, seat + 1)
 
-    def handleClient(self, clientSocket):
-        while True:
-            try:
-                data = self.receiveData(clientSocket)
-                if data:
-                    self.processClientData(data)
-            except ConnectionResetError:
-                print("Connection reset by client\n")
-                break
-            except ConnectionAbortedError:
-                print("Connection aborted by client\n")
-                break
-            except Exception as e:
-                print(f"Unexpected error: {e}\n")
-                break
-        clientSocket.close()
+    def messageReceived(self, connection, message):
+        try:
+            data = wire.JSON.decode(message)
+        except ValueError as e:
+            netLog.warning("Dropped a malformed message from seat %d: %s", connection.seat + 1, e)
+            return
+        netLog.debug("Received from seat %d: %s", connection.seat + 1, data)
+        if self.started:
+            self.handleIntent(connection.seat, data)
+        else:
+            self.lobbyMessages.dispatch(data, connection)
+
+    def connectionLost(self, connection):
+        seat = getattr(connection, 'seat', None)
+        if seat is None:
+            return  # Turned away before it had a seat
+        netLog.info("Seat %d closed the connection", seat + 1)
+        self.freeSeat(connection)
+
+    def freeSeat(self, connection):
+        self.seats[connection.seat] = None
+        if not self.started:
+            if connection.name is not None:
+                self.lobbyLog(f"{connection.name} has left the server.")
+                self.updatePlayerCount()
+        elif self.state is not None:
+            # The game cannot go on without the seat, the others are told
+            self.state = None
+            self.sendAll({'action': 'disconnect'})
+
+    # Lobby messages, each called with the connection that sent it
+    def lobbyJoin(self, connection, data):
+        if connection.name is not None:
+            return
+        name = data.get('name') or "Player"
+        if name == "Player":
+            name = f"Player {connection.seat + 1}"
+        connection.name = name
+        self.lobbyLog(f"{name} connected from {connection.address} as Player {connection.seat + 1}")
+        self.updatePlayerCount()
+
+    def leave(self, connection, data):
+        # A connection closed from this end is not reported lost
+        self.freeSeat(connection)
+        connection.close()
+
+    def lobbyLog(self, message):
+        self.communicator.logTextSignal.emit(message)
+        for connection in self.joined():
+            connection.write(wire.frame(wire.JSON.encode({'action': 'lobbyLog', 'message': message})))
+
+    def joined(self):
+        return [connection for connection in self.seats[1:] if connection is not None and connection.name is not None]
+
+    def updatePlayerCount(self):
+        count = 1 + len(self.joined())
+        self.communicator.playerCountLabelSignal.emit(f"Players: {count}/{MAX_PLAYERS}")
+        self.communicator.startButtonEnabledSignal.emit(count > 1)
 
-    def processClientData(self, data):
-        if data['action'] == 'playCard' or data['action'] == 'gameOver' or data['action'] == 'confirmTopCards' or data['action'] == 'startGame' or data['action'] == 'playAgainRequest' or data['action'] == 'resetGame':
-            self.broadcastToAll(data)
+    def startGame(self):
+        self.server.callSoon(self.begin)
+
+    def begin(self):
+        # Whoever joined the lobby is seated in order, the rest are turned away
+        joined = self.joined()
+        for connection in self.seats[1:]:
+            if connection is not None and connection.name is None:
+                connection.write(wire.frame(wire.JSON.encode({'action': 'lobbyFull'})))
+                connection.shutdown()
+        self.started = True
+        self.numPlayers = 1 + len(joined)
+        self.seats = [None] + joined
+        for seat, connection in enumerate(joined, 1):
+            connection.seat = seat
+            connection.write(wire.frame(wire.JSON.encode({'action': 'start'})))
+        self.names = ["Player 1"] + [connection.name for connection in joined]
+        self.deal()
+
+    def handleIntent(self, seat, data):
+        if self.state is None:
+            return  # Nothing to act on before the deal
+        try:
+            self.intents.dispatch(data, seat)
+        except (ValueError, KeyError, TypeError) as e:
+            # The seat's copy is behind or it asked for something illegal,
+            # either way it starts over from the host's state
+            netLog.warning("Rejected %s from seat %d: %s", data.get('action'), seat + 1, e)
+            if self.state is not None:
+                self.sendSeat(seat, self.sync.snapshotMessage(self.state, seat))
+
+    def sendSeat(self, seat, *messages):
+        if seat == 0:
+            for data in messages:
+                self.dispatcher.dispatch(data)
+        elif self.seats[seat] is not None:
+            netLog.debug("Sending to seat %d: %s", seat + 1, messages)
+            self.seats[seat].write(b''.join(wire.frame(wire.JSON.encode(data)) for data in messages))
+
+    def sendAll(self, *messages):
+        for seat in range(self.numPlayers):
+            self.sendSeat(seat, *messages)
+
+    def deal(self):
+        seed = gamelog.newSeed()
+        self.state = gamelog.deal(self.numPlayers, seed, self.names)
+        self.sync.reset()
+        self.playAgainSeats.clear()
+        self.game = gameLog.newGame(seed, self.numPlayers) if gameLog else None
+        for seat in range(self.numPlayers):
+            data = self.sync.snapshotMessage(self.state, seat)
+            data['action'] = 'deal'
+            data['nicknames'] = self.names
+            self.sendSeat(seat, data)
+
+    def record(self, seat, move):
+        if self.game is not None:
+            gameLog.record(self.game, seat, move, self.state)
+
+    # Intent handlers, each called with the seat that sent it
+    def chooseTopCards(self, seat, data):
+        mask = sync.parseTopCards(data['topCards'])
+        if not engine.isLegal(self.state, (engine.CHOOSE_TOP, mask), seat):
+            raise sync.SyncError(f"Seat {seat + 1} chose illegal top cards")
+        self.state = engine.chooseTopCards(self.state, seat, mask)
+        self.record(seat, (engine.CHOOSE_TOP, mask))
+        confirmed = {'action': 'confirmTopCards', 'playerIndex': seat, 'topCards': data['topCards']}
+        if self.state.topCardSelectionPhase:
+            self.sendAll(confirmed)
+        else:
+            self.sendAll(confirmed, {'action': 'startGame', 'gameState': ""})
+
+    def move(self, seat, data):
+        # Checked on masks first, an illegal move costs no state copy
+        move = sync.resolveMove(self.state, sync.parseMove(data), self.rng)
+        if not engine.isLegal(self.state, move, seat):
+            raise sync.SyncError(f"Illegal move from seat {seat + 1}")
+        before = self.state
+        self.state = engine.apply(before, move)
+        self.record(seat, move)
+        # Each seat is sent the move as it may see it
+        for other, message in enumerate(self.sync.moveMessages(before, move, self.state, range(self.numPlayers))):
+            self.sendSeat(other, message)
+
+    def resync(self, seat, data):
+        self.sendSeat(seat, self.sync.snapshotMessage(self.state, seat))
+
+    def playAgain(self, seat, data):
+        if self.state.winner is None:
+            log.warning("Ignoring a play again request from seat %d mid-game", seat + 1)
+            return
+        self.playAgainSeats.add(seat)
+        if len(self.playAgainSeats) == self.numPlayers:
+            self.sendAll({'action': 'resetGame'})
+            self.deal()
 
-    def receiveData(self, sock):
-        rawMsgLen = self.recvall(sock, 4)
-        if not rawMsgLen:
-            return None
-        msglen = struct.unpack('>I', rawMsgLen)[0]
-        return self.recvall(sock, msglen)
-
-    def recvall(self, sock, n):
-        data = b''
-        while len(data) < n:
-            packet = sock.recv(n - len(data))
-            if not packet:
-                return None
-            data += packet
-        print(f"Received data: {data}\n")
-        return data
+    def sendIntent(self, data):
+        # The host's own seat queues behind the others on the loop thread
+        self.server.callSoon(self.handleIntent, 0, data)
 
     def close(self):
-        if self.serverSocket:
-            self.serverSocket.close()
-        for clientSocket in self.clientSockets:
-            clientSocket.close()
-
-    def broadcastToAll(self, data):
-        serializedData = json.dumps(data).encode('utf-8')
-        msgLen = struct.pack('>I', len(serializedData))
-        for clientSocket in self.clientSockets:
-            try:
-                print(f"Sending data to client: {serializedData}\n")
-                clientSocket.sendall(msgLen + serializedData)
-            except Exception as e:
-                print(f"Error broadcasting to client: {e}\n")
-        # Also process the broadcast on the server side
-        self.processBroadcast(data)
-
-    def processBroadcast(self, data):
-        if data['action'] == 'playCard':
-            self.controller.receiveGameState(data)
-        elif data['action'] == 'gameOver':
-            self.controller.gameOverSignal.emit(data['winner'])
-        elif data['action'] == 'confirmTopCards':
-            self.controller.checkBothPlayersConfirmed()
-        elif data['action'] == 'startGame':
-            self.controller.proceedWithGameSetup()
-        elif data['action'] == 'playAgainRequest':
-            self.controller.handlePlayAgain()
-        elif data['action'] == 'resetGame':
-            self.controller.resetGame()
-            self.controller.setupGame()
-
-class Client:
-    def __init__(self, host, port, communicator):
+        self.server.stop()
+        self.intents.report()
+        self.dispatcher.report()
+
+class Client(GamePeer):
+    # A guest's end of a hosted game. It joins the host's lobby, and once the
+    # host starts the game the same connection carries it. Connecting raises
+    # OSError for the lobby to report.
+    def __init__(self, host, port, communicator, lobby, nickname):
         self.host = host
         self.port = port
         self.communicator = communicator
-        self.clientSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.controller = None
-        try:
-            self.clientSocket.connect((self.host, self.port))
-            print("Connected to the server\n")
-            threading.Thread(target=self.handleServer).start()
-        except Exception as e:
-            print(f"Failed to connect to the server: {e}\n")
-            self.clientSocket = None  
+        self.lobby = lobby
+        self.started = False
+        self.closing = threading.Event()
+        self.dispatcher = self.peerDispatcher('client')
+        self.dispatcher.registerAll({
+            'lobbyLog': lambda data: self.lobby.logSignal.emit(data['message']),
+            'lobbyFull': self.onLobbyFull,
+            'start': self.onStart,
+        })
+        self.clientSocket = sockets.connect(self.host, self.port)
+        netLog.info("Connected to the server")
+        self.send({'action': 'lobbyJoin', 'name': nickname})
+        threading.Thread(target=self.handleServer).start()
 
     def handleServer(self):
+        reader = wire.FrameReader(self.clientSocket)
         while self.clientSocket: 
             try:
-                data = self.receiveData(self.clientSocket)
+                data = self.receiveData(reader)
                 if data:
                     self.processServerData(data)
                 else:
-                    print("No data received in handleServer\n")
+                    netLog.info("No data received in handleServer")
+                    break
             except ConnectionResetError:
-                print("Connection reset by server\n")
+                netLog.warning("Connection reset by server")
                 break
             except ConnectionAbortedError:
-                print("Connection aborted by server\n")
+                netLog.warning("Connection aborted by server")
+                break
+            except OSError as e:
+                if not self.closing.is_set():
+                    netLog.warning("Connection error: %s", e)
                 break
             except Exception as e:
-                print(f"Unexpected error: {e}\n")
+                netLog.exception("Unexpected error: %s", e)
                 break
-        if self.clientSocket:
-            self.clientSocket.close()
+        self.dispatcher.report()
+        if not self.closing.is_set():
+            # The host went away, in the lobby or in the middle of the game
+            self.close()
+            if self.started:
+                self.toController({'action': 'disconnect'})
+            else:
+                self.lobby.lobbyClosedSignal.emit()
 
     def processServerData(self, data):
         if data is None:
-            print("Received None data from server\n")
+            netLog.warning("Received None data from server")
             return
-        if data['action'] == 'confirmTopCards':
-            playerIndex = int(data['playerIndex'])
-            self.communicator.updateOpponentBottomCardsSignal.emit(playerIndex, data['bottomCards'])
-            self.communicator.updateOpponentTopCardsSignal.emit(playerIndex, data['topCards'])
-            self.communicator.updateOpponentHandSignal.emit(playerIndex, data['hand'])
-            self.controller.checkBothPlayersConfirmed()
-        elif data['action'] == 'deckSync':
-            self.communicator.updateDeckSignal.emit(data)
-        elif data['action'] == 'startGame':
-            self.controller.proceedWithGameSetup()
-        elif data['action'] == 'playCard':
-            self.controller.receiveGameState(data)
-        elif data['action'] == 'playAgainRequest':
-            self.controller.handlePlayAgain()
-        elif data['action'] == 'resetGame':
-            self.controller.resetGame()
-            self.controller.setupGame()
-        elif data['action'] == 'gameOver':
-            self.controller.gameOverSignal.emit(data['winner'])
+        self.dispatcher.dispatch(data)
 
-    def sendToServer(self, data):
-        self.broadcastToAll(data)
+    def onStart(self, data):
+        self.started = True
+        self.lobby.startSignalReceived.emit()
 
-    def receiveData(self, sock):
-        rawMsgLen = self.recvall(sock, 4)
-        if not rawMsgLen:
+    def onLobbyFull(self, data):
+        self.close()
+        self.lobby.lobbyFullSignal.emit()
+
+    def send(self, data):
+        try:
+            netLog.debug("Sending to server: %s", data)
+            self.clientSocket.sendall(wire.frame(wire.JSON.encode(data)))
+        except Exception as e:
+            netLog.warning("Error sending data to server: %s", e)
+
+    def sendIntent(self, data):
+        # Nothing is applied here, the host's move comes back like everyone else's
+        self.send(data)
+
+    def receiveData(self, reader):
+        message = reader.readFrame()
+        if message is None:
             return None
-        msglen = struct.unpack('>I', rawMsgLen)[0]
-        return self.recvall(sock, msglen)
-
-    def recvall(self, sock, n):
-        data = b''
-        while len(data) < n:
-            packet = sock.recv(n - len(data))
-            if not packet:
-                return None
-            data += packet
-        print(f"Received data: {data}\n")
+        data = wire.JSON.decode(message)
+        netLog.debug("Received: %s", data)
         return data
 
+    def leave(self):
+        if self.clientSocket:
+            self.send({'action': 'leave'})
+        self.close()
+
     def close(self):
-        if self.clientSocket: 
-            self.clientSocket.close()
-            self.clientSocket = None
-
-    def broadcastToAll(self, data):
-        serializedData = json.dumps(data).encode('utf-8')
-        msgLen = struct.pack('>I', len(serializedData))
-        # Send to the server
-        try:
-            print(f"Sending data to client: {serializedData}\n")
-            self.clientSocket.sendall(msgLen + serializedData)
-        except Exception as e:
-            print(f"Error sending data to server: {e}\n")
-        # Also send to other clients
-        self.controller.communicator.updateUISignal.emit()
-        self.processBroadcast(data)
-
-    def processBroadcast(self, data):
-        if data['action'] == 'playCard':
-            self.controller.receiveGameState(data)
-        elif data['action'] == 'gameOver':
-            self.controller.gameOverSignal.emit(data['winner'])
-        elif data['action'] == 'confirmTopCards':
-            self.controller.checkBothPlayersConfirmed()
-        elif data['action'] == 'startGame':
-            self.controller.proceedWithGameSetup()
-        elif data['action'] == 'playAgainRequest':
-            self.controller.handlePlayAgain()
-        elif data['action'] == 'resetGame':
-            self.controller.resetGame()
-            self.controller.setupGame()
+        # Shutting down wakes the reader thread and tells the host the seat left
+        self.closing.set()
+        sock, self.clientSocket = self.clientSocket, None
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
 
 class GameOverDialog(QDialog):
     playAgainSignal = pyqtSignal()
@@ -653,6 +670,11 @@ class HomeScreen(QWidget):
         super().__init__()
         self.communicator = communicator
         self.controller = None
+        self.communicator.logTextSignal.connect(self.updateLogText)
+        self.communicator.playerCountLabelSignal.connect(self.updatePlayerCountLabel)
+        self.communicator.startButtonEnabledSignal.connect(self.setStartButtonEnabled)
+        self.communicator.dealSignal.connect(self.startNetworkGame)
+        self.connection = None
         self.initUI()
 
     def initUI(self):
@@ -823,22 +845,27 @@ class HomeScreen(QWidget):
         self.joinLobbyDialog.show()
         onlineDialog.accept()
 
-    def startHost(self, clientSockets):
+    def startHost(self, server):
+        # The lobby's server carries the game, it deals once started
         self.hide()
-        self.server = Server('localhost', 5555, self.communicator)
-        self.server.clientSockets = clientSockets  # Assign client sockets
-        self.controller = GameController(numPlayers=len(clientSockets) + 1, difficulty='medium', connection=self.server, playerIndex=0)  # Adjust numPlayers
-        self.server.controller = self.controller
-        self.controller.mainMenuRequested.connect(self.returnToMainMenu)
-        self.controller.view.show()
+        self.connection = server
     
-    def startClient(self):
+    def startClient(self, client):
         self.hide()
-        self.client = Client('localhost', 5555, self.communicator) 
-        self.controller = GameController(numPlayers=2, difficulty='medium', connection=self.client, playerIndex=1)  # Client is playerIndex 1
-        self.client.controller = self.controller 
-        self.controller.mainMenuRequested.connect(self.returnToMainMenu)
-        self.controller.view.show()
+        self.connection = client
+
+    def startNetworkGame(self, data):
+        # Every deal from the host, the first one opens the game window at
+        # the seat the host gave us
+        if self.controller is None or self.controller.connection is not self.connection:
+            self.controller = GameController(numPlayers=len(data['nicknames']), difficulty='medium', connection=self.connection,
+                                             playerIndex=data['seat'])
+            self.controller.mainMenuRequested.connect(self.returnToMainMenu)
+            self.connection.attach(self.controller)
+            self.controller.view.show()
+        else:
+            self.controller.resetGame()
+        self.controller.loadDeal(data)
     
     def showRules(self):
         self.rulesDialog = QDialog(self)
@@ -908,6 +935,18 @@ class HomeScreen(QWidget):
         centerDialog(self.rulesDialog, self, "rulesDialog")
         self.rulesDialog.exec()
 
+    def updateLogText(self, message):
+        if hasattr(self, 'hostLobbyDialog') and self.hostLobbyDialog:
+            self.hostLobbyDialog.logText.append(message)
+    
+    def updatePlayerCountLabel(self, text):
+        if hasattr(self, 'hostLobbyDialog') and self.hostLobbyDialog:
+            self.hostLobbyDialog.playerCountLabel.setText(text)
+    
+    def setStartButtonEnabled(self, enabled):
+        if hasattr(self, 'hostLobbyDialog') and self.hostLobbyDialog:
+            self.hostLobbyDialog.startButton.setEnabled(enabled)
+
 class Player:
     def __init__(self, name):
         self.name = name
@@ -939,11 +978,6 @@ class GameView(QWidget):
         self.communicator = communicator
         self.initUI()
 
-        # Connect signals to slots
-        self.communicator.updateOpponentBottomCardsSignal.connect(self.updateOpponentBottomCards)
-        self.communicator.updateOpponentTopCardsSignal.connect(self.updateOpponentTopCards)
-        self.communicator.updateOpponentHandSignal.connect(self.updateOpponentHand)
-        
     def initUI(self):
         self.setWindowTitle(f'Palace Card Game - {self.playerType}')
         self.setWindowIcon(QIcon(r"_internal\palaceData\palace.ico"))
@@ -1060,6 +1094,13 @@ class GameView(QWidget):
         # Width of the center console column
         self.layout.setColumnMinimumWidth(5, 500)
 
+        self.playerHandRow = self.cardRow(self.playerHandLayout, spacer=True)
+        self.opponentHandRow = self.cardRow(self.opponentHandLayout, hidden=True, spacer=True)
+        self.topCardsRow = self.cardRow(self.topCardsLayout, enabled=False, placeholder=True)
+        self.opponentTopCardsRow = self.cardRow(self.opponentTopCardsLayout, enabled=False, placeholder=True)
+        self.bottomCardsRow = self.cardRow(self.bottomCardsLayout, hidden=True, placeholder=True)
+        self.opponentBottomCardsRow = self.cardRow(self.opponentBottomCardsLayout, hidden=True, placeholder=True)
+
         if self.controller.numPlayers >= 3:
             # Player 3 setup
             self.player3HandLayout = QVBoxLayout()
@@ -1098,173 +1139,38 @@ class GameView(QWidget):
     def showEvent(self, event):
         centerDialog(self, self, "GameView")
     
-    def updateHandButtons(self, hand, layout, isPlayer, rotate):
-        while layout.count():
-            item = layout.takeAt(0)
-            widget = item.widget()
-            if widget is not None:
-                widget.deleteLater()
-        self.controller.playCardButtons = []
-        for idx, card in enumerate(hand):
-            button = QLabel()
-            if rotate:
-                button.setFixedSize(BUTTON_HEIGHT, BUTTON_WIDTH)
-            else:
-                button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            if not card[3] and isPlayer:
-                pixmap = QPixmap(fr"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                if rotate:
-                    transform = QTransform().rotate(90)
-                    pixmap = pixmap.transformed(transform, Qt.TransformationMode.SmoothTransformation).scaled(CARD_HEIGHT, CARD_WIDTH, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                else:
-                    pixmap = pixmap.scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                button.setPixmap(pixmap)
-            else:
-                pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                if rotate:
-                    transform = QTransform().rotate(90)
-                    pixmap = pixmap.transformed(transform, Qt.TransformationMode.SmoothTransformation).scaled(CARD_HEIGHT, CARD_WIDTH, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                else:
-                    pixmap = pixmap.scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            if self.controller.topCardSelectionPhase:
-                button.mousePressEvent = lambda event, idx=idx, btn=button: self.selectTopCard(idx, btn)
-            else:
-                try:
-                    button.mousePressEvent = lambda event, idx=idx, btn=button: self.controller.prepareCardPlacement(idx, btn)
-                except IndexError:
-                    return
-            self.controller.playCardButtons.append(button)
-            layout.addWidget(button)
-
-        if len(hand) >= 10:
-            spacer = QLabel()
-            spacer.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            layout.addWidget(spacer)
-
-    def updateOpponentHand(self, playerIndex, hand):
-        self.controller.players[playerIndex].hand = hand
-        self.updateOpponentHandButtons(hand)
-        
-    def updateOpponentTopCards(self, playerIndex, topCards):
-        self.controller.players[playerIndex].topCards = topCards
-        self.updateOpponentTopCardButtons(topCards)
-        
-    def updateOpponentBottomCards(self, playerIndex, bottomCards):
-        self.controller.players[playerIndex].bottomCards = bottomCards
-        self.updateOpponentBottomCardButtons(bottomCards)
-    
+    def cardRow(self, layout, **options):
+        return CardRow(layout, (CARD_WIDTH, CARD_HEIGHT), (BUTTON_WIDTH, BUTTON_HEIGHT), **options)
+
+    def updateHandButtons(self, hand, row, isPlayer):
+        onClick = None
+        if isPlayer:
+            onClick = self.selectTopCard if self.controller.topCardSelectionPhase else self.controller.prepareCardPlacement
+        row.update(hand, onClick)
+        self.controller.playCardButtons = row.labels()
+
     def updatePlayerHandButtons(self, hand):
-        self.updateHandButtons(hand, self.playerHandLayout, True, False)
+        self.updateHandButtons(hand, self.playerHandRow, True)
     
     def updateOpponentHandButtons(self, hand):
-        self.updateHandButtons(hand, self.opponentHandLayout, False, False)
+        self.updateHandButtons(hand, self.opponentHandRow, False)
 
     def updatePlayerTopCardButtons(self, topCards):
-        for i in reversed(range(self.topCardsLayout.count())):
-            self.topCardsLayout.itemAt(i).widget().deleteLater()
-
-        for card in topCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(f"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            button.setDisabled(True)
-            self.topCardsLayout.addWidget(button)
-        if not topCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.topCardsLayout.addWidget(self.placeholder)
+        self.topCardsRow.update(topCards)
 
     def updateOpponentTopCardButtons(self, topCards):
-        for i in reversed(range(self.opponentTopCardsLayout.count())):
-            self.opponentTopCardsLayout.itemAt(i).widget().deleteLater()
-
-        for card in topCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(f"_internal\palaceData\cards\{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            button.setDisabled(True)
-            self.opponentTopCardsLayout.addWidget(button)
-        if not topCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.opponentTopCardsLayout.addWidget(self.placeholder)
+        self.opponentTopCardsRow.update(topCards)
 
     def updatePlayerBottomCardButtons(self, bottomCards):
-        for i in reversed(range(self.bottomCardsLayout.count())):
-            self.bottomCardsLayout.itemAt(i).widget().deleteLater()
-
-        for card in bottomCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.bottomCardsLayout.addWidget(button)
-        if not bottomCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.bottomCardsLayout.addWidget(self.placeholder)
+        self.bottomCardsRow.update(bottomCards)
 
     def updateOpponentBottomCardButtons(self, bottomCards):
-        for i in reversed(range(self.opponentBottomCardsLayout.count())):
-            self.opponentBottomCardsLayout.itemAt(i).widget().deleteLater()
-
-        for card in bottomCards:
-            button = QLabel()
-            button.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            button.setStyleSheet("border: 0px solid black; background-color: transparent;")
-            pixmap = QPixmap(r"_internal\palaceData\cards\back.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            button.setPixmap(pixmap)
-            button.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.opponentBottomCardsLayout.addWidget(button)
-        if not bottomCards:
-            self.placeholder = QLabel()
-            self.placeholder.setFixedSize(BUTTON_WIDTH, BUTTON_HEIGHT)
-            self.opponentBottomCardsLayout.addWidget(self.placeholder)
+        self.opponentBottomCardsRow.update(bottomCards)
 
     def confirmTopCardSelection(self):
-        if self.controller.isHost:
-            playerIndex = 0
-        else:
-            playerIndex = 1
-        player = self.controller.players[playerIndex]
-        for card, _ in self.chosenCards:
-            player.topCards.append((card[0], card[1], True, False))
-        for card, cardIndex in sorted(self.chosenCards, key=lambda x: x[1], reverse=True):
-            del player.hand[cardIndex]
-
-        if self.controller.isHost:
-            self.updatePlayerBottomCardButtons(player.bottomCards)
-            self.updatePlayerTopCardButtons(player.topCards)
-            self.updatePlayerHandButtons(player.hand)
-            self.controller.connection.sendToClient({
-                'action': 'confirmTopCards',
-                'playerIndex': playerIndex,
-                'topCards': player.topCards,
-                'bottomCards': player.bottomCards,
-                'hand': player.hand
-            })
-        else:
-            self.updatePlayerBottomCardButtons(player.bottomCards)
-            self.updatePlayerTopCardButtons(player.topCards)
-            self.updatePlayerHandButtons(player.hand)
-            self.controller.connection.sendToServer({
-                'action': 'confirmTopCards',
-                'playerIndex': playerIndex,
-                'topCards': player.topCards,
-                'bottomCards': player.bottomCards,
-                'hand': player.hand
-            })
+        # The cards move when the host confirms the choice
+        topCards = [(card[0], card[1], True, False) for card, _ in self.chosenCards]
+        self.controller.confirmTopCards(topCards)
         self.confirmButton.setDisabled(True)
         self.disablePlayerHand()
     
@@ -1293,25 +1199,19 @@ class GameView(QWidget):
             
             if pile:
                 topCard = pile[-1]
-                pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-                self.pileLabel.setPixmap(pixmap)
+                self.pileLabel.setPixmap(cardPixmap(topCard))
 
             self.placeButton.setEnabled(len(self.controller.selectedCards) > 0)
        
     def revealCard(self, cardLabel, card):
-        pixmap = QPixmap(fr"_internal/palaceData/cards/{card[0].lower()}_of_{card[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-        cardLabel.setPixmap(pixmap)
+        self.playerHandRow.reveal(cardLabel, card)
 
     def showTopCardSelection(self):
         self.chosenCards = []
         self.cardButtons = []
 
     def selectTopCard(self, cardIndex, button):
-        if self.controller.isHost:
-            playerIndex = 0 
-        else:
-            playerIndex = 1
-        card = self.controller.players[playerIndex].hand[cardIndex]
+        card = self.controller.players[self.controller.playerIndex].hand[cardIndex]
         if (card, cardIndex) in self.chosenCards:
             self.chosenCards.remove((card, cardIndex))
             button.setStyleSheet("border: 0px solid black; background-color: transparent;")
@@ -1327,74 +1227,17 @@ class GameView(QWidget):
         self.confirmButton.setEnabled(False)
         self.placeButton.setEnabled(False)
         
-        # Clear player hand layout
-        while self.playerHandLayout.count():
-            item = self.playerHandLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent hand layout
-        while self.opponentHandLayout.count():
-            item = self.opponentHandLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear player top cards layout
-        while self.topCardsLayout.count():
-            item = self.topCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear player bottom cards layout
-        while self.bottomCardsLayout.count():
-            item = self.bottomCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent top cards layout
-        while self.opponentTopCardsLayout.count():
-            item = self.opponentTopCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
-        
-        # Clear opponent bottom cards layout
-        while self.opponentBottomCardsLayout.count():
-            item = self.opponentBottomCardsLayout.takeAt(0)
-            widget = item.widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.deleteLater()
+        for row in (self.playerHandRow, self.opponentHandRow, self.topCardsRow, self.bottomCardsRow, self.opponentTopCardsRow, self.opponentBottomCardsRow):
+            row.clear()
 
     def enablePlayerHand(self):
-        for i in range(self.playerHandLayout.count()):
-            widget = self.playerHandLayout.itemAt(i).widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.setEnabled(True)
+        self.playerHandRow.setEnabled(True)
 
     def disablePlayerHand(self):
-        for i in range(self.playerHandLayout.count()):
-            widget = self.playerHandLayout.itemAt(i).widget()
-            if widget is None or (isinstance(widget, QLabel) and widget.pixmap() is None):  # Check if it's the spacer
-                continue
-            widget.setEnabled(False)
+        self.playerHandRow.setEnabled(False)
 
     def enableOpponentHandNotClickable(self):
-        for i in range(self.opponentHandLayout.count()):
-            widget = self.opponentHandLayout.itemAt(i).widget()
-            if widget:
-                widget.setEnabled(True)
-                widget.mousePressEvent = lambda event: None 
+        self.opponentHandRow.setEnabled(True)
 
     def closeEvent(self, event):
         self.controller.closeConnections()
@@ -1405,6 +1248,8 @@ class GameController(QObject):
     mainMenuRequested = pyqtSignal()
     exitRequested = pyqtSignal()
     gameOverSignal = pyqtSignal(str)
+    repaintSignal = pyqtSignal()
+    messageSignal = pyqtSignal(dict)
 
     def __init__(self, numPlayers, difficulty, connection=None, playerIndex=0):
         super().__init__()
@@ -1415,6 +1260,25 @@ class GameController(QObject):
         self.communicator.startGameSignal.connect(self.proceedWithGameSetup)
         self.communicator.proceedWithGameSetupSignal.connect(self.proceedWithGameSetupOnMainThread)
         self.communicator.updateUISignal.connect(self.updateUI)
+        # Queued, so any number of updateUI calls before control returns to
+        # the event loop are drawn by a single repaint
+        self.repaintPending = False
+        self.repaintSignal.connect(self.repaint, Qt.ConnectionType.QueuedConnection)
+        self.scheduler = Scheduler()
+        # The host's messages arrive on the network thread and are handled on this one
+        self.dispatcher = dispatch.Dispatcher('game')
+        self.dispatcher.registerAll({
+            'move': self.receiveMove,
+            'snapshot': self.receiveSnapshot,
+            'confirmTopCards': self.receiveTopCards,
+            'startGame': lambda data: self.proceedWithGameSetupOnMainThread(),
+            'resetGame': lambda data: self.resetGame(),
+            'disconnect': self.handleDisconnect,
+        })
+        # Messages that arrive while a blind card is shown wait behind it
+        self.revealing = False
+        self.heldMessages = []
+        self.messageSignal.connect(self.receiveMessage)
         
         self.playerType = f"Player {self.playerIndex + 1}"
         self.view = GameView(self, self.playerType, self.communicator)
@@ -1425,19 +1289,20 @@ class GameController(QObject):
         self.currentPlayerIndex = 0
         self.selectedCards = []
         self.playCardButtons = []
+        self.playableHand = None
+        self.playableKey = None
+        self.playableFlags = []
         self.topCardSelectionPhase = True
         self.connection = connection
-        self.setupGame()
+        self.sync = sync.StateSync()
+        self.seatView = None  # A networked seat's game, only what it may see
         self.gameOver = False
-
-        self.communicator.updateDeckSignal.connect(self.receiveDeckFromServer)
+        self.setupGame()
     
-        self.playAgainRequested.connect(self.handlePlayAgain)
+        self.playAgainRequested.connect(self.requestPlayAgain)
         self.mainMenuRequested.connect(self.handleMainMenu)
         self.exitRequested.connect(QCoreApplication.instance().quit)
-        self.playAgainCount = 0
         
-        self.gameOverSignal.connect(self.stopTimer)
         self.gameOverSignal.connect(self.showGameOverDialog)
     
     def showGameOverDialog(self, winnerName):
@@ -1448,36 +1313,12 @@ class GameController(QObject):
         dialog.exec()
 
     def requestPlayAgain(self):
-        self.playAgainCount += 1
-        if self.playAgainCount == 2:
-            self.playAgainCount = 0
-            self.resetGame()
-            self.setupGame()
-            self.notifyReset()
+        # The host deals again once every seat has asked
+        if self.connection:
+            self.connection.sendIntent({'action': 'playAgainRequest', 'count': 1})
         else:
-            data = {'action': 'playAgainRequest'}
-            if self.playerIndex == 0:
-                self.connection.sendToClient(data)
-            else:
-                self.connection.sendToServer(data)
-
-    def handlePlayAgain(self):
-        self.playAgainCount += 1
-        if self.playAgainCount == 2:
-            self.playAgainCount = 0
             self.resetGame()
             self.setupGame()
-            self.notifyReset()
-        elif self.playerIndex != 0:
-            data = {'action': 'playAgainRequest'}
-            self.connection.sendToServer(data)
-
-    def notifyReset(self):
-        data = {'action': 'resetGame'}
-        if self.playerIndex == 0:
-            self.connection.sendToClient(data)
-        else:
-            self.connection.sendToServer(data)
 
     def resetGame(self):
         self.deck = []
@@ -1486,50 +1327,51 @@ class GameController(QObject):
         self.selectedCards = []
         self.playCardButtons = []
         self.topCardSelectionPhase = True
-        self.players = [Player("Player 1"), Player("Player 2")]
+        self.gameOver = False
+        self.seatView = None
+        self.sync.reset()
+        self.scheduler.cancel()
+        self.revealing = False
+        self.heldMessages = []
+        self.players = [Player(f"Player {i+1}") for i in range(self.numPlayers)]
         self.view.clearSelectionLayout()
 
+    def handleDisconnect(self, data):
+        # A seat left mid-game, the host has ended it
+        log.warning("A player left, the game is over")
+        self.gameOver = True
+        self.scheduler.cancel()
+        self.selectedCards = []
+        self.view.disablePlayerHand()
+        self.view.placeButton.setEnabled(False)
+        self.view.pickUpPileButton.setEnabled(False)
+        self.view.currentPlayerLabel.setText("A player left the game")
+
     def handleMainMenu(self):
         self.closeConnections()
         self.view.close()
         self.mainMenuRequested.emit()
     
-    def stopTimer(self):
-        if hasattr(self, 'timer'):
-            self.timer.stop()
-    
-    def startGameLoop(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.gameLoop)
-        self.timer.start(1000)
-
-    def gameLoop(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        self.view.updateUI(currentPlayer, len(self.deck), self.pile)
-
     def pickUpPile(self):
         if not self.pile:
             return
-        currentPlayer = self.players[self.currentPlayerIndex]
-        currentPlayer.pickUpPile(self.pile)
-        print(f"{currentPlayer.name} picks up the pile\n")
-        self.view.pileLabel.setText("Pile: Empty")
-        self.sevenSwitch = False
-        self.updateUI()
-        self.changeTurn()
-        self.sendGameState()
-        self.view.placeButton.setText("Opponent's Turn...")
+        self.submitMove((engine.PICKUP, 0))
+        self.view.pickUpPileButton.setEnabled(False)
 
     def setupGame(self):
-        if self.playerIndex == 0:
-            self.deck = self.createDeck()
-            random.shuffle(self.deck)
-            self.dealInitialCards(self.players[0])
-            self.dealInitialCards(self.players[1])
-            self.sendDeckToClient()
-            self.view.updatePlayerHandButtons(self.players[0].hand)
-        else:
-            self.view.updatePlayerHandButtons(self.players[1].hand)
+        # A networked game waits for the host's deal
+        if self.connection is None:
+            names = [player.name for player in self.players]
+            self.showDeal(gamelog.deal(self.numPlayers, gamelog.newSeed(), names))
+
+    def loadDeal(self, data):
+        self.seatView = self.sync.applySnapshot([player.name for player in self.players], data)
+        self.showDeal(self.seatView)
+
+    def showDeal(self, state):
+        self.loadEngineState(state)
+        self.topCardSelectionPhase = True
+        self.view.updatePlayerHandButtons(self.players[self.playerIndex].hand)
         self.view.showTopCardSelection()
 
     def proceedWithGameSetup(self):
@@ -1539,67 +1381,57 @@ class GameController(QObject):
         self.topCardSelectionPhase = False
         self.updateUI()
         self.view.pileLabel.setText("Pile: Empty")
-        if self.playerType == "Player 2":
+        if not self.isSessionPlayer():
             self.view.disablePlayerHand()
             self.view.pickUpPileButton.setDisabled(True)
-        self.startGameLoop()
-
-    def createDeck(self):
-        suits = ['clubs', 'spades']
-        return [(rank, suit, False, False) for rank in RANKS for suit in suits]
-
-    def dealInitialCards(self, player):
-        player.bottomCards = [(card[0], card[1], False, True) for card in self.deck[:3]]
-        player.hand = self.deck[3:9]
-        self.deck = self.deck[9:]
-
-    def sendDeckToClient(self):
-        data = {
-            'action': 'deckSync', 
-            'deck': self.deck, 
-            'player2bot': self.players[1].bottomCards,
-            'player2top': self.players[1].topCards,
-            'player2hand': self.players[1].hand
-        }
-        self.connection.broadcastToClients(data)
-                
-    def receiveDeckFromServer(self, data):
-        self.deck = data['deck']
-        self.players[1].bottomCards = data['player2bot']
-        self.players[1].topCards = data['player2top']
-        self.players[1].hand = data['player2hand']
-        self.view.updatePlayerHandButtons(self.players[1].hand)
-        self.view.placeButton.setText("Opponent's Turn...")
-
-    def checkBothPlayersConfirmed(self):
-        time.sleep(1)
-        if all(player.topCards for player in self.players):
-            self.sendStartGameSignal()
-            self.proceedWithGameSetup()
-    
-    def sendStartGameSignal(self):
-        data = {'action': 'startGame', 'gameState': ""}
-        self.connection.broadcastToAll(data)
-    
+
+    def confirmTopCards(self, topCards):
+        data = {'action': 'confirmTopCards', 'playerIndex': self.playerIndex, 'topCards': topCards}
+        if self.connection:
+            self.connection.sendIntent(data)
+        else:
+            self.receiveTopCards(data)
+
+    def receiveTopCards(self, data):
+        seat = int(data['playerIndex'])
+        mask = tuplesToMask(data['topCards'])
+        try:
+            if self.connection:
+                state = self.seatView = seatview.chooseTopCards(self.seatView, seat, mask)
+            else:
+                state = engine.chooseTopCards(self.engineState(), seat, mask)
+        except ValueError as e:
+            log.warning("Rejected top cards for seat %d: %s", seat + 1, e)
+            return
+        self.loadEngineState(state)
+        if seat == self.playerIndex:
+            player = self.players[seat]
+            self.view.updatePlayerBottomCardButtons(player.bottomCards)
+            self.view.updatePlayerTopCardButtons(player.topCards)
+            self.view.updatePlayerHandButtons(player.hand)
+        self.updateUI()
+        if self.connection is None and not state.topCardSelectionPhase:
+            self.proceedWithGameSetupOnMainThread()
+
     def updateUI(self):
+        if not self.repaintPending:
+            self.repaintPending = True
+            self.repaintSignal.emit()
+
+    def repaint(self):
+        self.repaintPending = False
         self.view.enableOpponentHandNotClickable()
         currentPlayer = self.players[self.currentPlayerIndex]
         if not self.topCardSelectionPhase:
             self.view.updateUI(currentPlayer, len(self.deck), self.pile)
-            if self.playerIndex == 0:
-                self.view.updatePlayerHandButtons(self.players[0].hand)
-                self.view.updateOpponentHandButtons(self.players[1].hand)
-                self.view.updatePlayerTopCardButtons(self.players[0].topCards)
-                self.view.updateOpponentTopCardButtons(self.players[1].topCards)
-                self.view.updatePlayerBottomCardButtons(self.players[0].bottomCards)
-                self.view.updateOpponentBottomCardButtons(self.players[1].bottomCards)
-            else:
-                self.view.updatePlayerHandButtons(self.players[1].hand)
-                self.view.updateOpponentHandButtons(self.players[0].hand)
-                self.view.updatePlayerTopCardButtons(self.players[1].topCards)
-                self.view.updateOpponentTopCardButtons(self.players[0].topCards)
-                self.view.updatePlayerBottomCardButtons(self.players[1].bottomCards)
-                self.view.updateOpponentBottomCardButtons(self.players[0].bottomCards)
+            player = self.players[self.playerIndex]
+            opponent = self.players[(self.playerIndex + 1) % self.numPlayers]
+            self.view.updatePlayerHandButtons(player.hand)
+            self.view.updateOpponentHandButtons(opponent.hand)
+            self.view.updatePlayerTopCardButtons(player.topCards)
+            self.view.updateOpponentTopCardButtons(opponent.topCards)
+            self.view.updatePlayerBottomCardButtons(player.bottomCards)
+            self.view.updateOpponentBottomCardButtons(opponent.bottomCards)
         if self.isSessionPlayer():
             self.updatePlayableCards()
         else:
@@ -1614,311 +1446,207 @@ class GameController(QObject):
             self.selectedCards.append((card, cardLabel))
             cardLabel.setStyleSheet("border: 0px solid black; background-color: blue;")
 
-        selectedCardRank = card[0]
-        handIndex = 0
+        hand = self.players[self.currentPlayerIndex].hand
+        labels = self.view.playerHandRow.labels()
         if not self.selectedCards:
-            for i in range(self.view.playerHandLayout.count()):
-                lbl = self.view.playerHandLayout.itemAt(i).widget()
-                if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):
-                    continue
-                if handIndex >= len(self.players[self.currentPlayerIndex].hand):
-                    break
-                handCard = self.players[self.currentPlayerIndex].hand[handIndex]
-                if handCard[3] or self.isCardPlayable(handCard):
+            playableFlags = self.playableCardFlags()
+            for lbl, playable in zip(labels, playableFlags):
+                if playable:
                     lbl.setEnabled(True)
-                handIndex += 1
         else:
-            handIndex = 0
-            for i in range(self.view.playerHandLayout.count()):
-                lbl = self.view.playerHandLayout.itemAt(i).widget()
-                if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):
-                    continue
-                if handIndex >= len(self.players[self.currentPlayerIndex].hand):
-                    break
-                handCard = self.players[self.currentPlayerIndex].hand[handIndex]
-                if handCard[0] == selectedCardRank or (handCard, lbl) in self.selectedCards:
+            # Cards of the selected rank go together; a face down card is
+            # played on its own
+            selected = self.selectedCards[0][0]
+            for lbl, handCard in zip(labels, hand):
+                if (handCard, lbl) in self.selectedCards:
                     lbl.setEnabled(True)
-                elif not handCard[3]:
-                    lbl.setEnabled(False)
-                handIndex += 1
+                else:
+                    lbl.setEnabled(not selected[3] and not handCard[3] and handCard[0] == selected[0])
         self.view.placeButton.setEnabled(len(self.selectedCards) > 0)
         if self.view.placeButton.text() == "Place":
             self.view.placeButton.setText("Select A Card")
         else:
             self.view.placeButton.setText("Place")
 
-    def isCardPlayable(self, card):
-        if self.pile:
-            topCard = self.pile[-1]
-        else:
-            topCard = None
-        if self.sevenSwitch:
-            return VALUES[card[0]] <= 7 or card[0] in ['2', '10']
-        if not topCard:
-            return True
-        return card[0] == '2' or card[0] == '10' or VALUES[card[0]] >= VALUES[topCard[0]]
+    def playableCardFlags(self):
+        # Recomputed only when the pile top or the current hand changes; keeping a
+        # reference to the hand list makes the identity check safe
+        hand = self.players[self.currentPlayerIndex].hand
+        top = RANK_INDEX[self.pile[-1][0]] if self.pile else NO_RANK
+        key = (top, self.sevenSwitch, len(hand))
+        if self.playableHand is not hand or self.playableKey != key:
+            playable = engine.playableRanks(top, self.sevenSwitch)
+            self.playableFlags = [bool(card[3]) or playable >> RANK_INDEX[card[0]] & 1 == 1 for card in hand]
+            self.playableHand = hand
+            self.playableKey = key
+        return self.playableFlags
+
+    def engineState(self):
+        return engine.GameState.fromTuples(self.players, self.deck, self.pile, self.sevenSwitch, self.currentPlayerIndex, self.topCardSelectionPhase)
+
+    def loadEngineState(self, state):
+        # An engine.GameState, or a networked seat's SeatView, which reads the same
+        for player, playerState in zip(self.players, state.players):
+            player.hand = playerState.handTuples()
+            player.topCards = playerState.topTuples()
+            player.bottomCards = playerState.bottomTuples()
+        self.deck = state.deckTuples()
+        self.pile = state.pileTuples()
+        self.sevenSwitch = state.sevenSwitch
+        self.currentPlayerIndex = state.currentPlayerIndex
 
     def placeCard(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        playedCards = []
-        pickUp = False
-
-        for card, button in sorted(self.selectedCards, key=lambda x: currentPlayer.hand.index(x[0])):
-            if card[3] and not self.isCardPlayable(card):
-                playedCards.append(card)
-                for i, card in enumerate(playedCards):
-                    self.pile.append(currentPlayer.hand.pop(currentPlayer.hand.index(playedCards[i])))
-                    self.pile[-1] = (card[0], card[1], card[2], False)
-                    self.view.revealCard(button, card)
-                pickUp = True
-                button.setParent(None)
-                button.deleteLater()
-            else:
-                playedCards.append(card)
-                currentPlayer.playCard(currentPlayer.hand.index(card), self.pile)
+        playedCards = [card for card, _ in self.selectedCards]
+        for card, button in self.selectedCards:
+            if card != HIDDEN_CARD:
                 self.view.revealCard(button, card)
-                button.setParent(None)
-                button.deleteLater()
-
-        if pickUp:
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            QCoreApplication.processEvents()
-            time.sleep(1)
-            currentPlayer.pickUpPile(self.pile)
-            print(f"{currentPlayer.name} picks up the pile\n")
-            self.view.pileLabel.setText("Pile: Empty")
-            self.sevenSwitch = False
-            for card in reversed(currentPlayer.hand):
-                if card[3]:
-                    currentPlayer.bottomCards.append(currentPlayer.hand.pop(currentPlayer.hand.index(card)))
+            button.hide()  # The row shows the label again when it reuses it
+        self.selectedCards = []
+        if playedCards[-1] != HIDDEN_CARD:
+            self.view.pileLabel.setPixmap(cardPixmap(playedCards[-1]))
+        self.view.placeButton.setEnabled(False)
+        self.submitMove(seatview.selectedMove(playedCards))
+
+    def submitMove(self, move):
+        # Only an intent: the move is applied when the host sends it back
+        self.view.disablePlayerHand()
+        if self.connection:
+            self.connection.sendIntent({'action': 'intent', 'kind': move[0], 'cards': cardsIn(move[1])})
+            return
+        before = self.engineState()
+        try:
+            state = engine.apply(before, move)
+        except ValueError as e:
+            log.warning("Illegal move: %s", e)
             self.updateUI()
-            self.changeTurn()
-            self.sendGameState()
-            self.view.placeButton.setText("Opponent's Turn...")
             return
+        self.showMove(before, state)
 
-        self.selectedCards = []
-        print(f"{currentPlayer.name} plays {', '.join([f'{card[0]} of {card[1]}' for card in playedCards])}\n")
+    def receiveMove(self, data):
+        before = self.seatView
+        try:
+            self.seatView = self.sync.applyMove(before, data)
+        except ValueError as e:
+            log.warning("Out of sync (%s), requesting a snapshot", e)
+            self.connection.sendIntent(self.sync.resyncRequest())
+            return
+        self.showMove(before, self.seatView)
 
-        while len(currentPlayer.hand) < 3 and self.deck:
-            currentPlayer.hand.append(self.deck.pop(0))
+    def receiveMessage(self, data):
+        if self.revealing:
+            self.heldMessages.append(data)
+        else:
+            self.dispatcher.dispatch(data)
+
+    def showMove(self, before, state):
+        mover = self.players[before.currentPlayerIndex]
+        if state.lastEvent == engine.PICKED_UP and state.lastMove[0] == engine.PLAY:
+            # Leave the failed blind card on the pile for a moment before picking up
+            log.info("%s plays %s", mover.name, logs.lazy(describeCards, maskToTuples(state.lastMove[1])))
+            self.view.pileLabel.setPixmap(cardPixmap(maskToTuples(state.lastMove[1])[0]))
+            self.view.disablePlayerHand()
+            self.view.placeButton.setEnabled(False)
+            self.view.pickUpPileButton.setEnabled(False)
+            self.revealing = True
+            self.scheduler.after(REVEAL_DELAY, lambda: self.finishReveal(mover, state))
+            return
+        self.finishMove(mover, state)
 
-        self.view.updatePlayerHandButtons(currentPlayer.hand)
+    def finishReveal(self, mover, state):
+        self.revealing = False
+        self.finishMove(mover, state)
+        while self.heldMessages and not self.revealing:
+            self.dispatcher.dispatch(self.heldMessages.pop(0))
 
-        if self.checkFourOfAKind():
-            print("Four of a kind! Clearing the pile.\n")
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.updateUI()
-            self.checkGameState()
-            if self.gameOver:
-                self.sendGameState()
-                self.gameOverSignal.emit(currentPlayer.name)
-                return
-            self.sendGameState()
-            self.pile.clear()
-            self.updateUI()
-            self.view.pileLabel.setText("Bombed!!!")
-            self.view.placeButton.setText("Select A Card")
-            return
-        
-        if '2' in [card[0] for card in playedCards]:
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.updateUI()
-            self.checkGameState()
-            if self.gameOver:
-                self.sendGameState()
-                self.gameOverSignal.emit(currentPlayer.name)
-                return
-            self.sendGameState()
-            self.view.placeButton.setText("Select A Card")
-        elif '10' in [card[0] for card in playedCards]:
-            self.sevenSwitch = False
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.updateUI()
-            self.checkGameState()
-            if self.gameOver:
-                self.sendGameState()
-                self.gameOverSignal.emit(currentPlayer.name)
-                return
-            self.sendGameState()
-            self.pile.clear()
-            self.updateUI()
+    def finishMove(self, mover, state):
+        if state.lastEvent == engine.PICKED_UP:
+            log.info("%s picks up the pile", mover.name)
+        else:
+            log.info("%s plays %s", mover.name, logs.lazy(describeCards, maskToTuples(state.lastMove[1])))
+        self.loadEngineState(state)
+        self.selectedCards = []
+        if state.burnt:
+            log.info("Bombed! Clearing the pile.")
             self.view.pileLabel.setText("Bombed!!!")
-            self.view.placeButton.setText("Select A Card")
+        elif not self.pile:
+            self.view.pileLabel.setText("Pile: Empty")
+        self.updateUI()
+        self.checkGameState(state)
+        if self.gameOver:
+            self.scheduler.after(GAME_OVER_DELAY, lambda: self.gameOverSignal.emit(mover.name))
+        elif self.isSessionPlayer():
+            self.view.placeButton.setText("Select a Card")
+            self.view.pickUpPileButton.setEnabled(bool(self.pile))
         else:
-            if '7' in [card[0] for card in playedCards]:
-                self.sevenSwitch = True
-            else:
-                self.sevenSwitch = False
-            self.view.placeButton.setEnabled(False)
-            topCard = self.pile[-1]
-            pixmap = QPixmap(fr"_internal/palaceData/cards/{topCard[0].lower()}_of_{topCard[1].lower()}.png").scaled(CARD_WIDTH, CARD_HEIGHT, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.view.pileLabel.setPixmap(pixmap)
-            self.updateUI()
-            self.checkGameState()
-            if self.gameOver:
-                self.sendGameState()
-                self.gameOverSignal.emit(currentPlayer.name)
-                return
-            self.changeTurn()
-            self.sendGameState()
             self.view.placeButton.setText("Opponent's Turn...")
+            self.view.pickUpPileButton.setEnabled(False)
 
-    def changeTurn(self):
-        self.currentPlayerIndex = (self.currentPlayerIndex + 1) % len(self.players)
-        self.selectedCards = []
-        self.updateUI()
-        self.view.disablePlayerHand()
-        self.view.pickUpPileButton.setEnabled(False)
+    def receiveSnapshot(self, data):
+        try:
+            self.seatView = self.sync.applySnapshot([player.name for player in self.players], data)
+        except sync.SyncError as e:
+            log.warning("Rejected snapshot: %s", e)
+            return
+        if self.seatView.topCardSelectionPhase:
+            self.resumeTopCardSelection(self.seatView)
+        elif self.topCardSelectionPhase:
+            self.loadEngineState(self.seatView)
+            self.proceedWithGameSetupOnMainThread()
+        else:
+            self.loadEngineState(self.seatView)
+            self.updateUI()
 
-    def checkFourOfAKind(self):
-        if len(self.pile) < 4:
-            return False
-        return len(set(card[0] for card in self.pile[-4:])) == 1
+    def resumeTopCardSelection(self, state):
+        # A rejected choice comes back as a snapshot, the seat chooses again
+        # unless the host already has its top cards
+        self.showDeal(state)
+        player = self.players[self.playerIndex]
+        self.view.confirmButton.setEnabled(False)
+        if player.topCards:
+            self.view.updatePlayerTopCardButtons(player.topCards)
+            self.view.updatePlayerBottomCardButtons(player.bottomCards)
+            self.view.disablePlayerHand()
+        else:
+            self.view.enablePlayerHand()
 
     def isSessionPlayer(self):
         return self.currentPlayerIndex == self.playerIndex
     
-    def checkGameState(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        if not currentPlayer.hand and not self.deck:
-            if currentPlayer.topCards:
-                currentPlayer.hand = currentPlayer.topCards
-                currentPlayer.topCards = []
-                if self.isSessionPlayer():
-                    self.view.updatePlayerHandButtons(currentPlayer.hand)
-                    self.view.updatePlayerTopCardButtons(currentPlayer.topCards)
-                else:
-                    self.view.updateOpponentHandButtons(currentPlayer.hand)
-                    self.view.updateOpponentTopCardButtons(currentPlayer.topCards)
-            elif currentPlayer.bottomCards:
-                currentPlayer.hand = currentPlayer.bottomCards
-                currentPlayer.bottomCards = []
-                if self.isSessionPlayer():
-                    self.view.updatePlayerHandButtons(currentPlayer.hand)
-                    self.view.updatePlayerBottomCardButtons(currentPlayer.bottomCards)
-                else:
-                    self.view.updateOpponentHandButtons(currentPlayer.hand)
-                    self.view.updateOpponentBottomCardButtons(currentPlayer.bottomCards)
-            elif not currentPlayer.bottomCards:
-                placeholder = QLabel()
-                placeholder.setFixedSize(BUTTON_HEIGHT, BUTTON_WIDTH)
-                currentPlayer.hand.append(placeholder)
-                self.view.pickUpPileButton.setDisabled(True)
-                self.view.placeButton.setDisabled(True)
-                for button in self.playCardButtons:
-                    button.setDisabled(True)
-                print(f"{currentPlayer.name} wins!")
-                self.gameOver = True
+    def checkGameState(self, state):
+        if state.winner is None:
+            return
+        winner = self.players[state.winner]
+        placeholder = ("", "", False, False)
+        winner.hand.append(placeholder)
+        self.view.pickUpPileButton.setDisabled(True)
+        self.view.placeButton.setDisabled(True)
+        for button in self.playCardButtons:
+            button.setDisabled(True)
+        log.info("%s wins!", winner.name)
+        self.gameOver = True
 
     def updatePlayableCards(self):
-        currentPlayer = self.players[self.currentPlayerIndex]
-        handIndex = 0
-
-        for i in range(self.view.playerHandLayout.count()):
-            item = self.view.playerHandLayout.itemAt(i)
-            if item is None:
-                continue
-            lbl = item.widget()
-            if lbl is None or (isinstance(lbl, QLabel) and lbl.pixmap() is None):
-                continue
-
-            if handIndex >= len(currentPlayer.hand):
-                break
-
-            handCard = currentPlayer.hand[handIndex]
-            if handCard[0] in ['2', '10'] or handCard[3] or self.isCardPlayable(handCard):
-                lbl.setEnabled(True)
-            else:
-                lbl.setEnabled(False)
-            
-            handIndex += 1
-        
-    def sendGameState(self):
-        if self.connection:
-            if self.gameOver:
-                data = {
-                    'action': 'gameOver',
-                    'winner': self.players[self.currentPlayerIndex].name
-                }
-                self.connection.broadcastToAll(data)
-            else:
-                data = self.serializeGameState()
-                self.connection.broadcastToAll(data)
-
-    def receiveGameState(self, data):
-        self.deserializeGameState(data)
-        if self.pile and self.pile[-1][0] == "2":
-            pass
-        elif self.pile and self.pile[-1][0] == "10":
-            self.pile.clear()
-            self.view.pileLabel.setText("Bombed!!!")
-        else:
-            self.view.placeButton.setText("Select a Card")
-            self.view.pickUpPileButton.setEnabled(True)
-
-    def serializeGameState(self):
-        return {
-            'action': 'playCard',
-            'players': [
-                {
-                    'hand': self.players[0].hand,
-                    'topCards': self.players[0].topCards,
-                    'bottomCards': self.players[0].bottomCards
-                },
-                {
-                    'hand': self.players[1].hand,
-                    'topCards': self.players[1].topCards,
-                    'bottomCards': self.players[1].bottomCards
-                }
-            ],
-            'deck': self.deck,
-            'pile': self.pile,
-            'seven': self.sevenSwitch,
-            'currentPlayerIndex': self.currentPlayerIndex,
-        }
-
-    def deserializeGameState(self, data):
-        self.deck = data['deck']
-        self.pile = data['pile']
-        self.currentPlayerIndex = data['currentPlayerIndex']
-        self.sevenSwitch = data['seven']
-        self.players[0].hand = data['players'][0]['hand']
-        self.players[0].topCards = data['players'][0]['topCards']
-        self.players[0].bottomCards = data['players'][0]['bottomCards']
-        self.players[1].hand = data['players'][1]['hand']
-        self.players[1].topCards = data['players'][1]['topCards']
-        self.players[1].bottomCards = data['players'][1]['bottomCards']
-        self.communicator.updateUISignal.emit()
+        playableFlags = self.playableCardFlags()
+        for lbl, playable in zip(self.view.playerHandRow.labels(), playableFlags):
+            lbl.setEnabled(playable)
     
     def closeConnections(self):
         if self.connection:
             self.connection.close()
        
 def main():
-    global scalingFactorWidth
-    global scalingFactorHeight
-    app = QApplication(sys.argv)
-    app.setStyleSheet(Dark)
-    screen = app.primaryScreen()
-    screenSize = screen.size()
-    screenWidth = screenSize.width()
-    screenHeight = screenSize.height()
-    scalingFactorWidth = screenWidth / 1920
-    scalingFactorHeight = screenHeight / 1080
+    global gameLog
+    parser = argparse.ArgumentParser(prog='palace')
+    parser.add_argument('--profile-startup', action='store_true', help="report the time from launch to the first interactive frame")
+    args, qtArgs = parser.parse_known_args()  # The rest is Qt's
+    profile = startup.StartupProfile(STARTED) if args.profile_startup else None
+    startup.mark(profile, 'imports')
+    logs.configure()  # PALACE_LOG=debug also dumps every network message
+    gameLog = gamelog.openLog()  # PALACE_MOVE_LOG='' turns it off
+    app = QApplication(sys.argv[:1] + qtArgs)
+    startup.mark(profile, 'application')
     communicator = SignalCommunicator()
-    homeScreen = HomeScreen(communicator)
-    homeScreen.show()
+    _ = startup.launch(app, lambda: HomeScreen(communicator), CARD_VARIANTS, profile)  # Held until exit, an unreferenced window is destroyed
     sys.exit(app.exec())
 
 if __name__ == '__main__':
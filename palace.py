@@ -0,0 +1,40 @@
+import sys
+import argparse
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='palace', description="Headless Palace tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import simulate
+    simulateParser = commands.add_parser('simulate', help="play self-play games with no GUI")
+    simulate.addArguments(simulateParser)
+    simulateParser.set_defaults(run=simulate.run)
+
+    import wirebench
+    wireParser = commands.add_parser('wire-bench', help="compare the JSON and binary wire codecs")
+    wirebench.addArguments(wireParser)
+    wireParser.set_defaults(run=wirebench.run)
+
+    import latencybench
+    latencyParser = commands.add_parser('latency-bench', help="time game turns through a local server with and without TCP_NODELAY")
+    latencybench.addArguments(latencyParser)
+    latencyParser.set_defaults(run=latencybench.run)
+
+    import gamelog
+    replayParser = commands.add_parser('replay', help="re-run logged games through the rules engine")
+    gamelog.addArguments(replayParser)
+    replayParser.set_defaults(run=gamelog.run)
+
+    import tableserver
+    serverParser = commands.add_parser('server', help="run a headless multi-table game server")
+    tableserver.addArguments(serverParser)
+    serverParser.set_defaults(run=tableserver.run)
+
+    args = parser.parse_args(argv)
+    try:
+        args.run(args)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,26 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+class Scheduler(QObject):
+    # Runs delayed steps on the GUI thread without blocking it, so input and
+    # network messages keep flowing while a card is shown or a dialog waits.
+    # after() may be called from any thread; cancel() drops every step that
+    # has not run yet, e.g. when the game is reset under it.
+    requested = pyqtSignal(int, int, object)
+
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+        self.requested.connect(self.start)
+
+    def after(self, delay, callback):
+        self.requested.emit(self.generation, delay, callback)
+
+    def cancel(self):
+        self.generation += 1
+
+    def start(self, generation, delay, callback):
+        QTimer.singleShot(delay, lambda: self.run(generation, callback))
+
+    def run(self, generation, callback):
+        if generation == self.generation:
+            callback()
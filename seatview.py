@@ -0,0 +1,124 @@
+import zlib
+import engine
+from cards import FACE_UP, HIDDEN_CARD, popcount, maskToTuples, toTuples, tuplesToMask
+
+# What one seat may see of a game. The cards it can see are masks, like the
+# engine's; the rest, the deck, everyone's face down cards and the other
+# hands, are only counted. Whoever owns the game projects its state onto each
+# seat and sends that, so no seat is ever sent a card it could not see.
+MASK_BYTES = 7
+
+def viewRow(player, own):
+    # [visible hand, top cards, hidden hand count, face down count]. A seat's
+    # own face down cards stay hidden once they are in its hand.
+    if own:
+        return [player.hand & ~player.blind, player.topCards, popcount(player.blind), popcount(player.bottomCards)]
+    return [0, player.topCards, popcount(player.hand), popcount(player.bottomCards)]
+
+def checksum(rows, deck, pile, sevenSwitch, currentPlayerIndex):
+    data = bytearray()
+    for hand, topCards, hidden, bottom in rows:
+        data += hand.to_bytes(MASK_BYTES, 'big') + topCards.to_bytes(MASK_BYTES, 'big')
+        data += bytes([hidden, bottom])
+    data += bytes([deck, len(pile)]) + bytes(pile)
+    data += bytes([sevenSwitch, currentPlayerIndex])
+    return zlib.crc32(data)
+
+def stateChecksum(state, seat, rows=None):
+    # The checksum of `seat`'s view of the full state. `rows` are every
+    # player's row as another seat sees it, when the caller already has them.
+    if rows is None:
+        rows = [viewRow(player, False) for player in state.players]
+    rows = list(rows)
+    rows[seat] = viewRow(state.players[seat], True)
+    return checksum(rows, len(state.deck), state.pile, state.sevenSwitch, state.currentPlayerIndex)
+
+class PlayerView:
+    def __init__(self, name, hand=0, topCards=0, hidden=0, bottom=0):
+        self.name = name
+        self.hand = hand  # The hand cards the seat can see
+        self.topCards = topCards
+        self.hidden = hidden  # Hand cards it cannot see
+        self.bottom = bottom
+
+    def row(self):
+        return [self.hand, self.topCards, self.hidden, self.bottom]
+
+    def copy(self):
+        return PlayerView(self.name, self.hand, self.topCards, self.hidden, self.bottom)
+
+    def cardCount(self):
+        return popcount(self.hand) + self.hidden + popcount(self.topCards) + self.bottom
+
+    def handTuples(self):
+        return maskToTuples(self.hand) + [HIDDEN_CARD] * self.hidden
+
+    def topTuples(self):
+        return maskToTuples(self.topCards, FACE_UP)
+
+    def bottomTuples(self):
+        return [HIDDEN_CARD] * self.bottom
+
+class SeatView:
+    # Reads like an engine.GameState, so the GUI draws either one
+    def __init__(self, seat, players, deck=0, pile=None, sevenSwitch=False, currentPlayerIndex=0, topCardSelectionPhase=True):
+        self.seat = seat
+        self.players = players
+        self.deck = deck  # Cards left to draw
+        self.pile = pile or []
+        self.sevenSwitch = sevenSwitch
+        self.currentPlayerIndex = currentPlayerIndex
+        self.topCardSelectionPhase = topCardSelectionPhase
+        self.winner = None
+        self.lastEvent = None
+        self.lastMove = None
+        self.burnt = []
+
+    def copy(self):
+        view = SeatView(self.seat, [player.copy() for player in self.players], self.deck, list(self.pile), self.sevenSwitch,
+                        self.currentPlayerIndex, self.topCardSelectionPhase)
+        view.winner = self.winner
+        return view
+
+    def currentPlayer(self):
+        return self.players[self.currentPlayerIndex]
+
+    def checksum(self):
+        return checksum([player.row() for player in self.players], self.deck, self.pile, self.sevenSwitch, self.currentPlayerIndex)
+
+    def deckTuples(self):
+        return [HIDDEN_CARD] * self.deck
+
+    def pileTuples(self):
+        return toTuples(self.pile)
+
+    def burntTuples(self):
+        return toTuples(self.burnt)
+
+def chooseTopCards(view, seat, mask):
+    # engine.chooseTopCards as the viewing seat sees it: the cards leave its
+    # own hand, or come out of the count of someone else's
+    if popcount(mask) != engine.TOP_CARD_COUNT:
+        raise ValueError(f"Exactly {engine.TOP_CARD_COUNT} top cards must be chosen")
+    newView = view.copy()
+    player = newView.players[seat]
+    if player.topCards:
+        raise ValueError(f"{player.name} has already chosen top cards")
+    if seat == view.seat:
+        if mask & ~player.hand:
+            raise ValueError("Top cards must come from the hand")
+        player.hand &= ~mask
+    elif player.hidden < engine.TOP_CARD_COUNT:
+        raise ValueError(f"{player.name} has too few cards to choose from")
+    else:
+        player.hidden -= engine.TOP_CARD_COUNT
+    player.topCards = mask
+    engine.passTopCardChoice(newView, seat)
+    return newView
+
+def selectedMove(cards):
+    # The play for cards picked from a view. The seat cannot tell its face
+    # down cards apart, so picking one sends no card; the owner turns one over.
+    if HIDDEN_CARD in cards:
+        return engine.PLAY, 0
+    return engine.PLAY, tuplesToMask(cards)
@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+import random
+import multiprocessing
+import engine
+import ai
+
+MAX_TURNS = 2000
+CHUNK_SIZE = 200
+
+class SimulationStats:
+    def __init__(self, numPlayers):
+        self.numPlayers = numPlayers
+        self.games = 0
+        self.wins = [0] * numPlayers
+        self.stalled = 0
+        self.turns = 0
+        self.longest = 0
+        self.bombs = 0
+        self.pickups = 0
+
+    def addGame(self, winner, turns, bombs, pickups):
+        self.games += 1
+        if winner is None:
+            self.stalled += 1
+        else:
+            self.wins[winner] += 1
+        self.turns += turns
+        self.longest = max(self.longest, turns)
+        self.bombs += bombs
+        self.pickups += pickups
+
+    def merge(self, other):
+        self.games += other.games
+        self.wins = [a + b for a, b in zip(self.wins, other.wins)]
+        self.stalled += other.stalled
+        self.turns += other.turns
+        self.longest = max(self.longest, other.longest)
+        self.bombs += other.bombs
+        self.pickups += other.pickups
+
+    def summary(self):
+        games = self.games or 1
+        winRates = ' '.join(f"seat{seat + 1}={wins / games:.1%}" for seat, wins in enumerate(self.wins))
+        return (f"{self.numPlayers}p: {self.games} games | win {winRates} | "
+                f"turns avg={self.turns / games:.1f} max={self.longest} | "
+                f"bombs/game={self.bombs / games:.2f} pickups/game={self.pickups / games:.2f} | "
+                f"stalled={self.stalled}")
+
+def playGame(numPlayers, policies, rng, maxTurns=MAX_TURNS):
+    state = engine.newGame(numPlayers, rng)
+    turns = bombs = pickups = 0
+    while not engine.isTerminal(state) and turns < maxTurns:
+        move = policies[state.currentPlayerIndex](state, rng)
+        state = engine.apply(state, move)
+        if move[0] == engine.CHOOSE_TOP:
+            continue
+        turns += 1
+        if state.burnt:
+            bombs += 1
+        elif state.lastEvent == engine.PICKED_UP:
+            pickups += 1
+    return state.winner, turns, bombs, pickups
+
+def runChunk(task):
+    seed, games, numPlayers, policyNames, maxTurns = task
+    rng = random.Random(seed)
+    policies = [ai.getPolicy(name) for name in policyNames]
+    stats = SimulationStats(numPlayers)
+    for _ in range(games):
+        stats.addGame(*playGame(numPlayers, policies, rng, maxTurns))
+    return stats
+
+def parsePlayers(text):
+    if '..' in text:
+        low, high = text.split('..')
+        counts = list(range(int(low), int(high) + 1))
+    else:
+        counts = [int(part) for part in text.split(',')]
+    if not counts or any(count < 2 or count > 4 for count in counts):
+        raise ValueError(f"Player counts must be between 2 and 4, got '{text}'")
+    return counts
+
+def seatPolicies(policyText, numPlayers):
+    names = policyText.split(',')
+    return [names[seat % len(names)] for seat in range(numPlayers)]
+
+def makeTasks(games, playerCounts, policyText, seed, maxTurns, chunkSize):
+    tasks = []
+    for i, start in enumerate(range(0, games, chunkSize)):
+        numPlayers = playerCounts[i % len(playerCounts)]
+        count = min(chunkSize, games - start)
+        # Every chunk gets its own seed so results do not depend on worker scheduling
+        tasks.append((seed * 1000003 + i, count, numPlayers, seatPolicies(policyText, numPlayers), maxTurns))
+    return tasks
+
+def simulate(games, playerCounts, workers=None, policyText='greedy', seed=0, maxTurns=MAX_TURNS,
+             chunkSize=CHUNK_SIZE, reportEvery=2.0, out=sys.stdout):
+    workers = workers or os.cpu_count() or 1
+    for name in policyText.split(','):
+        ai.getPolicy(name)
+    tasks = makeTasks(games, playerCounts, policyText, seed, maxTurns, chunkSize)
+    results = {count: SimulationStats(count) for count in playerCounts}
+    start = lastReport = time.perf_counter()
+    done = 0
+
+    def report(final=False):
+        elapsed = time.perf_counter() - start
+        label = "Done" if final else "Progress"
+        print(f"{label}: {done}/{games} games in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.0f} games/s, {workers} workers)", file=out)
+        for count in playerCounts:
+            if results[count].games:
+                print(f"  {results[count].summary()}", file=out)
+        out.flush()
+
+    if workers == 1:
+        stream = map(runChunk, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        stream = pool.imap_unordered(runChunk, tasks)
+    try:
+        for stats in stream:
+            results[stats.numPlayers].merge(stats)
+            done += stats.games
+            now = time.perf_counter()
+            if now - lastReport >= reportEvery:
+                lastReport = now
+                report()
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    report(final=True)
+    return results
+
+def addArguments(parser):
+    parser.add_argument('--games', type=int, default=10000, help="number of games to play")
+    parser.add_argument('--players', default='2', help="player count, list (2,4) or range (2..4)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, defaults to every core")
+    parser.add_argument('--policy', default='greedy',
+                        help=f"comma separated policy per seat, repeated to fill the table ({', '.join(ai.POLICIES)})")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=MAX_TURNS, help="games longer than this count as stalled")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="games per task handed to a worker")
+    parser.add_argument('--report-every', type=float, default=2.0, help="seconds between progress reports")
+
+def run(args):
+    simulate(args.games, parsePlayers(args.players), args.workers, args.policy, args.seed,
+             args.max_turns, args.chunk_size, args.report_every)
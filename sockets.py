@@ -0,0 +1,45 @@
+import os
+import socket
+
+# Game frames are a few dozen bytes, so Nagle's algorithm never saves a
+# packet, it only holds a frame back until the previous one is acknowledged.
+# PALACE_NODELAY=0 turns it back on, e.g. to compare with latency-bench.
+NODELAY = os.environ.get('PALACE_NODELAY', '1') != '0'
+BUFFER_SIZE = 64 * 1024  # A snapshot is a few hundred bytes, a whole game fits many times over
+# Kernel keepalive probes catch a peer that vanished while the connection was idle
+KEEPALIVE_IDLE = 10
+KEEPALIVE_INTERVAL = 5
+KEEPALIVE_COUNT = 3
+
+def tune(sock, nodelay=None):
+    # Works on plain sockets and on the socket objects asyncio transports expose
+    if nodelay is None:
+        nodelay = NODELAY
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(nodelay))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_SIZE)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, KEEPALIVE_IDLE)
+    elif hasattr(socket, 'TCP_KEEPALIVE'):  # macOS
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPALIVE, KEEPALIVE_IDLE)
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, KEEPALIVE_INTERVAL)
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, KEEPALIVE_COUNT)
+    elif hasattr(socket, 'SIO_KEEPALIVE_VALS') and hasattr(sock, 'ioctl'):  # Older Windows
+        sock.ioctl(socket.SIO_KEEPALIVE_VALS, (1, KEEPALIVE_IDLE * 1000, KEEPALIVE_INTERVAL * 1000))
+    return sock
+
+def connect(host, port, nodelay=None):
+    return tune(socket.create_connection((host, port)), nodelay)
+
+def listen(host, port, backlog=1):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+def accept(server, nodelay=None):
+    sock, address = server.accept()
+    return tune(sock, nodelay), address
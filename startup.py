@@ -0,0 +1,62 @@
+import sys
+import time
+from PyQt6.QtCore import QObject, QEvent, QTimer
+import theme
+import cardimages
+
+class StartupProfile:
+    # How long each stage of startup took, from `started` to the first frame
+    # that takes input
+    def __init__(self, started):
+        self.marks = [('start', started)]
+
+    def mark(self, stage):
+        self.marks.append((stage, time.perf_counter()))
+
+    def report(self, out=sys.stdout):
+        stages = ', '.join(f"{stage} {(end - begin) * 1000:.0f} ms"
+                           for (_, begin), (stage, end) in zip(self.marks, self.marks[1:]))
+        total = self.marks[-1][1] - self.marks[0][1]
+        print(f"Startup: {total * 1000:.0f} ms to the first interactive frame ({stages})", file=out)
+
+class FirstFrame(QObject):
+    # Calls back once the window has painted and the event loop is free
+    # again, i.e. at the first frame that answers input
+    def __init__(self, window, callback):
+        super().__init__(window)
+        self.callback = callback
+        window.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint:
+            watched.removeEventFilter(self)
+            QTimer.singleShot(0, self.callback)
+        return False
+
+def launch(app, createWindow, cardVariants, profile=None):
+    # Shows the window from createWindow() before anything it does not need.
+    # The cached stylesheet is applied first; without one the window shows
+    # unstyled and is styled once the sheet is built after its first frame.
+    # Card art is decoded in the background from then on.
+    sheet = theme.cachedStylesheet()
+    if sheet is not None:
+        app.setStyleSheet(sheet)
+    mark(profile, 'cached stylesheet' if sheet is not None else 'no cached stylesheet')
+    window = createWindow()
+    window.show()
+    mark(profile, 'window')
+
+    def firstFrame():
+        mark(profile, 'first paint')
+        if profile:
+            profile.report()
+        if sheet is None:
+            app.setStyleSheet(theme.buildStylesheet())
+        cardimages.preload(cardVariants)
+
+    FirstFrame(window, firstFrame)
+    return window
+
+def mark(profile, stage):
+    if profile:
+        profile.mark(stage)
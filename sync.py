@@ -0,0 +1,168 @@
+from collections import deque
+import engine
+import seatview
+from cards import DECK_SIZE, RANK_INDEX, SUIT_INDEX, cardsIn, toMask, tuplesToMask
+
+# Moves travel as deltas, a full snapshot is only sent to start over when a
+# seat's copy disagrees with the owner's. Every message is the recipient's
+# own view (see seatview): a move carries the mover's row as that seat sees
+# it plus the table values the move changed, so a seat applies it without
+# needing a card it cannot see.
+PROTOCOL_VERSION = 2
+CHECKSUM_EVERY = 8
+MOVE_LOG_SIZE = 256  # Moves kept for seats that reconnect, older gaps get a snapshot
+
+class SyncError(ValueError):
+    pass
+
+# Card lists from the network are checked before they are turned into masks,
+# a bad index would otherwise be shifted into a huge int
+def parseCards(cards):
+    if not isinstance(cards, list) or not all(type(card) is int and 0 <= card < DECK_SIZE for card in cards):
+        raise SyncError("Cards must be indices into the deck")
+    return toMask(cards)
+
+def parseTopCards(cards):
+    if not isinstance(cards, list) or not all(
+            isinstance(card, (list, tuple)) and len(card) >= 2
+            and isinstance(card[0], str) and card[0] in RANK_INDEX
+            and isinstance(card[1], str) and card[1] in SUIT_INDEX for card in cards):
+        raise SyncError("Top cards must be rank and suit pairs")
+    return tuplesToMask(cards)
+
+def parseMove(data):
+    return data['kind'], parseCards(data['cards'])
+
+def resolveMove(state, move, rng):
+    # A play with no cards is a face down card of the mover's choosing; it
+    # cannot tell them apart, so the owner of the game turns one over at random
+    kind, mask = move
+    blind = state.currentPlayer().blind
+    if kind == engine.PLAY and not mask and blind:
+        return kind, 1 << rng.choice(cardsIn(blind))
+    return move
+
+class StateSync:
+    def __init__(self, checksumEvery=CHECKSUM_EVERY):
+        self.checksumEvery = checksumEvery
+        self.seq = 0
+
+    def reset(self):
+        self.seq = 0
+
+    def moveMessages(self, before, move, after, seats):
+        # The move as each of `seats` sees it. Only the mover's row differs
+        # from one seat to the next, everything else is built once.
+        self.seq += 1
+        mover = before.currentPlayerIndex
+        shared = {
+            'action': 'move',
+            'version': PROTOCOL_VERSION,
+            'seq': self.seq,
+            'kind': move[0],
+            'cards': cardsIn(move[1]),
+            'event': after.lastEvent,
+            'deck': len(after.deck),
+            'cleared': not after.pile,
+            'seven': after.sevenSwitch,
+            'turn': after.currentPlayerIndex,
+        }
+        own = seatview.viewRow(after.players[mover], True)
+        seen = seatview.viewRow(after.players[mover], False)
+        rows = None
+        if self.seq % self.checksumEvery == 0:
+            rows = [seatview.viewRow(player, False) for player in after.players]
+        messages = []
+        for seat in seats:
+            data = dict(shared)
+            data['row'] = own if seat == mover else seen
+            if rows is not None:
+                data['checksum'] = seatview.stateChecksum(after, seat, rows)
+            messages.append(data)
+        return messages
+
+    def moveMessage(self, before, move, after, seat):
+        return self.moveMessages(before, move, after, [seat])[0]
+
+    def applyMove(self, view, data):
+        if data.get('version') != PROTOCOL_VERSION:
+            raise SyncError(f"Unsupported sync version {data.get('version')}")
+        if data['seq'] != self.seq + 1:
+            raise SyncError(f"Expected move {self.seq + 1}, got {data['seq']}")
+        kind, mask = parseMove(data)
+        mover = view.currentPlayerIndex
+        newView = view.copy()
+        if kind == engine.PLAY:
+            newView.pile.extend(data['cards'])
+        if data['cleared']:
+            if data['event'] != engine.PICKED_UP:
+                newView.burnt = newView.pile
+            newView.pile = []
+        newView.players[mover] = seatview.PlayerView(view.players[mover].name, *data['row'])
+        newView.deck = data['deck']
+        newView.sevenSwitch = data['seven']
+        newView.currentPlayerIndex = data['turn']
+        newView.lastEvent = data['event']
+        newView.lastMove = (kind, mask)
+        if data['event'] == engine.WON:
+            newView.winner = mover
+        if 'checksum' in data and newView.checksum() != data['checksum']:
+            raise SyncError(f"Checksum mismatch at move {data['seq']}")
+        self.seq += 1
+        return newView
+
+    def resyncRequest(self):
+        return {'action': 'resyncRequest', 'version': PROTOCOL_VERSION, 'seq': self.seq}
+
+    def resumeRequest(self, token):
+        # Sent on a new connection after a drop, the server replies with the
+        # moves after seq, or a snapshot when it no longer has all of them
+        return {'action': 'resume', 'version': PROTOCOL_VERSION, 'token': token, 'seq': self.seq}
+
+    def snapshotMessage(self, state, seat):
+        rows = [seatview.viewRow(player, i == seat) for i, player in enumerate(state.players)]
+        return {
+            'action': 'snapshot',
+            'version': PROTOCOL_VERSION,
+            'seq': self.seq,
+            'seat': seat,
+            'players': rows,
+            'deck': len(state.deck),
+            'pile': state.pile,
+            'seven': state.sevenSwitch,
+            'currentPlayerIndex': state.currentPlayerIndex,
+            'topCardSelectionPhase': state.topCardSelectionPhase,
+            'checksum': seatview.checksum(rows, len(state.deck), state.pile, state.sevenSwitch, state.currentPlayerIndex),
+        }
+
+    def applySnapshot(self, names, data):
+        if data.get('version') != PROTOCOL_VERSION:
+            raise SyncError(f"Unsupported sync version {data.get('version')}")
+        players = [seatview.PlayerView(name, *row) for name, row in zip(names, data['players'])]
+        view = seatview.SeatView(data['seat'], players, data['deck'], list(data['pile']), data['seven'], data['currentPlayerIndex'],
+                                 data['topCardSelectionPhase'])
+        if view.checksum() != data['checksum']:
+            raise SyncError("Snapshot checksum mismatch")
+        self.seq = data['seq']
+        return view
+
+class MoveLog:
+    # The most recent moves of a game in seq order, each kept as the list of
+    # its messages, one per seat
+    def __init__(self, size=MOVE_LOG_SIZE):
+        self.moves = deque(maxlen=size)
+
+    def reset(self):
+        self.moves.clear()
+
+    def append(self, messages):
+        self.moves.append(messages)
+
+    def since(self, seq, currentSeq):
+        # The moves after seq, or None when some of them are no longer kept
+        if seq == currentSeq:
+            return []
+        if not self.moves or seq > currentSeq or seq + 1 < self.moves[0][0]['seq']:
+            return None
+        first = seq + 1 - self.moves[0][0]['seq']
+        return [self.moves[index] for index in range(first, len(self.moves))]
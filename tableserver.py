@@ -0,0 +1,417 @@
+import sys
+import time
+import random
+import secrets
+import argparse
+import tracemalloc
+import engine
+import sync
+import wire
+import asyncnet
+import logs
+import dispatch
+import heartbeat
+import gamelog
+
+HOST = '0.0.0.0'
+PORT = 5556
+MAX_PLAYERS = 4
+RESUME_TIMEOUT = 30  # Seconds a dropped seat is held for its player to reconnect
+
+log = logs.getLogger('server')
+
+class Table:
+    # One game. The server's copy of the state is the only one that counts:
+    # seats send what they want to play, it is applied here and every seat is
+    # sent the move as it may see it.
+    def __init__(self, name, size, rng, gameLog=None):
+        self.name = name
+        self.size = size
+        self.rng = rng
+        self.gameLog = gameLog
+        self.game = None  # This deal's id in the game log
+        self.seats = [None] * size
+        self.nicknames = [None] * size
+        self.tokens = [None] * size
+        self.away = {}  # Dropped seat -> timer that gives the seat up
+        self.playAgain = set()
+        self.sync = sync.StateSync()
+        self.moves = sync.MoveLog()
+        self.state = None
+
+    def names(self):
+        return [f"Player {seat + 1}" for seat in range(self.size)]
+
+    def openSeat(self):
+        return next((seat for seat, connection in enumerate(self.seats) if connection is None), None)
+
+    def isFull(self):
+        return self.openSeat() is None
+
+    def isEmpty(self):
+        return all(connection is None for connection in self.seats)
+
+    def deal(self):
+        # Each deal gets its own seed, which is all the game log needs to
+        # deal it again
+        seed = self.rng.getrandbits(64)
+        self.state = gamelog.deal(self.size, seed, self.names())
+        if self.gameLog:
+            self.game = self.gameLog.newGame(seed, self.size)
+        self.sync.reset()
+        self.moves.reset()
+        self.playAgain.clear()
+
+    def dealMessage(self, seat):
+        data = self.sync.snapshotMessage(self.state, seat)
+        data['action'] = 'deal'
+        data['table'] = self.name
+        data['seat'] = seat
+        data['nicknames'] = self.nicknames
+        data['token'] = self.tokens[seat]
+        return data
+
+    def chooseTopCards(self, seat, topCards):
+        mask = sync.parseTopCards(topCards)
+        if not engine.isLegal(self.state, (engine.CHOOSE_TOP, mask), seat):
+            raise sync.SyncError(f"Seat {seat} chose illegal top cards")
+        self.state = engine.chooseTopCards(self.state, seat, mask)
+        if self.gameLog:
+            self.gameLog.record(self.game, seat, (engine.CHOOSE_TOP, mask), self.state)
+
+    def snapshotMessage(self, seat):
+        return self.sync.snapshotMessage(self.state, seat)
+
+    def applyIntent(self, seat, data):
+        # Returns the move's message for every seat. Checked on masks first,
+        # an illegal move costs no state copy.
+        before = self.state
+        move = sync.resolveMove(before, sync.parseMove(data), self.rng)
+        if not engine.isLegal(before, move, seat):
+            raise sync.SyncError(f"Illegal move from seat {seat}")
+        self.state = engine.apply(before, move)
+        messages = self.sync.moveMessages(before, move, self.state, range(self.size))
+        self.moves.append(messages)
+        if self.gameLog:
+            self.gameLog.record(self.game, seat, move, self.state)
+        return messages
+
+class TableServer:
+    def __init__(self, host=HOST, port=PORT, seed=None, resumeTimeout=RESUME_TIMEOUT, peerTimeout=heartbeat.PEER_TIMEOUT, nodelay=None,
+                 gameLog=None):
+        self.rng = random.Random(seed)
+        self.gameLog = gameLog
+        self.resumeTimeout = resumeTimeout
+        self.peerTimeout = peerTimeout
+        self.tables = {}
+        self.nextTableId = 1
+        self.sessions = {}  # Token -> (table, seat)
+        self.server = asyncnet.AsyncServer(host, port, self, nodelay=nodelay)
+        # Seats that have not started a game can only join; started tables
+        # take every game message
+        self.seating = dispatch.Dispatcher('seating')
+        self.seating.registerAll({'join': self.join, 'resume': self.resume, 'ping': self.ping})
+        self.playing = dispatch.Dispatcher('tables')
+        self.playing.registerAll({
+            'join': self.join,
+            'confirmTopCards': self.confirmTopCards,
+            'intent': self.intent,
+            'resyncRequest': self.resync,
+            'playAgainRequest': self.playAgain,
+            'ping': self.ping,
+        })
+
+    def start(self):
+        self.server.start()
+        self.server.callSoon(self.sweep)
+
+    def send(self, connection, *messages):
+        # Several messages go out as one write, so they arrive together
+        log.debug("Sending to %s: %s", connection.address, messages)
+        connection.write(b''.join(wire.frame(connection.codec.encode(data)) for data in messages))
+
+    def sendTable(self, table, *messages, exclude=None):
+        for connection in table.seats:
+            if connection is not None and connection is not exclude:
+                self.send(connection, *messages)
+
+    def connectionMade(self, connection):
+        connection.codec = None
+        connection.table = None
+        connection.seat = None
+        connection.lastHeard = None  # Set once the client pings, older clients are never swept
+
+    def messageReceived(self, connection, payload):
+        if connection.codec is None:
+            # The first frame is always the JSON hello, anything else is
+            # answered in JSON
+            try:
+                hello = wire.JSON.decode(payload)
+            except ValueError:
+                hello = None
+            connection.codec = wire.JSON
+            codec = wire.acceptHello(hello)
+            self.send(connection, wire.helloReply(codec))
+            connection.codec = codec
+            return
+        if connection.lastHeard is not None:
+            connection.lastHeard = time.monotonic()
+        action = None
+        table = connection.table
+        try:
+            data = connection.codec.decode(payload)
+            log.debug("Received from %s: %s", connection.address, data)
+            action = data.get('action')
+            if table is not None and table.state is not None:
+                self.playing.dispatch(data, connection)
+            elif not self.seating.dispatch(data, connection):
+                log.warning("Ignoring '%s' from %s before the table started", action, connection.address)
+        except (ValueError, KeyError, TypeError) as e:
+            # A malformed frame or a message that does not fit the game
+            log.warning("Rejected '%s' from %s: %s", action, connection.address, e)
+            if table is not None and table.state is not None:
+                # Put the sender back on the authoritative state
+                self.send(connection, table.snapshotMessage(connection.seat))
+
+    def ping(self, connection, data):
+        connection.lastHeard = time.monotonic()
+        self.send(connection, {'action': 'pong', 'id': data['id']})
+
+    def sweep(self):
+        # Drops clients that stopped pinging; their seats are then held for a
+        # resume like any other dropped connection
+        now = time.monotonic()
+        for connection in list(self.server.connections.values()):
+            if connection.lastHeard is not None and now - connection.lastHeard > self.peerTimeout and not connection.closed:
+                log.info("Nothing heard from %s in %.0f s, dropping it", connection.address, self.peerTimeout)
+                self.connectionLost(connection)
+                connection.shutdown()
+        self.server.loop.call_later(self.peerTimeout / 4, self.sweep)
+
+    def join(self, connection, data):
+        if connection.table is not None:
+            raise ValueError("Already seated")
+        try:
+            size = int(data.get('players', 2))
+            if not 2 <= size <= MAX_PLAYERS:
+                raise ValueError(f"Tables seat 2 to {MAX_PLAYERS} players, not {size}")
+            table = self.findTable(data.get('table'), size)
+        except (ValueError, TypeError) as e:
+            # The client has no table yet, so it is told rather than left waiting
+            log.warning("Turned away %s: %s", connection.address, e)
+            self.send(connection, {'action': 'lobbyFull'})
+            return
+        seat = table.openSeat()
+        table.seats[seat] = connection
+        table.nicknames[seat] = data.get('name') or f"Player {seat + 1}"
+        table.tokens[seat] = secrets.token_hex(16)
+        self.sessions[table.tokens[seat]] = (table, seat)
+        connection.table = table
+        connection.seat = seat
+        log.info("%s (%s) sits at %s seat %d/%d", table.nicknames[seat], connection.address, table.name, seat + 1, size)
+        if table.isFull():
+            self.startTable(table)
+
+    def findTable(self, name, size):
+        if name:
+            table = self.tables.get(name)
+            if table is None:
+                table = self.tables[name] = Table(name, size, random.Random(self.rng.getrandbits(64)), self.gameLog)
+            if table.size != size:
+                raise ValueError(f"Table {name} seats {table.size} players, not {size}")
+            if table.isFull() or table.state is not None:
+                raise ValueError(f"Table {name} is full")
+            return table
+        for table in self.tables.values():
+            if table.size == size and table.state is None and not table.isFull():
+                return table
+        name = f"table-{self.nextTableId}"
+        self.nextTableId += 1
+        table = self.tables[name] = Table(name, size, random.Random(self.rng.getrandbits(64)), self.gameLog)
+        return table
+
+    def startTable(self, table):
+        table.deal()
+        for seat, connection in enumerate(table.seats):
+            self.send(connection, table.dealMessage(seat))
+        log.info("%s started with %d players (%d tables open)", table.name, table.size, len(self.tables))
+
+    def confirmTopCards(self, connection, data):
+        table = connection.table
+        table.chooseTopCards(connection.seat, data['topCards'])
+        # Rebuilt rather than relayed, so nothing else the seat sent goes out
+        confirmed = {'action': 'confirmTopCards', 'playerIndex': connection.seat, 'topCards': data['topCards']}
+        if table.state.topCardSelectionPhase:
+            self.sendTable(table, confirmed, exclude=connection)
+        else:
+            startGame = {'action': 'startGame', 'gameState': ""}
+            self.sendTable(table, confirmed, startGame, exclude=connection)
+            self.send(connection, startGame)
+
+    def intent(self, connection, data):
+        # The mover is sent its move back like every other seat, with the
+        # cards it drew
+        table = connection.table
+        messages = table.applyIntent(connection.seat, data)
+        state = table.state
+        gameOver = []
+        if state.winner is not None:
+            gameOver.append({'action': 'gameOver', 'winner': state.players[state.winner].name})
+            log.info("%s: %s wins", table.name, table.nicknames[state.winner])
+        for seat, other in enumerate(table.seats):
+            if other is not None:
+                self.send(other, messages[seat], *gameOver)
+
+    def resync(self, connection, data):
+        table = connection.table
+        self.send(connection, table.snapshotMessage(connection.seat))
+
+    def playAgain(self, connection, data):
+        table = connection.table
+        if table.state.winner is None:
+            log.warning("Ignoring a play again request from %s mid-game", connection.address)
+            return
+        table.playAgain.add(connection.seat)
+        if len(table.playAgain) == table.size:
+            self.sendTable(table, {'action': 'resetGame'})
+            self.startTable(table)
+
+    def resume(self, connection, data):
+        if connection.table is not None:
+            raise ValueError("Already seated")
+        session = self.sessions.get(data.get('token'))
+        if session is None:
+            log.warning("Unknown or expired session from %s", connection.address)
+            self.send(connection, {'action': 'disconnect'})
+            return
+        table, seat = session
+        if table.state is None:
+            # Seats are only held once the game started, before that the
+            # token's own connection is still seated
+            log.warning("%s tried to resume %s before it started", connection.address, table.name)
+            self.send(connection, {'action': 'disconnect'})
+            return
+        old = table.seats[seat]
+        if old is not None:
+            # The old connection has not timed out yet, this one replaces it
+            old.table = None
+            old.shutdown()
+        timer = table.away.pop(seat, None)
+        if timer is not None:
+            timer.cancel()
+        table.seats[seat] = connection
+        connection.table = table
+        connection.seat = seat
+        messages = [{'action': 'resumed', 'table': table.name, 'seat': seat, 'seq': table.sync.seq}]
+        missed = table.moves.since(int(data.get('seq', -1)), table.sync.seq)
+        if missed is None or table.state.topCardSelectionPhase:
+            messages.append(table.snapshotMessage(seat))
+        else:
+            messages.extend(move[seat] for move in missed)
+        if table.state.winner is not None:
+            messages.append({'action': 'gameOver', 'winner': table.state.players[table.state.winner].name})
+        self.send(connection, *messages)
+        log.info("%s resumed %s seat %d, %s moves behind", table.nicknames[seat], table.name, seat + 1,
+                 'snapshot' if missed is None else len(missed))
+
+    def connectionLost(self, connection):
+        table = connection.table
+        if table is None:
+            return
+        seat = connection.seat
+        table.seats[seat] = None
+        if table.state is not None:
+            # Hold the seat of a started game for a while, the player can
+            # reconnect with their token and pick up the moves they missed
+            log.info("%s dropped from %s, holding seat %d", table.nicknames[seat], table.name, seat + 1)
+            table.away[seat] = self.server.loop.call_later(self.resumeTimeout, self.abandon, table, seat)
+            return
+        log.info("%s left %s", table.nicknames[seat], table.name)
+        self.sessions.pop(table.tokens[seat], None)
+        table.tokens[seat] = None
+        if table.isEmpty():
+            del self.tables[table.name]
+
+    def abandon(self, table, seat):
+        # A started game cannot continue short handed
+        log.info("%s did not come back, closing %s", table.nicknames[seat], table.name)
+        for timer in table.away.values():
+            timer.cancel()
+        table.away.clear()
+        self.sendTable(table, {'action': 'disconnect'})
+        for other in table.seats:
+            if other is not None:
+                other.table = None
+                other.shutdown()
+        for token in table.tokens:
+            self.sessions.pop(token, None)
+        table.seats = [None] * table.size
+        self.tables.pop(table.name, None)
+
+    def serveForever(self):
+        self.start()
+        log.info("Palace server listening on %s:%d", self.server.host, self.server.port)
+        try:
+            self.server.thread.join()
+        except KeyboardInterrupt:
+            log.info("Shutting down")
+            self.server.stop()
+            self.seating.report()
+            self.playing.report()
+
+def measureTables(count, size=2, moves=40, seed=0):
+    # Memory of `count` live tables part way through a game, per table
+    rng = random.Random(seed)
+    tables = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for i in range(count):
+        table = Table(f"table-{i}", size, random.Random(rng.getrandbits(64)))
+        table.deal()
+        tables.append(table)
+    for table in tables:
+        state = table.state
+        while state.topCardSelectionPhase:
+            state = engine.chooseTopCards(state, state.currentPlayerIndex, engine.legalMoves(state)[0][1])
+        for _ in range(moves):
+            if state.winner is not None:
+                break
+            state = engine.apply(state, engine.legalMoves(state)[-1])
+        table.state = state
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return used / count
+
+def addArguments(parser):
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--seed', type=int, default=None, help="seed for the table shuffles")
+    parser.add_argument('--measure-tables', type=int, default=0, metavar='N',
+                        help="report the memory of N in-progress tables and exit")
+    parser.add_argument('--peer-timeout', type=float, default=heartbeat.PEER_TIMEOUT, metavar='SECONDS',
+                        help="drop a client that has been silent this long")
+    parser.add_argument('--resume-timeout', type=float, default=RESUME_TIMEOUT, metavar='SECONDS',
+                        help="how long a dropped player's seat is held for them to reconnect")
+    parser.add_argument('--move-log', default=None, metavar='PATH',
+                        help="append every game's seed and moves to PATH, for palace replay")
+    parser.add_argument('--log-level', default=None, metavar='LEVEL',
+                        help="debug, info, warning or error; debug dumps every message (default: $PALACE_LOG or info)")
+
+def run(args):
+    if args.measure_tables:
+        for size in range(2, MAX_PLAYERS + 1):
+            perTable = measureTables(args.measure_tables, size)
+            print(f"{size} players: {perTable / 1024:.1f} KiB per table over {args.measure_tables} tables")
+        return
+    logs.configure(args.log_level)
+    gameLog = gamelog.GameLog(args.move_log) if args.move_log else None
+    TableServer(args.host, args.port, args.seed, args.resume_timeout, args.peer_timeout, gameLog=gameLog).serveForever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='palace-server', description="Headless multi-table Palace server")
+    addArguments(parser)
+    run(parser.parse_args(argv))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,73 @@
+import os
+import zlib
+
+# The dark theme of the game windows. qdarktheme takes a noticeable part of
+# startup to build it and always builds the same sheet, so it is built once
+# and kept next to the game's data; a start that finds it never imports
+# qdarktheme at all.
+CACHE_PATH = os.path.join('_internal', 'palaceData', 'dark.qss')
+COLORS = {
+    "primary": "#0078D4",
+    "background": "#202124",
+    "border": "#8A8A8A",
+    "background>popup": "#252626",
+}
+EXTRA = """
+    QMessageBox QLabel {
+        color: #E4E7EB;
+    }
+    QDialog {
+        background-color: #252626;
+    }
+    QComboBox:disabled {
+        background-color: #1A1A1C;
+        border: 1px solid #3B3B3B;
+        color: #3B3B3B;
+    }
+    QPushButton {
+    background-color: #0078D4;
+    color: #FFFFFF;
+    border: 1px solid #8A8A8A;
+    }
+    QPushButton:hover {
+        background-color: #669df2;
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                    stop:0 #80CFFF, stop:1 #004080);
+    }
+    QPushButton:pressed {
+        background: qlineargradient(x1:0, y1:0, x2:0, y2:1,
+                                    stop:0 #004080, stop:1 #001B3D);
+    }
+    QPushButton:disabled {
+        background-color: #202124;
+        border: 1px solid #3B3B3B;
+        color: #FFFFFF;
+    }
+"""
+
+def cacheHeader():
+    # Changing the colors or the extra rules makes an old cache miss
+    return f"/* palace dark theme {zlib.crc32(repr((COLORS, EXTRA)).encode()):08x} */\n"
+
+def cachedStylesheet(path=CACHE_PATH):
+    # The cached sheet, None when there is none for this theme
+    try:
+        with open(path, encoding='utf-8') as file:
+            sheet = file.read()
+    except OSError:
+        return None
+    header = cacheHeader()
+    return sheet[len(header):] if sheet.startswith(header) else None
+
+def buildStylesheet(path=CACHE_PATH):
+    import qdarktheme
+    sheet = qdarktheme.load_stylesheet(theme="dark", custom_colors={"[dark]": COLORS}) + EXTRA
+    try:
+        # Written whole or not at all, a half written cache would be read back
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write(cacheHeader() + sheet)
+        os.replace(temporary, path)
+    except OSError:
+        pass  # A read-only install builds the sheet on every start
+    return sheet
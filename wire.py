@@ -0,0 +1,354 @@
+import os
+import json
+import struct
+import engine
+from cards import RANK_INDEX, SUIT_INDEX, RANKS, SUITS, FACE_UP, FACE_DOWN, packCard, unpackCard
+
+# Frames are a 4-byte big-endian length followed by a payload in the codec
+# both sides agreed on in the hello exchange. The hello itself is always JSON.
+HEADER = struct.Struct('>I')
+HELLO = 'hello'
+
+U8 = struct.Struct('>B')
+U16 = struct.Struct('>H')
+U32 = struct.Struct('>I')
+MASK_BYTES = 7
+EMPTY_CARD = 0xFF  # The blank placeholder card a winner's hand ends with
+KINDS = [engine.CHOOSE_TOP, engine.PLAY, engine.PICKUP]
+EVENTS = [engine.PLAYED, engine.AGAIN, engine.BOMBED, engine.PICKED_UP, engine.WON]
+
+READ_BUFFER_SIZE = 64 * 1024
+# The largest real message, a JSON deal, is under 1 KiB. A longer length
+# prefix is refused before any of its payload is read or parsed.
+MAX_FRAME_SIZE = 16 * 1024
+
+class FrameTooLarge(ValueError):
+    pass
+
+def frame(payload):
+    return HEADER.pack(len(payload)) + payload
+
+def checkLength(length):
+    if length > MAX_FRAME_SIZE:
+        raise FrameTooLarge(f"Frame of {length} bytes is over the {MAX_FRAME_SIZE} byte limit")
+    return length
+
+class FrameReader:
+    # Reads length-prefixed frames into one reused buffer with recv_into. A
+    # single recv can carry several frames, they are handed out one by one
+    # before the socket is read again. Frames are memoryviews into the buffer,
+    # valid until the next readFrame call.
+    def __init__(self, sock, bufferSize=READ_BUFFER_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(bufferSize)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+
+    def readFrame(self):
+        while True:
+            payload = self.nextFrame()
+            if payload is not None:
+                return payload
+            if not self.fill():
+                return None
+
+    def nextFrame(self):
+        available = self.end - self.start
+        if available < HEADER.size:
+            return None
+        length = checkLength(HEADER.unpack_from(self.buffer, self.start)[0])
+        if available < HEADER.size + length:
+            return None
+        begin = self.start + HEADER.size
+        self.start = begin + length
+        return self.view[begin:self.start]
+
+    def fill(self):
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buffer) or self.neededSize() > len(self.buffer) - self.start:
+            self.compact()
+        received = self.sock.recv_into(self.view[self.end:])
+        if not received:
+            return False
+        self.end += received
+        return True
+
+    def neededSize(self):
+        if self.end - self.start < HEADER.size:
+            return HEADER.size
+        return HEADER.size + HEADER.unpack_from(self.buffer, self.start)[0]
+
+    def compact(self):
+        # Only the unread tail of a partial frame moves; the buffer grows
+        # when a single frame is larger than it
+        pending = self.end - self.start
+        size = max(len(self.buffer), self.neededSize())
+        if size > len(self.buffer):
+            buffer = bytearray(size)
+            buffer[:pending] = self.view[self.start:self.end]
+            self.buffer = buffer
+            self.view = memoryview(buffer)
+        else:
+            self.buffer[:pending] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = pending
+
+class JsonCodec:
+    name = 'json'
+
+    def encode(self, data):
+        return json.dumps(data).encode('utf-8')
+
+    def decode(self, payload):
+        data = json.loads(bytes(payload))
+        if not isinstance(data, dict):
+            raise ValueError("A message is a JSON object")
+        return data
+
+# Field types of the binary layout, each a (write, read) pair
+def writeU8(out, value):
+    out += U8.pack(value)
+
+def readU8(view, offset):
+    return view[offset], offset + 1
+
+def writeU32(out, value):
+    out += U32.pack(value)
+
+def readU32(view, offset):
+    return U32.unpack_from(view, offset)[0], offset + 4
+
+def writeBool(out, value):
+    out += U8.pack(bool(value))
+
+def readBool(view, offset):
+    return bool(view[offset]), offset + 1
+
+def writeStr(out, value):
+    raw = value.encode('utf-8')
+    out += U16.pack(len(raw))
+    out += raw
+
+def readBytes(view, offset, count):
+    # A slice past the end is only short, a length that overruns the frame is an error
+    raw = view[offset:offset + count]
+    if len(raw) < count:
+        raise ValueError(f"Frame ends {count - len(raw)} bytes early")
+    return raw, offset + count
+
+def readStr(view, offset):
+    length = U16.unpack_from(view, offset)[0]
+    raw, offset = readBytes(view, offset + 2, length)
+    return bytes(raw).decode('utf-8'), offset
+
+def writeCards(out, cards):
+    out += U8.pack(len(cards))
+    for card in cards:
+        if card[0] == "":
+            out.append(EMPTY_CARD)
+        else:
+            flags = (FACE_UP if card[2] else 0) | (FACE_DOWN if card[3] else 0)
+            out.append(packCard(RANK_INDEX[card[0]] << 2 | SUIT_INDEX[card[1]], flags))
+
+# Every byte a card can pack to, already turned back into its tuple
+CARD_TUPLES = [None] * 256
+for byte in range(256):
+    card, flags = unpackCard(byte)
+    if card < len(RANKS) * len(SUITS):
+        CARD_TUPLES[byte] = (RANKS[card >> 2], SUITS[card & 3], bool(flags & FACE_UP), bool(flags & FACE_DOWN))
+CARD_TUPLES[EMPTY_CARD] = ("", "", False, False)
+
+def readCards(view, offset):
+    raw, offset = readBytes(view, offset + 1, view[offset])
+    cards = [CARD_TUPLES[byte] for byte in raw]
+    if None in cards:
+        raise ValueError("Byte does not encode a card")
+    return cards, offset
+
+def writeInts(out, values):
+    out += U8.pack(len(values))
+    out += bytes(values)
+
+def readInts(view, offset):
+    raw, offset = readBytes(view, offset + 1, view[offset])
+    return list(raw), offset
+
+def writeKind(out, kind):
+    out.append(KINDS.index(kind))
+
+def readKind(view, offset):
+    return KINDS[view[offset]], offset + 1
+
+def writeEvent(out, event):
+    out.append(EVENTS.index(event))
+
+def readEvent(view, offset):
+    return EVENTS[view[offset]], offset + 1
+
+def writeViewRow(out, row):
+    # A seatview row: two masks and two counts
+    hand, topCards, hidden, bottom = row
+    out += hand.to_bytes(MASK_BYTES, 'big')
+    out += topCards.to_bytes(MASK_BYTES, 'big')
+    out += bytes([hidden, bottom])
+
+def readViewRow(view, offset):
+    hand = int.from_bytes(view[offset:offset + MASK_BYTES], 'big')
+    offset += MASK_BYTES
+    topCards = int.from_bytes(view[offset:offset + MASK_BYTES], 'big')
+    offset += MASK_BYTES
+    return [hand, topCards, view[offset], view[offset + 1]], offset + 2
+
+def writeViewRows(out, rows):
+    out += U8.pack(len(rows))
+    for row in rows:
+        writeViewRow(out, row)
+
+def readViewRows(view, offset):
+    count = view[offset]
+    offset += 1
+    rows = []
+    for _ in range(count):
+        row, offset = readViewRow(view, offset)
+        rows.append(row)
+    return rows, offset
+
+U8_FIELD = (writeU8, readU8)
+U32_FIELD = (writeU32, readU32)
+BOOL_FIELD = (writeBool, readBool)
+STR_FIELD = (writeStr, readStr)
+CARDS_FIELD = (writeCards, readCards)
+INTS_FIELD = (writeInts, readInts)
+KIND_FIELD = (writeKind, readKind)
+EVENT_FIELD = (writeEvent, readEvent)
+VIEW_ROW_FIELD = (writeViewRow, readViewRow)
+VIEW_ROWS_FIELD = (writeViewRows, readViewRows)
+
+SNAPSHOT_FIELDS = [('version', U8_FIELD), ('seq', U32_FIELD), ('seat', U8_FIELD), ('players', VIEW_ROWS_FIELD), ('deck', U8_FIELD),
+                   ('pile', INTS_FIELD), ('seven', BOOL_FIELD), ('currentPlayerIndex', U8_FIELD), ('topCardSelectionPhase', BOOL_FIELD),
+                   ('checksum', U32_FIELD)]
+
+# Tag 0 escapes to JSON for anything without a layout below, so a new action
+# never needs a codec change to work
+JSON_TAG = 0
+LAYOUTS = [
+    ('confirmTopCards', [('playerIndex', U8_FIELD), ('topCards', CARDS_FIELD)], ()),
+    ('startGame', [('gameState', STR_FIELD)], ()),
+    ('move', [('version', U8_FIELD), ('seq', U32_FIELD), ('kind', KIND_FIELD), ('cards', INTS_FIELD), ('event', EVENT_FIELD),
+              ('row', VIEW_ROW_FIELD), ('deck', U8_FIELD), ('cleared', BOOL_FIELD), ('seven', BOOL_FIELD), ('turn', U8_FIELD)], ('checksum',)),
+    ('snapshot', SNAPSHOT_FIELDS, ()),
+    ('deal', SNAPSHOT_FIELDS, ()),  # A peer to peer deal; a table server's adds table fields and goes as JSON
+    ('resyncRequest', [('version', U8_FIELD), ('seq', U32_FIELD)], ()),
+    ('intent', [('kind', KIND_FIELD), ('cards', INTS_FIELD)], ()),
+    ('playAgainRequest', [('count', U8_FIELD)], ()),
+    ('resetGame', [], ()),
+    ('gameOver', [('winner', STR_FIELD)], ()),
+    ('disconnect', [], ()),
+    ('ping', [('id', U32_FIELD)], ()),
+    ('pong', [('id', U32_FIELD)], ()),
+    ('lobbyJoin', [('name', STR_FIELD)], ()),
+    ('lobbyLog', [('message', STR_FIELD)], ()),
+    ('lobbyFull', [], ()),
+    ('start', [], ()),
+    ('leave', [], ()),
+]
+
+class BinaryCodec:
+    name = 'binary'
+
+    def __init__(self):
+        self.json = JsonCodec()
+        self.tags = {}
+        self.layouts = [None]
+        self.names = [None]
+        for tag, (action, fields, optional) in enumerate(LAYOUTS, 1):
+            self.tags[action] = tag
+            self.layouts.append((action, fields, optional))
+            self.names.append({'action'} | {name for name, _ in fields} | set(optional))
+
+    def encode(self, data):
+        tag = self.tags.get(data.get('action'))
+        if tag is not None:
+            try:
+                return self.pack(tag, data)
+            except (KeyError, ValueError, TypeError, OverflowError, struct.error):
+                pass
+        return bytes([JSON_TAG]) + self.json.encode(data)
+
+    def pack(self, tag, data):
+        action, fields, optional = self.layouts[tag]
+        if not self.names[tag].issuperset(data):
+            raise ValueError(f"Unexpected fields in {action}")
+        out = bytearray([tag])
+        for name, (write, _) in fields:
+            write(out, data[name])
+        # Optional u32 fields trail the fixed ones behind a presence bitmap
+        present = 0
+        for bit, name in enumerate(optional):
+            if data.get(name) is not None:
+                present |= 1 << bit
+        if optional:
+            out.append(present)
+            for bit, name in enumerate(optional):
+                if present >> bit & 1:
+                    out += U32.pack(data[name])
+        return bytes(out)
+
+    def decode(self, payload):
+        # Anything that is not a message raises ValueError, as JSON does
+        view = memoryview(payload)
+        if not view:
+            raise ValueError("Empty message")
+        tag = view[0]
+        if tag == JSON_TAG:
+            return self.json.decode(bytes(view[1:]))
+        if tag >= len(self.layouts):
+            raise ValueError(f"Unknown message tag {tag}")
+        action, fields, optional = self.layouts[tag]
+        data = {'action': action}
+        offset = 1
+        try:
+            for name, (_, read) in fields:
+                data[name], offset = read(view, offset)
+            if optional:
+                present = view[offset]
+                offset += 1
+                for bit, name in enumerate(optional):
+                    if present >> bit & 1:
+                        data[name] = U32.unpack_from(view, offset)[0]
+                        offset += 4
+        except (IndexError, struct.error) as e:
+            raise ValueError(f"Truncated {action}: {e}") from e
+        return data
+
+JSON = JsonCodec()
+BINARY = BinaryCodec()
+CODECS = {BINARY.name: BINARY, JSON.name: JSON}
+
+def offeredCodecs():
+    # PALACE_WIRE=json forces the readable format for debugging
+    forced = os.environ.get('PALACE_WIRE')
+    if forced in CODECS:
+        return [forced]
+    return list(CODECS)
+
+def helloRequest():
+    return {'action': HELLO, 'codecs': offeredCodecs()}
+
+def acceptHello(data):
+    offered = data.get('codecs', []) if data and data.get('action') == HELLO else []
+    allowed = offeredCodecs()
+    for name in offered:
+        if name in allowed:
+            return CODECS[name]
+    return JSON
+
+def helloReply(codec):
+    return {'action': HELLO, 'codec': codec.name}
+
+def codecFromReply(data):
+    if data and data.get('action') == HELLO:
+        return CODECS.get(data.get('codec'), JSON)
+    return JSON
@@ -0,0 +1,66 @@
+import sys
+import timeit
+import random
+import engine
+import ai
+import sync
+import wire
+from cards import cardsIn
+
+def sampleMessages(seed=0):
+    # One of each message the two player game sends, taken from a late game
+    # position where the pile and hands are large
+    rng = random.Random(seed)
+    state = engine.newGame(2, rng)
+    stateSync = sync.StateSync(checksumEvery=1)
+    # Everything a seat is sent is its own view, here the second seat's
+    seat = 1
+    messages = {'deal': dict(stateSync.snapshotMessage(state, seat), action='deal')}
+    while state.topCardSelectionPhase:
+        state = engine.apply(state, ai.greedyPolicy(state, rng))
+    player = state.players[0]
+    messages['confirmTopCards'] = {'action': 'confirmTopCards', 'playerIndex': 0, 'topCards': player.topTuples()}
+    largest = state
+    while state.winner is None:
+        move = ai.greedyPolicy(state, rng)
+        after = engine.apply(state, move)
+        if move[0] == engine.PLAY and len(after.pile) >= len(largest.pile):
+            messages['intent'] = {'action': 'intent', 'kind': move[0], 'cards': cardsIn(move[1])}
+            messages['move'] = stateSync.moveMessage(state, move, after, seat)
+            largest = after
+        state = after
+    messages['snapshot'] = stateSync.snapshotMessage(largest, seat)
+    # The full state message every move used to send, for reference
+    messages['oldPlayCard'] = {
+        'action': 'playCard',
+        'players': [{'hand': p.handTuples(), 'topCards': p.topTuples(), 'bottomCards': p.bottomTuples()} for p in largest.players],
+        'deck': largest.deckTuples(),
+        'pile': largest.pileTuples(),
+        'seven': largest.sevenSwitch,
+        'currentPlayerIndex': largest.currentPlayerIndex,
+    }
+    return messages
+
+def measure(codec, message, number):
+    payload = codec.encode(message)
+    encode = timeit.timeit(lambda: codec.encode(message), number=number) / number
+    decode = timeit.timeit(lambda: codec.decode(payload), number=number) / number
+    return len(payload), encode, decode
+
+def benchmark(number=20000, seed=0, out=sys.stdout):
+    messages = sampleMessages(seed)
+    print(f"{'message':<16}{'codec':<8}{'bytes':>7}{'encode us':>11}{'decode us':>11}", file=out)
+    results = {}
+    for name, message in messages.items():
+        for codec in (wire.JSON, wire.BINARY):
+            size, encode, decode = measure(codec, message, number)
+            results[name, codec.name] = (size, encode, decode)
+            print(f"{name:<16}{codec.name:<8}{size:>7}{encode * 1e6:>11.2f}{decode * 1e6:>11.2f}", file=out)
+    return results
+
+def addArguments(parser):
+    parser.add_argument('--number', type=int, default=20000, help="encode/decode repetitions per message")
+    parser.add_argument('--seed', type=int, default=0)
+
+def run(args):
+    benchmark(args.number, args.seed)